@@ -1,4 +1,5 @@
-from datetime import datetime, timedelta
+import argparse
+from datetime import date, datetime, timedelta
 import pandas as pd
 from random import randint
 import configparser
@@ -8,15 +9,26 @@ config.read('config.ini')
 
 companies = eval(config['Companies']['Companies'])
 
+parser = argparse.ArgumentParser(description="Generate sales-data.csv")
+parser.add_argument("--start", help="First date YYYY-MM-DD (default: yesterday)")
+parser.add_argument("--end", help="Last date YYYY-MM-DD, inclusive (default: --start)")
+args = parser.parse_args()
+
 today = datetime.today()
 yesterday = today - timedelta(days=1)
 
+start = date.fromisoformat(args.start) if args.start else yesterday.date()
+end = date.fromisoformat(args.end) if args.end else start
+days = pd.date_range(start, end, freq='D')
+
 #if 1 <= today.weekday() <= 5:
+# на каждый день диапазона — buy и sell по каждой компании
+n = len(companies) * 2
 d = {
-    'dt': [yesterday.strftime('%m/%d/%Y')] * len (companies) * 2,
-    'company': companies * 2,
-    'transaction_type': ['buy'] * len (companies) + ['sell'] * len (companies),
-    'amount': [randint(0, 1000) for _ in range(len (companies) * 2)],
+    'dt': [day.strftime('%m/%d/%Y') for day in days for _ in range(n)],
+    'company': (companies * 2) * len(days),
+    'transaction_type': (['buy'] * len (companies) + ['sell'] * len (companies)) * len(days),
+    'amount': [randint(0, 1000) for _ in range(n * len(days))],
 }
 
 df = pd.DataFrame(d)
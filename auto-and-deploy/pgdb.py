@@ -1,24 +1,135 @@
-import psycopg2
+import io
+import csv
+import time
+import threading
+from contextlib import contextmanager
+
+from psycopg2.pool import ThreadedConnectionPool
+from psycopg2.extras import execute_values
 
 class PGDatabase:
-    def __init__(self, host, database, user, password):
+    # Небольшой слой доступа к Postgres: пул соединений, явные транзакции,
+    # серверные курсоры для чтения, пачечная запись и учёт времени запросов.
+    def __init__(self, host, database, user, password, minconn = 1, maxconn = 5):
         self.host = host
         self.database = database
         self.user = user
         self.password = password
 
-        self.connection = psycopg2.connect(
+        self.pool = ThreadedConnectionPool(
+            minconn,
+            maxconn,
             host=host,
             database=database,
             user=user,
             password=password
         )
 
-        self.cursor = self.connection.cursor()
-        self.connection.autocommit = True
+        self._stats = {}
+        self._stats_lock = threading.Lock()
+
+    # ── соединения и транзакции ─────────────────────────────────────────────
+    @contextmanager
+    def transaction(self):
+        # Соединение из пула на время одной транзакции: commit при успехе, rollback при ошибке
+        conn = self.pool.getconn()
+        try:
+            with conn.cursor() as cursor:
+                yield cursor
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.pool.putconn(conn)
+
+    def close(self):
+        self.pool.closeall()
+
+    # ── учёт времени ─────────────────────────────────────────────────────────
+    def _record(self, label, seconds, rows):
+        with self._stats_lock:
+            s = self._stats.setdefault(label, {'calls': 0, 'rows': 0, 'total_s': 0.0, 'max_s': 0.0})
+            s['calls'] += 1
+            s['rows'] += max(rows, 0)
+            s['total_s'] += seconds
+            s['max_s'] = max(s['max_s'], seconds)
+
+    @contextmanager
+    def _timed(self, query, rows = 0):
+        # метка — начало запроса без переносов, чтобы группировать однотипные запросы
+        label = ' '.join(str(query).split())[:60]
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._record(label, time.perf_counter() - started, rows)
 
+    def query_stats(self):
+        with self._stats_lock:
+            return {label: dict(s) for label, s in self._stats.items()}
+
+    def print_stats(self):
+        for label, s in sorted(self.query_stats().items(), key=lambda kv: -kv[1]['total_s']):
+            print(f"{s['total_s']:8.3f}s  max {s['max_s']:.3f}s  calls {s['calls']:5d}  rows {s['rows']:8d}  {label}")
+
+    # ── запись ───────────────────────────────────────────────────────────────
     def post(self, query, args = None):
+        with self.transaction() as cursor, self._timed(query):
+            cursor.execute(query, args)
+            return cursor.rowcount
+
+    def post_many(self, query, rows, page_size = 1000):
+        # query с одним плейсхолдером VALUES %s, например "insert into sales values %s".
+        # Все строки уходят пачками по page_size в одной транзакции: либо всё, либо ничего.
+        if not rows:
+            return 0
+        with self.transaction() as cursor, self._timed(query, len(rows)):
+            execute_values(cursor, query, rows, page_size=page_size)
+        return len(rows)
+
+    def replace_many(self, delete_query, delete_args, insert_query, rows, page_size = 1000):
+        # Идемпотентная перезаливка: delete по ключу диапазона + пачечный insert в одной транзакции.
+        # Повторный запуск за те же даты не создаёт дублей и не требует уникальных ограничений в таблице.
+        with self.transaction() as cursor:
+            with self._timed(delete_query):
+                cursor.execute(delete_query, delete_args)
+                deleted = cursor.rowcount
+            if rows:
+                with self._timed(insert_query, len(rows)):
+                    execute_values(cursor, insert_query, rows, page_size=page_size)
+        return deleted, len(rows)
+
+    def copy_rows(self, table, rows, columns = None):
+        # Самый быстрый путь для больших объёмов: COPY ... FROM STDIN из CSV в памяти
+        if not rows:
+            return 0
+        buf = io.StringIO()
+        csv.writer(buf).writerows(rows)
+        buf.seek(0)
+        cols = f" ({', '.join(columns)})" if columns else ''
+        query = f"copy {table}{cols} from stdin with (format csv)"
+        with self.transaction() as cursor, self._timed(query, len(rows)):
+            cursor.copy_expert(query, buf)
+        return len(rows)
+
+    # ── чтение ───────────────────────────────────────────────────────────────
+    def fetch(self, query, args = None, itersize = 10000):
+        # Генератор строк через серверный (именованный) курсор: результат не грузится в память целиком
+        conn = self.pool.getconn()
+        started = time.perf_counter()
+        n = 0
         try:
-            self.cursor.execute(query)
-        except Exception as err:
-            print(repr(err))
\ No newline at end of file
+            with conn.cursor(name=f"pgdb_fetch_{id(conn)}") as cursor:
+                cursor.itersize = itersize
+                cursor.execute(query, args)
+                for row in cursor:
+                    n += 1
+                    yield row
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            self.pool.putconn(conn)
+            self._record(' '.join(str(query).split())[:60], time.perf_counter() - started, n)
\ No newline at end of file
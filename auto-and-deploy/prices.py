@@ -0,0 +1,212 @@
+import os
+import time
+from datetime import date, datetime
+
+import pandas as pd
+
+PRICE_COLUMNS = ['Date', 'Open', 'Close']
+
+
+def _to_date(d):
+    if isinstance(d, datetime):
+        return d.date()
+    if isinstance(d, date):
+        return d
+    return date.fromisoformat(str(d))
+
+
+def _empty_prices():
+    return pd.DataFrame({c: pd.Series(dtype='datetime64[ns]' if c == 'Date' else 'float64') for c in PRICE_COLUMNS})
+
+
+def _normalize(df):
+    # приводим к плоскому виду Date / Open / Close, без пустых строк
+    if df is None or df.empty:
+        return _empty_prices()
+    df = df.reset_index()
+    if isinstance(df.columns, pd.MultiIndex):
+        df.columns = [c[0] if isinstance(c, tuple) else c for c in df.columns]
+    df = df.rename(columns={'Datetime': 'Date', 'index': 'Date'})
+    df = df[PRICE_COLUMNS].dropna(subset=['Open', 'Close'], how='all')
+    df['Date'] = pd.to_datetime(df['Date']).dt.tz_localize(None).dt.normalize()
+    return df.reset_index(drop=True)
+
+
+class PriceSource:
+    # Источник котировок: fetch(tickers, start, end) -> {ticker: DataFrame[Date, Open, Close]}
+    # end — исключающая граница, как у yfinance
+    def fetch(self, tickers, start, end):
+        raise NotImplementedError
+
+
+class YFinanceSource(PriceSource):
+    def __init__(self, batch_size = 50):
+        self.batch_size = batch_size
+
+    def _download(self, tickers, start, end):
+        import yfinance as yf
+
+        raw = yf.download(
+            tickers = tickers,
+            start = start,
+            end = end,
+            interval = '1d',
+            group_by = 'ticker',
+            auto_adjust = False,
+            progress = False,
+            threads = True,
+        )
+        result = {}
+        for ticker in tickers:
+            if isinstance(raw.columns, pd.MultiIndex):
+                # уровень с тикером бывает первым или вторым — зависит от версии yfinance
+                level = 0 if ticker in raw.columns.get_level_values(0) else 1
+                if ticker not in raw.columns.get_level_values(level):
+                    result[ticker] = _empty_prices()
+                    continue
+                result[ticker] = _normalize(raw.xs(ticker, axis=1, level=level))
+            else:
+                result[ticker] = _normalize(raw)
+        return result
+
+    def fetch(self, tickers, start, end):
+        # один batched-запрос на пачку тикеров; пачки — строго по очереди: yf.download
+        # складывает результаты и ошибки в глобальные yfinance.shared._DFS/_ERRORS, и
+        # параллельные вызовы затирают друг друга. Внутри пачки параллелит сам yfinance (threads)
+        result = {}
+        for i in range(0, len(tickers), self.batch_size):
+            result.update(self._download(tickers[i:i + self.batch_size], start, end))
+        return result
+
+
+class StaticSource(PriceSource):
+    # Заглушка для тестов/офлайна: отдаёт заранее подготовленные котировки без сети
+    def __init__(self, frames):
+        self.frames = {t: _normalize(df.set_index('Date')) for t, df in frames.items()}
+        self.calls = []
+
+    def fetch(self, tickers, start, end):
+        self.calls.append((tuple(tickers), start, end))
+        lo, hi = pd.Timestamp(start), pd.Timestamp(end)
+        result = {}
+        for ticker in tickers:
+            df = self.frames.get(ticker, _empty_prices())
+            result[ticker] = df[(df['Date'] >= lo) & (df['Date'] < hi)].reset_index(drop=True)
+        return result
+
+
+class PriceCache:
+    # Parquet на каждый (тикер, диапазон): <cache_dir>/<TICKER>/<start>_<end>.parquet
+    # По именам файлов понимаем, какие даты уже скачаны (выходные/праздники тоже считаются покрытыми)
+    # Пустой ответ не кэшируется как данные: yf.download отдаёт пустую таблицу и при сетевой
+    # ошибке / лимите / неизвестном тикере. Вместо этого — метка <start>_<end>.empty, которая
+    # покрывает диапазон только empty_ttl секунд, потом диапазон запрашивается снова
+    def __init__(self, cache_dir, empty_ttl = 6 * 3600):
+        self.cache_dir = cache_dir
+        self.empty_ttl = empty_ttl
+
+    def _ticker_dir(self, ticker):
+        return os.path.join(self.cache_dir, ticker)
+
+    def _files(self, ticker, suffix):
+        path = self._ticker_dir(ticker)
+        if not os.path.isdir(path):
+            return []
+        result = []
+        for name in os.listdir(path):
+            if not name.endswith(suffix):
+                continue
+            lo, hi = name[:-len(suffix)].split('_')
+            result.append((date.fromisoformat(lo), date.fromisoformat(hi), os.path.join(path, name)))
+        return sorted(result)
+
+    def ranges(self, ticker):
+        # покрытые диапазоны: файлы с данными + ещё не истёкшие метки пустых ответов
+        now = time.time()
+        result = [(lo, hi) for lo, hi, _ in self._files(ticker, '.parquet')]
+        result += [(lo, hi) for lo, hi, path in self._files(ticker, '.empty')
+                   if now - os.path.getmtime(path) < self.empty_ttl]
+        return sorted(result)
+
+    def missing(self, ticker, start, end):
+        # диапазоны [lo, hi) внутри [start, end), которых ещё нет в кэше
+        gaps = []
+        cursor = start
+        for lo, hi in self.ranges(ticker):
+            if hi <= cursor:
+                continue
+            if lo >= end:
+                break
+            if lo > cursor:
+                gaps.append((cursor, lo))
+            cursor = max(cursor, hi)
+            if cursor >= end:
+                break
+        if cursor < end:
+            gaps.append((cursor, end))
+        return gaps
+
+    def write(self, ticker, start, end, df):
+        os.makedirs(self._ticker_dir(ticker), exist_ok=True)
+        path = os.path.join(self._ticker_dir(ticker), f'{start.isoformat()}_{end.isoformat()}.parquet')
+        df.to_parquet(path, index=False)
+
+    def mark_empty(self, ticker, start, end):
+        os.makedirs(self._ticker_dir(ticker), exist_ok=True)
+        path = os.path.join(self._ticker_dir(ticker), f'{start.isoformat()}_{end.isoformat()}.empty')
+        with open(path, 'w'):
+            pass  # mtime метки — время ответа, от него считается empty_ttl
+
+    def read(self, ticker, start, end):
+        frames = []
+        for lo, hi, path in self._files(ticker, '.parquet'):
+            if hi <= start or lo >= end:
+                continue
+            frames.append(pd.read_parquet(path))
+        if not frames:
+            return _empty_prices()
+        df = pd.concat(frames, ignore_index=True)
+        df = df[(df['Date'] >= pd.Timestamp(start)) & (df['Date'] < pd.Timestamp(end))]
+        return df.drop_duplicates('Date').sort_values('Date').reset_index(drop=True)
+
+
+class PriceFetcher:
+    def __init__(self, source, cache = None):
+        self.source = source
+        self.cache = cache
+
+    def get(self, tickers, start, end):
+        start, end = _to_date(start), _to_date(end)
+        if self.cache is None:
+            return self.source.fetch(list(tickers), start, end)
+
+        # тикеры с одинаковым недостающим диапазоном забираем одним запросом
+        todo = {}
+        for ticker in tickers:
+            for gap in self.cache.missing(ticker, start, end):
+                todo.setdefault(gap, []).append(ticker)
+
+        fresh = {}
+        # сегодняшние (и будущие) даты ещё могут измениться — такие диапазоны не кэшируем
+        cacheable_until = date.today()
+        for (lo, hi), group in todo.items():
+            data = self.source.fetch(group, lo, hi)
+            for ticker in group:
+                df = data.get(ticker, _empty_prices())
+                if hi > cacheable_until:
+                    fresh.setdefault(ticker, []).append(df)
+                elif df.empty:
+                    self.cache.mark_empty(ticker, lo, hi)
+                else:
+                    self.cache.write(ticker, lo, hi, df)
+
+        result = {}
+        for ticker in tickers:
+            frames = [self.cache.read(ticker, start, end)] + fresh.get(ticker, [])
+            frames = [f for f in frames if not f.empty]
+            if not frames:
+                result[ticker] = _empty_prices()
+                continue
+            df = pd.concat(frames, ignore_index=True)
+            result[ticker] = df.drop_duplicates('Date').sort_values('Date').reset_index(drop=True)
+        return result
\ No newline at end of file
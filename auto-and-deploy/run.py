@@ -1,11 +1,11 @@
 import os
+import argparse
 import pandas as pd
 import configparser
-from datetime import datetime, timedelta
-
-import yfinance as yf
+from datetime import date, datetime, timedelta
 
 from pgdb import PGDatabase
+from prices import PriceFetcher, PriceCache, YFinanceSource
 
 config = configparser.ConfigParser()
 config.read('config.ini')
@@ -16,8 +16,18 @@ def prev_business_day(d):
         d -= timedelta(days=1)
     return d
 
-start = prev_business_day(datetime.today().date() - timedelta(days=1))
-end   = start + timedelta(days=1)  # end — верхняя (исключающая) граница
+parser = argparse.ArgumentParser(description="Load stock prices and sales into Postgres")
+parser.add_argument("--start", help="Backfill start date YYYY-MM-DD (default: previous business day)")
+parser.add_argument("--end", help="Backfill end date YYYY-MM-DD, inclusive (default: --start)")
+args = parser.parse_args()
+
+if args.start:
+    start = date.fromisoformat(args.start)
+else:
+    start = prev_business_day(datetime.today().date() - timedelta(days=1))
+last  = date.fromisoformat(args.end) if args.end else start
+end   = last + timedelta(days=1)  # end — верхняя (исключающая) граница
+print(f"Loading {start} .. {last}")
 
 companies = eval(config['Companies']['Companies'])
 sales_path = config['Files']['sales_path']
@@ -29,19 +39,18 @@ if os.path.exists(sales_path):
     sales_df = pd.read_csv(sales_path)
     os.remove(sales_path)
 
-historical_d = {}
-
-for company in companies:
-    historical_d[company] = yf.download(
-        tickers = company,
-        start = start,
-        end = end,
-        interval = '1d',
-        auto_adjust=False,
-        progress=False
-    ).reset_index()
-    print(company, historical_d[company].head())
-
+prices_cfg = config['Prices'] if config.has_section('Prices') else {}
+cache_dir = prices_cfg.get('cache_dir', '')
+fetcher = PriceFetcher(
+    source = YFinanceSource(
+        batch_size = int(prices_cfg.get('batch_size', 50)),
+    ),
+    cache = PriceCache(cache_dir) if cache_dir else None,
+)
+# все тикеры одним батчем; из кэша берём то, что уже скачано
+historical_d = fetcher.get(companies, start, end)
+for company, data in historical_d.items():
+    print(company, data.head())
 
 database = PGDatabase(
     host = database_creds['host'],
@@ -50,33 +59,46 @@ database = PGDatabase(
     password = database_creds['password']
 )
 
-for i, row in sales_df.iterrows():
-    dt = pd.to_datetime(row['dt']).strftime("%Y-%m-%d")  # нормализуем дату
-    query = f"insert into sales values ('{dt}', '{row['company']}', '{row['transaction_type']}', {row['amount']})"
-    print(query)
-    database.post(query, args = None)
-
+# sales: перезаливаем даты/компании из файла одной транзакцией — повторный запуск не плодит дубли
+if not sales_df.empty:
+    sales_out = pd.DataFrame({
+        'dt': pd.to_datetime(sales_df['dt']).dt.strftime("%Y-%m-%d"),  # нормализуем дату
+        'company': sales_df['company'],
+        'transaction_type': sales_df['transaction_type'],
+        'amount': sales_df['amount'],
+    })
+    deleted, n = database.replace_many(
+        "delete from sales where dt between %s and %s and company = any(%s)",
+        (sales_out['dt'].min(), sales_out['dt'].max(), sales_out['company'].unique().tolist()),
+        "insert into sales values %s",
+        sales_out.astype(object).values.tolist(),
+    )
+    print(f"sales: replaced {deleted} -> {n} rows")
+
+stock_frames = []
 for company, data in historical_d.items():
     if data.empty:
         continue
 
-    if isinstance(data.columns, pd.MultiIndex):
-        # дата — это колонка с первым уровнем 'Date' (второй уровень обычно пустой)
-        date_col = next(c for c in data.columns if isinstance(c, tuple) and c[0] == 'Date')
-        open_col = ('Open',  company)
-        close_col = ('Close', company)
-    else:
-        date_col = 'Date'
-        open_col = 'Open'
-        close_col = 'Close'
-
-    for _, row in data.iterrows():
-        date_val = row[date_col]
+    stock_frames.append(pd.DataFrame({
         # приводим к 'YYYY-MM-DD' надёжно
-        dt_iso = pd.to_datetime(date_val).strftime('%Y-%m-%d')
-
-        open_val = row[open_col]
-        close_val = row[close_col]
-
-        query = f"insert into stock values ('{dt_iso}', '{company}', {open_val}, {close_val})"
-        database.post(query)g
\ No newline at end of file
+        'dt': pd.to_datetime(data['Date']).dt.strftime('%Y-%m-%d'),
+        'company': company,
+        'open': data['Open'].astype(float),
+        'close': data['Close'].astype(float),
+    }).dropna())
+
+# stock: все тикеры за весь диапазон одной транзакцией (delete + insert = идемпотентный upsert).
+# Тикеры без данных не трогаем, чтобы сбой загрузки не стёр уже сохранённые котировки.
+if stock_frames:
+    stock_df = pd.concat(stock_frames, ignore_index=True)
+    deleted, n = database.replace_many(
+        "delete from stock where dt >= %s and dt < %s and company = any(%s)",
+        (start, end, stock_df['company'].unique().tolist()),
+        "insert into stock values %s",
+        stock_df.astype(object).values.tolist(),
+    )
+    print(f"stock: replaced {deleted} -> {n} rows")
+
+database.print_stats()
+database.close()
\ No newline at end of file
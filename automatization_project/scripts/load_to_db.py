@@ -4,19 +4,22 @@ import re
 from pathlib import Path
 from datetime import datetime
 import shutil
+import time
 
 import pandas as pd
 from sqlalchemy import create_engine, MetaData, Table, Column, Integer, String, Text, Numeric, DateTime,     ForeignKey, UniqueConstraint
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy import Date, Index, PrimaryKeyConstraint, select, func, text
 from sqlalchemy.engine import Engine
 
-from utils import ensure_dirs, get_logger, load_config, load_env
+from utils import ensure_dirs, get_logger, load_config, load_env, get_metrics_logger, log_json, timed, \
+    write_prometheus_textfile
 import os
 
 from sqlalchemy.dialects.postgresql import insert as pg_insert
 
 REQUIRED_COLUMNS = ["doc_id", "item", "category", "amount", "price", "discount"]
 FILENAME_RE = re.compile(r"^(?P<shop>\d+)_(?P<cash>\d+)\.csv$", re.IGNORECASE)
+DOC_DATE_RE = r"^DOC-(\d{8})-"  # DOC-<YYYYMMDD>-<shop>-<cash>-<6alnum>
 
 def get_engine_from_env() -> Engine:
     load_env()  # loads .env if present
@@ -49,9 +52,67 @@ def define_schema(metadata: MetaData):
         Column("line_total", Numeric(12,2), nullable=False),
         Column("load_ts", DateTime, nullable=False, default=datetime.utcnow),
         Column("source_file", Text, nullable=False),
-        UniqueConstraint("doc_id", "shop_num", "cash_num", "row_num", name="uniq_doc_row")
+        Column("sale_date", Date),
+        UniqueConstraint("doc_id", "shop_num", "cash_num", "row_num", name="uniq_doc_row"),
+        Index("idx_sales_lines_slice", "shop_num", "cash_num", "sale_date"),
     )
-    return shops, cash_registers, sales_lines
+    # Дневные агрегаты: отчёты читают эту таблицу, а не sales_lines
+    daily_sales_rollup = Table(
+        "daily_sales_rollup", metadata,
+        Column("sale_date", Date, nullable=False),
+        Column("shop_num", Integer, nullable=False),
+        Column("cash_num", Integer, nullable=False),
+        Column("category", Text, nullable=False),
+        Column("lines", Integer, nullable=False),
+        Column("receipts", Integer, nullable=False),
+        Column("units", Integer, nullable=False),
+        Column("gross", Numeric(14,2), nullable=False),
+        Column("discount", Numeric(14,2), nullable=False),
+        Column("net", Numeric(14,2), nullable=False),
+        PrimaryKeyConstraint("sale_date", "shop_num", "cash_num", "category", name="pk_daily_sales_rollup"),
+        Index("idx_rollup_category_date", "category", "sale_date"),
+        Index("idx_rollup_cash_date", "shop_num", "cash_num", "sale_date"),
+    )
+    return shops, cash_registers, sales_lines, daily_sales_rollup
+
+# create_all не меняет уже существующие таблицы — докатываем новые колонки/индексы сами
+MIGRATIONS = [
+    "ALTER TABLE sales_lines ADD COLUMN IF NOT EXISTS sale_date DATE",
+    "CREATE INDEX IF NOT EXISTS idx_sales_lines_slice ON sales_lines (shop_num, cash_num, sale_date)",
+]
+
+# Строки, загруженные до появления sale_date: дата из doc_id (иначе — день загрузки), как в sql/ddl.sql
+BACKFILL_SALE_DATE = """
+UPDATE sales_lines
+SET sale_date = COALESCE(
+        CASE WHEN doc_id ~ '^DOC-[0-9]{8}-' THEN TO_DATE(SUBSTRING(doc_id FROM 5 FOR 8), 'YYYYMMDD') END,
+        load_ts::DATE)
+WHERE sale_date IS NULL
+"""
+REBUILD_ROLLUP = """
+INSERT INTO daily_sales_rollup (sale_date, shop_num, cash_num, category, lines, receipts, units, gross, discount, net)
+SELECT sale_date, shop_num, cash_num, category,
+       COUNT(*), COUNT(DISTINCT doc_id), SUM(amount), SUM(amount * price), SUM(discount), SUM(line_total)
+FROM sales_lines
+GROUP BY sale_date, shop_num, cash_num, category
+ON CONFLICT (sale_date, shop_num, cash_num, category) DO UPDATE
+SET lines = EXCLUDED.lines, receipts = EXCLUDED.receipts, units = EXCLUDED.units,
+    gross = EXCLUDED.gross, discount = EXCLUDED.discount, net = EXCLUDED.net
+"""
+
+def migrate_schema(engine: Engine) -> int:
+    """Докатывает MIGRATIONS и заполняет sale_date у старых строк; возвращает число заполненных.
+    Без этого refresh_rollup не видит строки с NULL sale_date (в т.ч. пропущенные как дубли
+    при повторной загрузке файла), поэтому после заполнения агрегаты пересчитываются целиком."""
+    if engine.dialect.name != "postgresql":
+        return 0
+    with engine.begin() as conn:
+        for stmt in MIGRATIONS:
+            conn.execute(text(stmt))
+        backfilled = conn.execute(text(BACKFILL_SALE_DATE)).rowcount
+        if backfilled:
+            conn.execute(text(REBUILD_ROLLUP))
+    return backfilled
 
 def coerce_and_validate(df: pd.DataFrame) -> pd.DataFrame:
     # Normalize columns to lower-case
@@ -73,18 +134,62 @@ def coerce_and_validate(df: pd.DataFrame) -> pd.DataFrame:
 
     return df
 
-def process_file(engine: Engine, tables, file_path: Path, shop_num: int, cash_num: int, logger):
-    shops, cash_registers, sales_lines = tables
+def parse_sale_dates(doc_ids: pd.Series) -> pd.Series:
+    # Дата чека зашита в doc_id; если формат другой — считаем продажей сегодняшнего дня
+    dates = pd.to_datetime(doc_ids.astype(str).str.extract(DOC_DATE_RE)[0], format="%Y%m%d", errors="coerce")
+    return dates.fillna(pd.Timestamp(datetime.now().date())).dt.date
 
-    df = pd.read_csv(file_path, encoding="utf-8")
-    df = coerce_and_validate(df)
-    df.insert(0, "row_num", range(1, len(df)+1))
-    df["line_total"] = (df["amount"] * df["price"] - df["discount"]).round(2)
-    df["shop_num"] = shop_num
-    df["cash_num"] = cash_num
-    df["source_file"] = str(file_path)
+def refresh_rollup(conn, sales_lines, rollup, shop_num: int, cash_num: int, sale_dates):
+    """Пересчитывает daily_sales_rollup только для затронутых файлом (день, магазин, касса).
+    Срез пересобирается из sales_lines целиком, поэтому повторная загрузка и дубли не задваивают суммы."""
+    if not sale_dates:
+        return
+    sale_dates = sorted(sale_dates)
+    conn.execute(rollup.delete().where(
+        rollup.c.shop_num == shop_num,
+        rollup.c.cash_num == cash_num,
+        rollup.c.sale_date.in_(sale_dates),
+    ))
+    sl = sales_lines.c
+    agg = select(
+        sl.sale_date, sl.shop_num, sl.cash_num, sl.category,
+        func.count(),
+        func.count(sl.doc_id.distinct()),
+        func.sum(sl.amount),
+        func.sum(sl.amount * sl.price),
+        func.sum(sl.discount),
+        func.sum(sl.line_total),
+    ).where(
+        sl.shop_num == shop_num,
+        sl.cash_num == cash_num,
+        sl.sale_date.in_(sale_dates),
+    ).group_by(sl.sale_date, sl.shop_num, sl.cash_num, sl.category)
+    conn.execute(rollup.insert().from_select(
+        ["sale_date", "shop_num", "cash_num", "category", "lines", "receipts", "units", "gross", "discount", "net"],
+        agg,
+    ))
 
-    with engine.begin() as conn:
+def iter_chunks(file_path: Path, chunksize: int | None):
+    # chunksize пустой/0 -> читаем файл целиком одним куском
+    if not chunksize:
+        yield pd.read_csv(file_path, encoding="utf-8")
+        return
+    with pd.read_csv(file_path, encoding="utf-8", chunksize=int(chunksize)) as reader:
+        yield from reader
+
+def process_file(engine: Engine, tables, file_path: Path, shop_num: int, cash_num: int, logger,
+                 chunksize: int | None = None, stats: dict | None = None):
+    """Загружает один файл, возвращает число строк. В stats накапливаются длительности этапов (сек)."""
+    if stats is None:
+        stats = {}
+    shops, cash_registers, sales_lines, rollup = tables
+
+    cols = ["doc_id","shop_num","cash_num","row_num","item","category","amount","price","discount","line_total","source_file","sale_date"]
+    # Insert lines (skip duplicates)
+    stmt_lines = pg_insert(sales_lines).on_conflict_do_nothing(constraint="uniq_doc_row")
+
+    # Вся обработка файла — одна транзакция: ошибка в любом чанке откатывает весь файл
+    with engine.connect() as conn, conn.begin() as trans:
         # UPSERT (PostgreSQL): не ломаем транзакцию, если запись уже существует
         stmt_shop = pg_insert(shops).values(shop_num=shop_num) \
             .on_conflict_do_nothing(index_elements=[shops.c.shop_num])
@@ -94,15 +199,54 @@ def process_file(engine: Engine, tables, file_path: Path, shop_num: int, cash_nu
             .on_conflict_do_nothing(index_elements=[cash_registers.c.shop_num, cash_registers.c.cash_num])
         conn.execute(stmt_cash)
 
-        # Insert lines (skip duplicates)
-        cols = ["doc_id","shop_num","cash_num","row_num","item","category","amount","price","discount","line_total","source_file"]
-        for rec in df[cols].to_dict(orient="records"):
-            try:
-                conn.execute(sales_lines.insert().values(**rec))
-            except IntegrityError:
-                # duplicate line -> ignore
-                logger.info(f"Duplicate skipped for {file_path.name}: {rec['doc_id']}/{rec['row_num']}")
-                continue
+        rows_total = 0
+        n_chunks = 0
+        sale_dates = set()
+        chunks = iter_chunks(file_path, chunksize)
+        while True:
+            with timed(stats, "read"):
+                df = next(chunks, None)
+            if df is None:
+                break
+
+            with timed(stats, "coerce"):
+                df = coerce_and_validate(df)
+                # row_num сквозной по всему файлу, а не внутри чанка
+                df.insert(0, "row_num", range(rows_total + 1, rows_total + len(df) + 1))
+                df["line_total"] = (df["amount"] * df["price"] - df["discount"]).round(2)
+                df["shop_num"] = shop_num
+                df["cash_num"] = cash_num
+                df["source_file"] = str(file_path)
+                df["sale_date"] = parse_sale_dates(df["doc_id"])
+                sale_dates.update(df["sale_date"].unique())
+
+            with timed(stats, "insert"):
+                if len(df):
+                    conn.execute(stmt_lines, df[cols].to_dict(orient="records"))
+            rows_total += len(df)
+            n_chunks += 1
+
+        with timed(stats, "rollup"):
+            refresh_rollup(conn, sales_lines, rollup, shop_num, cash_num, sale_dates)
+        with timed(stats, "insert"):
+            trans.commit()
+
+    logger.info(f"Loaded {file_path.name}: {rows_total} rows in {n_chunks} chunk(s)")
+    return rows_total
+
+STAGES = ["read", "coerce", "insert", "rollup", "move"]
+
+def export_run_metrics(path: str, run: dict):
+    stage_totals = run["stages"]
+    write_prometheus_textfile(path, [
+        ("load_to_db_stage_seconds", "Time spent per load stage in the last run", "gauge",
+         [({"stage": st}, round(stage_totals.get(st, 0.0), 6)) for st in STAGES]),
+        ("load_to_db_rows", "Rows loaded in the last run", "gauge", [({}, run["rows"])]),
+        ("load_to_db_files", "Files handled in the last run by status", "gauge",
+         [({"status": st}, n) for st, n in run["files"].items()]),
+        ("load_to_db_run_duration_seconds", "Wall time of the last run", "gauge", [({}, round(run["duration_s"], 6))]),
+        ("load_to_db_last_run_timestamp_seconds", "Unix time the last run finished", "gauge", [({}, int(time.time()))]),
+    ])
 
 def main():
     ap = argparse.ArgumentParser(description="Load CSV files into the database")
@@ -115,12 +259,22 @@ def main():
     rejected_dir = Path(cfg.get("rejected_dir", "data/rejected"))
     ensure_dirs(data_dir, processed_dir, rejected_dir)
 
+    chunksize = cfg.get("loader", {}).get("chunksize")
+    prom_path = cfg.get("metrics", {}).get("prometheus_textfile")
+
     logger = get_logger("load_to_db", cfg.get("logs_dir", "logs"))
+    metrics_logger = get_metrics_logger("load_to_db", cfg.get("logs_dir", "logs"))
     engine = get_engine_from_env()
 
     metadata = MetaData()
     tables = define_schema(metadata)
     metadata.create_all(engine)
+    backfilled = migrate_schema(engine)
+    if backfilled:
+        logger.info(f"Backfilled sale_date for {backfilled} existing rows, daily_sales_rollup rebuilt")
+
+    run_start = time.perf_counter()
+    run = {"rows": 0, "files": {"ok": 0, "failed": 0, "ignored": 0}, "stages": {}}
 
     for file in sorted(data_dir.iterdir()):
         if not file.is_file():
@@ -130,22 +284,52 @@ def main():
             logger.warning(f"Ignored non-matching file: {file.name}")
             # optionally move to rejected
             shutil.move(str(file), rejected_dir / file.name)
+            run["files"]["ignored"] += 1
             continue
 
         shop_num = int(m.group("shop"))
         cash_num = int(m.group("cash"))
+        stats = {}
+        rows = 0
+        file_start = time.perf_counter()
         try:
-            process_file(engine, tables, file, shop_num, cash_num, logger)
+            rows = process_file(engine, tables, file, shop_num, cash_num, logger, chunksize, stats)
         except Exception as e:
+            status = "failed"
             logger.exception(f"Failed to process {file.name}: {e}")
-            shutil.move(str(file), rejected_dir / file.name)
+            with timed(stats, "move"):
+                shutil.move(str(file), rejected_dir / file.name)
         else:
+            status = "ok"
             # Move to processed/YYYY-MM-DD
             date_dir = processed_dir / datetime.now().strftime("%Y-%m-%d")
-            ensure_dirs(date_dir.as_posix())
-            shutil.move(str(file), date_dir / file.name)
+            with timed(stats, "move"):
+                ensure_dirs(date_dir.as_posix())
+                shutil.move(str(file), date_dir / file.name)
             logger.info(f"Processed {file.name} -> {date_dir}")
 
+        log_json(metrics_logger, "file", file=file.name, status=status, rows=rows,
+                 total_s=round(time.perf_counter() - file_start, 4),
+                 stages={st: round(v, 4) for st, v in stats.items()})
+        run["files"][status] += 1
+        if status == "ok":
+            run["rows"] += rows
+        for st, v in stats.items():
+            run["stages"][st] = run["stages"].get(st, 0.0) + v
+
+    run["duration_s"] = time.perf_counter() - run_start
+    log_json(metrics_logger, "run", rows=run["rows"], files=run["files"],
+             total_s=round(run["duration_s"], 4),
+             rows_per_s=round(run["rows"] / run["duration_s"], 1) if run["duration_s"] else None,
+             stages={st: round(v, 4) for st, v in run["stages"].items()})
+    logger.info(
+        f"Run summary: {run['files']['ok']} ok / {run['files']['failed']} failed / "
+        f"{run['files']['ignored']} ignored, {run['rows']} rows in {run['duration_s']:.2f}s; "
+        + ", ".join(f"{st}={run['stages'].get(st, 0.0):.2f}s" for st in STAGES)
+    )
+    if prom_path:
+        export_run_metrics(prom_path, run)
+
     logger.info("Done.")
 
 if __name__ == "__main__":
@@ -1,6 +1,9 @@
 import os
 import sys
+import json
+import time
 import logging
+from contextlib import contextmanager
 from logging.handlers import RotatingFileHandler
 from pathlib import Path
 from dotenv import load_dotenv
@@ -39,3 +42,48 @@ def load_env(env_file: str = ".env") -> None:
     # Loads environment variables from .env if present
     if Path(env_file).exists():
         load_dotenv(env_file)
+
+
+def get_metrics_logger(name: str, logs_dir: str) -> logging.Logger:
+    # Отдельный лог только с JSON-строками (по одной на событие) — удобно грузить в pandas/jq
+    ensure_dirs(logs_dir)
+    logger = logging.getLogger(f"{name}.metrics")
+    logger.setLevel(logging.INFO)
+    logger.handlers.clear()
+    logger.propagate = False
+
+    fh = RotatingFileHandler(Path(logs_dir) / 'metrics.jsonl', maxBytes=5_000_000, backupCount=3, encoding='utf-8')
+    fh.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(fh)
+
+    return logger
+
+def log_json(logger: logging.Logger, event: str, **fields) -> None:
+    record = {"ts": time.strftime("%Y-%m-%dT%H:%M:%S"), "event": event, **fields}
+    logger.info(json.dumps(record, ensure_ascii=False, default=str))
+
+@contextmanager
+def timed(stats: dict, stage: str):
+    # Накапливает время этапа в stats[stage] (сек); этап может вызываться многократно (по чанкам)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats[stage] = stats.get(stage, 0.0) + time.perf_counter() - start
+
+def write_prometheus_textfile(path: str, metrics: list) -> None:
+    """Пишет метрики в формате textfile collector (node_exporter).
+    metrics — список (name, help, type, [(labels_dict, value), ...])."""
+    lines = []
+    for name, help_text, mtype, samples in metrics:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {mtype}")
+        for labels, value in samples:
+            label_str = ",".join(f'{k}="{v}"' for k, v in labels.items())
+            lines.append(f"{name}{{{label_str}}} {value}" if label_str else f"{name} {value}")
+    target = Path(path)
+    ensure_dirs(target.parent)
+    # Атомарная замена, чтобы коллектор не прочитал недописанный файл
+    tmp = target.with_suffix(target.suffix + ".tmp")
+    tmp.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    os.replace(tmp, target)
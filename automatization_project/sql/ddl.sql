@@ -28,3 +28,45 @@ CREATE TABLE IF NOT EXISTS sales_lines (
         REFERENCES cash_registers (shop_num, cash_num) ON DELETE RESTRICT,
     CONSTRAINT uniq_doc_row UNIQUE (doc_id, shop_num, cash_num, row_num)
 );
+
+-- Дата чека (берётся из doc_id при загрузке); для старых баз — докатываем колонку
+ALTER TABLE sales_lines ADD COLUMN IF NOT EXISTS sale_date DATE;
+CREATE INDEX IF NOT EXISTS idx_sales_lines_slice ON sales_lines (shop_num, cash_num, sale_date);
+
+-- Дневные агрегаты по (дата, магазин, касса, категория); поддерживаются загрузчиком
+CREATE TABLE IF NOT EXISTS daily_sales_rollup (
+    sale_date DATE NOT NULL,
+    shop_num INTEGER NOT NULL,
+    cash_num INTEGER NOT NULL,
+    category TEXT NOT NULL,
+    lines INTEGER NOT NULL,
+    receipts INTEGER NOT NULL,
+    units INTEGER NOT NULL,
+    gross NUMERIC(14,2) NOT NULL,
+    discount NUMERIC(14,2) NOT NULL,
+    net NUMERIC(14,2) NOT NULL,
+    CONSTRAINT pk_daily_sales_rollup PRIMARY KEY (sale_date, shop_num, cash_num, category)
+);
+
+CREATE INDEX IF NOT EXISTS idx_rollup_category_date ON daily_sales_rollup (category, sale_date);
+CREATE INDEX IF NOT EXISTS idx_rollup_cash_date ON daily_sales_rollup (shop_num, cash_num, sale_date);
+
+-- Разовое заполнение по уже загруженным данным (load_to_db.py делает то же в migrate_schema)
+UPDATE sales_lines
+SET sale_date = COALESCE(
+        CASE WHEN doc_id ~ '^DOC-[0-9]{8}-' THEN TO_DATE(SUBSTRING(doc_id FROM 5 FOR 8), 'YYYYMMDD') END,
+        load_ts::DATE)
+WHERE sale_date IS NULL;
+
+INSERT INTO daily_sales_rollup (sale_date, shop_num, cash_num, category, lines, receipts, units, gross, discount, net)
+SELECT sale_date, shop_num, cash_num, category,
+       COUNT(*), COUNT(DISTINCT doc_id), SUM(amount), SUM(amount * price), SUM(discount), SUM(line_total)
+FROM sales_lines
+GROUP BY sale_date, shop_num, cash_num, category
+ON CONFLICT (sale_date, shop_num, cash_num, category) DO UPDATE
+SET lines = EXCLUDED.lines, receipts = EXCLUDED.receipts, units = EXCLUDED.units,
+    gross = EXCLUDED.gross, discount = EXCLUDED.discount, net = EXCLUDED.net;
+
+-- Примеры отчётов по агрегатам:
+--   SELECT sale_date, shop_num, SUM(net) FROM daily_sales_rollup GROUP BY 1, 2 ORDER BY 1, 2;
+--   SELECT category, SUM(net) FROM daily_sales_rollup WHERE sale_date >= CURRENT_DATE - 30 GROUP BY 1;
@@ -0,0 +1,137 @@
+"""
+abc_xyz.py
+─────────────────────────────────────────────────────────────────────────────
+Общий векторизованный ABC/XYZ-классификатор для всего проекта.
+
+  - abc_classify: много метрик × много групп (категория, месяц, ...) за один
+    проход: argsort (lexsort) по группе и убыванию метрики, кумулятивная доля
+    внутри группы через cumsum, класс — через searchsorted по порогам.
+    Никаких циклов по группам и dict-перекодировок на уровне Python.
+  - xyz_classify: коэффициент вариации по периодам и класс X/Y/Z.
+  - abc_sql: эквивалентный SQL (оконные функции) для представлений в БД.
+
+Правило ABC (одинаковое здесь, в work.py и в v_product_abc):
+  кум. доля <= t0 → A, <= t1 → B, иначе C (сортировка по убыванию метрики).
+─────────────────────────────────────────────────────────────────────────────
+"""
+
+import numpy as np
+import pandas as pd
+
+ABC_THRESHOLDS = (0.80, 0.95)
+ABC_LABELS = ('A', 'B', 'C')
+XYZ_THRESHOLDS = (0.25, 0.50)
+XYZ_LABELS = ('X', 'Y', 'Z')
+
+
+def _group_codes(df: pd.DataFrame, by) -> tuple[np.ndarray, int]:
+    if not by:
+        return np.zeros(len(df), dtype=np.int64), 1
+    if len(by) == 1:
+        codes, uniques = pd.factorize(df[by[0]])
+    else:
+        codes, uniques = pd.MultiIndex.from_frame(df[by]).factorize()
+    return codes.astype(np.int64), len(uniques)
+
+
+def cumulative_share(values: np.ndarray, codes: np.ndarray, n_groups: int):
+    """Доля и кумулятивная доля каждого элемента внутри своей группы
+    (элементы группы упорядочены по убыванию values). Возвращает (share, cum_share, order)."""
+    values = np.asarray(values, dtype=np.float64)
+    # lexsort: последний ключ — главный → сортировка по группе, затем по убыванию значения
+    order = np.lexsort((-values, codes))
+    v_sorted = values[order]
+    g_sorted = codes[order]
+
+    totals = np.bincount(codes, weights=values, minlength=n_groups)
+    cs = np.cumsum(v_sorted)
+    # начало каждой группы в отсортированном массиве → вычитаем накопленное до неё
+    starts = np.flatnonzero(np.r_[True, g_sorted[1:] != g_sorted[:-1]])
+    base = np.zeros(n_groups)
+    base[g_sorted[starts]] = cs[starts] - v_sorted[starts]
+    cum_sorted = cs - base[g_sorted]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        denom = totals[g_sorted]
+        share_sorted = v_sorted / denom
+        cum_share_sorted = cum_sorted / denom
+
+    share = np.empty_like(share_sorted)
+    cum_share = np.empty_like(cum_share_sorted)
+    share[order] = share_sorted
+    cum_share[order] = cum_share_sorted
+    return share, cum_share, order
+
+
+def classify(values: np.ndarray, thresholds, labels) -> np.ndarray:
+    """Класс по порогам: x <= t0 → labels[0], x <= t1 → labels[1], ... ; NaN → None."""
+    values = np.asarray(values, dtype=np.float64)
+    idx = np.searchsorted(np.asarray(thresholds, dtype=np.float64), values, side='left')
+    out = np.asarray(labels, dtype=object)[np.minimum(idx, len(labels) - 1)]
+    out[np.isnan(values)] = None
+    return out
+
+
+def abc_classify(df: pd.DataFrame, metrics, by=None, thresholds=ABC_THRESHOLDS,
+                 labels=ABC_LABELS, prefix='abc_', with_shares=False) -> pd.DataFrame:
+    """ABC по нескольким метрикам сразу, отдельно внутри каждой группы `by`.
+    Возвращает DataFrame с индексом df и колонками {prefix}{metric}
+    (+ share_{metric}, cum_share_{metric} при with_shares=True; доли — от 0 до 1)."""
+    if isinstance(metrics, str):
+        metrics = [metrics]
+    by = [by] if isinstance(by, str) else list(by or [])
+    codes, n_groups = _group_codes(df, by)
+
+    out = {}
+    for m in metrics:
+        share, cum_share, _ = cumulative_share(df[m].to_numpy(), codes, n_groups)
+        out[f'{prefix}{m}'] = pd.Categorical(classify(cum_share, thresholds, labels), categories=list(labels))
+        if with_shares:
+            out[f'share_{m}'] = share
+            out[f'cum_share_{m}'] = cum_share
+    return pd.DataFrame(out, index=df.index)
+
+
+def xyz_classify(df: pd.DataFrame, item_cols, period_col: str, value_col: str,
+                 thresholds=XYZ_THRESHOLDS, labels=XYZ_LABELS) -> pd.DataFrame:
+    """XYZ по стабильности: CV = std / mean значения по периодам (строки df — item × period).
+    Возвращает по строке на item: mean, std, periods, cv, xyz."""
+    item_cols = [item_cols] if isinstance(item_cols, str) else list(item_cols)
+    per_period = df.groupby(item_cols + [period_col], observed=True)[value_col].sum()
+    stats = per_period.groupby(level=item_cols, observed=True).agg(
+        mean_rev='mean', std_rev='std', months='count'
+    ).reset_index()
+    mean = stats['mean_rev'].to_numpy(dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cv = np.where(mean != 0, stats['std_rev'].to_numpy(dtype=np.float64) / mean, np.nan)
+    stats['cv'] = cv
+    stats['xyz'] = pd.Categorical(classify(cv, thresholds, labels), categories=list(labels))
+    return stats
+
+
+def abc_sql(source: str, key_cols, metric: str, by=(), thresholds=ABC_THRESHOLDS,
+            labels=ABC_LABELS, class_col='abc_class') -> str:
+    """SQL с тем же правилом ABC, что и abc_classify.
+    source — таблица или подзапрос, уже агрегированный до уровня key_cols (+ by)."""
+    key_cols = [key_cols] if isinstance(key_cols, str) else list(key_cols)
+    by = [by] if isinstance(by, str) else list(by)
+    partition = f"PARTITION BY {', '.join(by)} " if by else ''
+    cases = '\n'.join(
+        f"        WHEN cumulative_{metric} / NULLIF(total_{metric}, 0) <= {t} THEN '{lbl}'"
+        for t, lbl in zip(thresholds, labels)
+    )
+    return f"""WITH ranked AS (
+    SELECT *,
+        SUM({metric}) OVER ({partition.strip()}) AS total_{metric},
+        SUM({metric}) OVER ({partition}ORDER BY {metric} DESC, {', '.join(key_cols)}
+            ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW) AS cumulative_{metric}
+    FROM {source}
+)
+SELECT *,
+    ROUND(({metric} / NULLIF(total_{metric}, 0) * 100)::NUMERIC, 2)            AS {metric}_share_pct,
+    ROUND((cumulative_{metric} / NULLIF(total_{metric}, 0) * 100)::NUMERIC, 2) AS cumulative_share_pct,
+    CASE
+{cases}
+        ELSE '{labels[-1]}'
+    END AS {class_col}
+FROM ranked"""
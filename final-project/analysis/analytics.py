@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+analytics.py
+─────────────────────────────────────────────────────────────────────────────
+Единая точка входа для аналитики:
+
+  analytics abc [--top N] [--csv]            ABC товаров 2023 (классы, топ-N)
+  analytics rfm [--csv]                      RFM-сегменты клиентов 2023
+  analytics report [1|2|all] [--only ...]    исследования целиком: графики, выводы
+  analytics startup [--repeat N]             замер старта подкоманд
+
+Источник для abc / rfm (--source):
+  views  — v_product_abc / v_customer_rfm (DB_DSN): только psycopg2, без numpy,
+           pandas и matplotlib — для cron и скриптов;
+  orders — заказы (raw_orders или синтетика) + тот же код, что в исследованиях
+           (metrics.py): numpy/pandas, без matplotlib;
+  lake   — Parquet-лейк (LAKE_DIR): группировка по товарам / клиентам в Arrow,
+           в pandas — только агрегаты; цифры — как у orders, БД не нужна;
+  auto   — views, если БД доступна, иначе orders (по умолчанию).
+Определения во views свои (db/views.sql): ABC считается с возвратами, RFM —
+по NTILE со своими сегментами; orders и lake повторяют research_1 / research_2
+(без возвратов, qcut и metrics.segment) — цифры источников различаются.
+
+Тяжёлые модули импортируются внутри подкоманд: pandas — источником orders и
+report'ом, matplotlib/seaborn — report'ом в первой стадии-графике (plotting.py).
+report выполняет скрипты в этом же процессе, поэтому `report all` настраивает
+шрифты один раз. Графики — в output/research1|2 относительно текущего каталога.
+
+--timing печатает в stderr время импортов, время команды и какие тяжёлые
+модули оказались загружены; `analytics startup` — медиану полного запуска
+(новый процесс) для каждой подкоманды и прежнюю цену импортов исследований.
+─────────────────────────────────────────────────────────────────────────────
+"""
+
+import time
+_T0 = time.perf_counter()
+
+import argparse
+import os
+import sys
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+REPORTS = {'1': HERE / 'research_1_assortment.py', '2': HERE / 'research_2_customers.py'}
+HEAVY = ('numpy', 'pandas', 'pyarrow', 'matplotlib', 'seaborn', 'scipy')
+
+ABC_SQL = """
+    SELECT abc_class, count(*), sum(revenue), sum(revenue) * 100 / sum(sum(revenue)) OVER ()
+    FROM v_product_abc GROUP BY abc_class ORDER BY abc_class
+"""
+TOP_SQL = """
+    SELECT product_id, product_name, category, revenue,
+           revenue_share_pct, cumulative_share_pct, abc_class
+    FROM v_product_abc ORDER BY revenue DESC, product_id LIMIT %s
+"""
+RFM_SQL = """
+    SELECT rfm_segment, count(*), avg(monetary), avg(frequency), avg(recency_days)
+    FROM v_customer_rfm GROUP BY rfm_segment ORDER BY count(*) DESC, rfm_segment
+"""
+
+ABC_HEADERS = ('abc', 'skus', 'revenue', 'share_pct')
+TOP_HEADERS = ('product_id', 'product_name', 'category', 'revenue', 'share_pct', 'cum_share_pct', 'abc')
+RFM_HEADERS = ('segment', 'customers', 'share_pct', 'avg_monetary', 'avg_frequency', 'avg_recency')
+
+# что раньше выполнял каждый запуск research_1 до первой строки работы (для startup)
+OLD_PRELUDE = """
+import os, numpy, pandas, matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt, matplotlib.patches, matplotlib.gridspec, seaborn
+from matplotlib.lines import Line2D
+from scipy.stats import pearsonr
+import matplotlib.font_manager as fm
+for f in ['/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+          '/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf']:
+    if os.path.exists(f):
+        fm.fontManager.addfont(f)
+plt.rcParams['font.family'] = 'DejaVu Sans'
+"""
+
+
+# ── вывод ─────────────────────────────────────────────────────────────────────
+def _cell(value) -> str:
+    if value is None:
+        return ''
+    if isinstance(value, int):
+        return f'{value:,}'
+    if isinstance(value, str):
+        return value
+    return f'{float(value):,.2f}'   # float, Decimal из psycopg2
+
+
+def emit(title: str, headers, rows, as_csv: bool):
+    if as_csv:
+        import csv
+        writer = csv.writer(sys.stdout)
+        writer.writerow(headers)
+        writer.writerows(rows)
+        return
+    cells = [[_cell(v) for v in row] for row in rows]
+    widths = [max([len(h)] + [len(row[i]) for row in cells]) for i, h in enumerate(headers)]
+    print(f'\n=== {title} ===')
+    print('  '.join(h.ljust(w) for h, w in zip(headers, widths)))
+    for row, raw in zip(cells, rows):
+        print('  '.join(c.ljust(w) if isinstance(v, str) else c.rjust(w)
+                        for c, v, w in zip(row, raw, widths)))
+
+
+# ── источники ─────────────────────────────────────────────────────────────────
+def connect(required: bool):
+    """Соединение с БД или None (нет DB_DSN / БД недоступна) — тогда источник orders."""
+    dsn = os.getenv('DB_DSN')
+    if dsn:
+        import psycopg2
+        try:
+            return psycopg2.connect(dsn)
+        except Exception as e:
+            if required:
+                sys.exit(f'analytics: DB connection failed: {e}')
+            print(f'DB connection failed: {e} — using orders', file=sys.stderr)
+    elif required:
+        sys.exit('analytics: --source views needs DB_DSN')
+    return None
+
+
+def source_conn(args):
+    if args.source in ('orders', 'lake'):
+        return None
+    return connect(required=args.source == 'views')
+
+
+def query(conn, sql, params=None) -> list[tuple]:
+    with conn.cursor() as cur:
+        cur.execute(sql, params)
+        return cur.fetchall()
+
+
+def from_lake(aggregate):
+    """Агрегат по Parquet-лейку; нет лейка — понятная ошибка вместо трейсбека pyarrow."""
+    try:
+        return aggregate()
+    except FileNotFoundError as e:
+        sys.exit(f'analytics: --source lake: {e}; каталог лейка задаёт LAKE_DIR')
+
+
+def orders(loader):
+    """Заказы через datasets.*; «Loaded N rows» / «Demo data» — в stderr, не в вывод команды."""
+    import warnings
+    from contextlib import redirect_stdout
+    warnings.filterwarnings('ignore', message='pandas only supports SQLAlchemy')
+    with redirect_stdout(sys.stderr):
+        return loader()
+
+
+# ── подкоманды ────────────────────────────────────────────────────────────────
+def cmd_abc(args):
+    conn = source_conn(args)
+    if conn is not None:
+        with conn:
+            classes = query(conn, ABC_SQL)
+            top = query(conn, TOP_SQL, (args.top,)) if args.top else []
+        conn.close()
+        source = 'v_product_abc'
+    else:
+        from metrics import classify_products, lake_product_revenue, product_revenue
+        if args.source == 'lake':
+            product_rev = classify_products(from_lake(lake_product_revenue))
+        else:
+            import datasets
+            product_rev = classify_products(product_revenue(orders(datasets.assortment_orders)))
+        by_class = product_rev.groupby('abc').agg(
+            skus=('product_id', 'count'), revenue=('revenue', 'sum'), share=('rev_share', 'sum'))
+        classes = [(cls, int(r.skus), float(r.revenue), float(r.share)) for cls, r in by_class.iterrows()]
+        top = [(r.product_id, r.product_name, r.category, float(r.revenue),
+                float(r.rev_share), float(r.cum_share), r.abc)
+               for r in product_rev.head(args.top).itertuples()] if args.top else []
+        source = args.source if args.source == 'lake' else 'orders'
+
+    if top and args.csv:   # CSV — одна таблица: с --top это товары
+        emit('', TOP_HEADERS, top, args.csv)
+        return
+    emit(f'ABC Summary ({source})', ABC_HEADERS, classes, args.csv)
+    if top:
+        emit(f'Top {args.top} products ({source})', TOP_HEADERS, top, args.csv)
+
+
+def cmd_rfm(args):
+    conn = source_conn(args)
+    if conn is not None:
+        with conn:
+            rows = query(conn, RFM_SQL)
+        conn.close()
+        total = sum(r[1] for r in rows) or 1
+        rows = [(seg, n, n / total * 100, mon, freq, rec) for seg, n, mon, freq, rec in rows]
+        source = 'v_customer_rfm'
+    else:
+        from metrics import customer_facts, lake_customer_facts, rfm_scores, segment_stats
+        if args.source == 'lake':
+            facts = from_lake(lake_customer_facts)
+        else:
+            import datasets
+            import pandas as pd
+            df = orders(datasets.customer_orders)
+            df['order_date'] = pd.to_datetime(df['order_date'])
+            facts = customer_facts(df[~df['is_returned']])
+        seg_stats = segment_stats(rfm_scores(facts))
+        seg_stats = seg_stats.sort_values(['count', 'segment'], ascending=[False, True])
+        rows = [(r.segment, int(r.count), float(r.share), float(r.avg_monetary),
+                 float(r.avg_frequency), float(r.avg_recency)) for r in seg_stats.itertuples()]
+        source = args.source if args.source == 'lake' else 'orders'
+
+    emit(f'RFM Segments ({source})', RFM_HEADERS, rows, args.csv)
+
+
+def cmd_report(args):
+    import runpy
+    script_args = [*(['--only', *args.only] if args.only else []),
+                   *(['--force'] if args.force else []),
+                   *(['--list'] if args.list else []),
+                   *(['--backend', args.backend] if args.backend else []),
+                   *(['--profile'] if args.profile else []),
+                   *(['--cprofile'] if args.cprofile else [])]
+    saved_argv = sys.argv
+    try:
+        for key in (REPORTS if args.which == 'all' else [args.which]):
+            script = str(REPORTS[key])
+            sys.argv = [script, *script_args]
+            try:
+                runpy.run_path(script, run_name='__main__')
+            except SystemExit as e:   # --list завершает скрипт через sys.exit(0)
+                if e.code not in (None, 0):
+                    raise
+    finally:
+        sys.argv = saved_argv
+
+
+def cmd_startup(args):
+    import statistics
+    import subprocess
+
+    me = [sys.executable, str(Path(__file__).resolve())]
+    cases = [('python -c pass', [sys.executable, '-c', 'pass']),
+             ('analytics --help', me + ['--help'])]
+    if os.getenv('DB_DSN'):
+        cases += [('analytics abc (views)', me + ['abc', '--source', 'views']),
+                  ('analytics rfm (views)', me + ['rfm', '--source', 'views'])]
+    cases += [('analytics abc (orders)', me + ['abc', '--source', 'orders']),
+              ('analytics abc (lake)', me + ['abc', '--source', 'lake']),
+              ('research imports + fonts (old)', [sys.executable, '-c', OLD_PRELUDE])]
+
+    print(f'=== Start-up, wall per run, new process ({args.repeat} runs) ===')
+    print(f'  {"command":<32} {"median":>9} {"min":>9}')
+    for label, cmd in cases:
+        times = []
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            done = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            times.append(time.perf_counter() - t0)
+            if done.returncode:
+                break
+        if done.returncode:
+            print(f'  {label:<32} {"failed":>9}')
+        else:
+            print(f'  {label:<32} {statistics.median(times) * 1000:7.0f} ms {min(times) * 1000:6.0f} ms')
+
+
+# ── CLI ───────────────────────────────────────────────────────────────────────
+def build_parser() -> argparse.ArgumentParser:
+    ap = argparse.ArgumentParser(prog='analytics', description="Marketplace analytics: ABC, RFM, research reports")
+    ap.add_argument('--timing', action='store_true',
+                    help='время импортов и команды, загруженные тяжёлые модули → stderr')
+    sub = ap.add_subparsers(dest='command', required=True)
+
+    def with_source(p):
+        p.add_argument('--source', choices=['auto', 'views', 'orders', 'lake'], default='auto',
+                       help='views — представления в БД; orders — заказы + pandas (без БД — демо); '
+                            'lake — Parquet-лейк + Arrow')
+        p.add_argument('--csv', action='store_true', help='CSV в stdout вместо таблицы')
+        return p
+
+    p = with_source(sub.add_parser('abc', help='ABC товаров: SKU, выручка и доля по классам'))
+    p.add_argument('--top', type=int, default=0, metavar='N', help='и N товаров с наибольшей выручкой')
+    p.set_defaults(func=cmd_abc)
+
+    p = with_source(sub.add_parser('rfm', help='RFM-сегменты: клиенты, доля, средние M/F/R'))
+    p.set_defaults(func=cmd_rfm)
+
+    p = sub.add_parser('report', help='исследования 1 (ассортимент) и/или 2 (клиенты) с графиками')
+    p.add_argument('which', nargs='?', choices=['1', '2', 'all'], default='all')
+    p.add_argument('--only', nargs='+', metavar='STAGE', help='только эти стадии: charts.bcg, charts, summary ...')
+    p.add_argument('--force', action='store_true', help='пересчитать выбранные стадии')
+    p.add_argument('--list', action='store_true', help='стадии и их состояние')
+    p.add_argument('--backend', choices=['db', 'lake'], help='заказы из БД или из Parquet-лейка')
+    p.add_argument('--profile', action='store_true', help='профиль по секциям → OUT/profile.csv')
+    p.add_argument('--cprofile', action='store_true', help='--profile + дамп cProfile')
+    p.set_defaults(func=cmd_report)
+
+    p = sub.add_parser('startup', help='замер времени запуска подкоманд')
+    p.add_argument('--repeat', type=int, default=5)
+    p.set_defaults(func=cmd_startup)
+    return ap
+
+
+def main():
+    args = build_parser().parse_args()
+    t_imports = time.perf_counter() - _T0
+    t0 = time.perf_counter()
+    try:
+        args.func(args)
+    finally:
+        if args.timing:
+            loaded = [m for m in HEAVY if m in sys.modules]
+            print(f'analytics {args.command}: imports {t_imports * 1000:.0f} ms, '
+                  f'command {(time.perf_counter() - t0) * 1000:.0f} ms, '
+                  f'heavy modules: {", ".join(loaded) or "none"}', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
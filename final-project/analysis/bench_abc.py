@@ -0,0 +1,80 @@
+"""
+bench_abc.py
+─────────────────────────────────────────────────────────────────────────────
+Бенчмарк ABC-классификации: прежний подход «на серию» (sort → cumsum → pd.cut
+→ dict-перекодировка, по группе за раз) против векторизованного abc_xyz.
+
+Использование:
+    python bench_abc.py --skus 1000000 --groups 12
+    python bench_abc.py --skus 50000 --groups 84   # 50k SKU × 7 категорий × 12 мес.
+─────────────────────────────────────────────────────────────────────────────
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from abc_xyz import abc_classify, ABC_THRESHOLDS
+
+
+def abc_class_per_series(series: pd.Series, thresholds=ABC_THRESHOLDS) -> pd.Series:
+    # как было в work.py / research_1: отдельная сортировка и dict-перекодировка на каждую серию
+    s = series.sort_values(ascending=False)
+    cum = s.cumsum() / s.sum()
+    labels_sorted = pd.cut(cum, bins=[-np.inf, thresholds[0], thresholds[1], np.inf],
+                           labels=['A', 'B', 'C'])
+    return series.index.to_series().map(dict(zip(s.index, labels_sorted)))
+
+
+def make_data(n_skus: int, n_groups: int, seed: int = 42) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'group':   rng.integers(0, n_groups, n_skus),
+        'revenue': rng.pareto(1.5, n_skus) * 1000,
+        'units':   rng.pareto(2.0, n_skus) * 10,
+    })
+
+
+def timeit(fn, repeat: int):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def main():
+    ap = argparse.ArgumentParser(description="ABC classifier benchmark")
+    ap.add_argument('--skus', type=int, default=1_000_000)
+    ap.add_argument('--groups', type=int, default=12, help="число групп (категория × месяц)")
+    ap.add_argument('--repeat', type=int, default=3)
+    args = ap.parse_args()
+
+    df = make_data(args.skus, args.groups)
+    metrics = ['revenue', 'units']
+
+    def old():
+        out = {}
+        for m in metrics:
+            out[m] = pd.concat([abc_class_per_series(g[m]) for _, g in df.groupby('group')]).reindex(df.index)
+        return out
+
+    def new():
+        return abc_classify(df, metrics, by='group', prefix='')
+
+    t_old, r_old = timeit(old, args.repeat)
+    t_new, r_new = timeit(new, args.repeat)
+
+    same = all((r_old[m].astype(str).values == r_new[m].astype(str).values).all() for m in metrics)
+    print(f"SKU: {args.skus:,}  groups: {args.groups}  metrics: {len(metrics)}")
+    print(f"  per-series (old): {t_old:8.3f} s")
+    print(f"  vectorized (new): {t_new:8.3f} s   x{t_old / t_new:.1f}")
+    print(f"  identical classes: {same}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+bench_intervals.py
+─────────────────────────────────────────────────────────────────────────────
+Бенчмарк интервалов между заказами и воронки повторных покупок: прежний
+расчёт research_2 (isin по groupby-count → copy → sort_values по строковому
+customer_id → groupby().shift(1); воронка — ещё один groupby().count())
+против purchase_intervals.purchase_stats (factorize → lexsort → np.diff).
+
+Использование:
+    python bench_intervals.py --orders 2000000 --customers 300000
+─────────────────────────────────────────────────────────────────────────────
+"""
+
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from bench_abc import timeit
+from purchase_intervals import purchase_stats, FUNNEL_BUCKETS
+
+
+def make_data(n_orders: int, n_customers: int, seed: int = 42) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    # Парето-частоты, как в демо-данных research_2: много разовых клиентов и «хвост»
+    weights = rng.pareto(1.5, n_customers) + 1
+    customer = rng.choice(n_customers, n_orders, p=weights / weights.sum())
+    return pd.DataFrame({
+        'order_id':    np.arange(n_orders),
+        'order_date':  pd.Timestamp('2023-01-01') + pd.to_timedelta(rng.integers(0, 365, n_orders), unit='D'),
+        'customer_id': np.char.add('C', np.char.zfill(customer.astype(str), 6)).astype(object),
+    })
+
+
+def old(df: pd.DataFrame):
+    repeat = df[df['customer_id'].isin(
+        df.groupby('customer_id')['order_id'].count()[
+            lambda x: x >= 2].index)].copy()
+    repeat = repeat.sort_values(['customer_id', 'order_date'])
+    repeat['prev_date'] = repeat.groupby('customer_id')['order_date'].shift(1)
+    repeat['interval_days'] = (repeat['order_date'] - repeat['prev_date']).dt.days
+    intervals = repeat['interval_days'].dropna()
+
+    purchase_counts = df.groupby('customer_id')['order_id'].count()
+    funnel = [((purchase_counts >= lo) & (purchase_counts <= (hi or np.inf))).sum()
+              for _, lo, hi in FUNNEL_BUCKETS]
+    return intervals, funnel
+
+
+def new(df: pd.DataFrame):
+    stats = purchase_stats(df['customer_id'], df['order_date'])
+    return stats.intervals, stats.funnel()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Inter-purchase interval and funnel benchmark")
+    ap.add_argument('--orders', type=int, default=2_000_000)
+    ap.add_argument('--customers', type=int, default=300_000)
+    ap.add_argument('--repeat', type=int, default=3)
+    args = ap.parse_args()
+
+    df = make_data(args.orders, args.customers)
+
+    t_old, (i_old, f_old) = timeit(lambda: old(df), args.repeat)
+    t_new, (i_new, f_new) = timeit(lambda: new(df), args.repeat)
+
+    same_intervals = np.array_equal(np.sort(i_old.to_numpy()), np.sort(i_new.astype(np.float64)))
+    print(f"orders: {args.orders:,}  customers: {args.customers:,}  intervals: {len(i_new):,}")
+    print(f"  groupby/shift (old): {t_old:8.3f} s")
+    print(f"  lexsort/diff  (new): {t_new:8.3f} s   x{t_old / t_new:.1f}")
+    print(f"  median: {i_old.median():.1f} / {np.median(i_new):.1f}   "
+          f"mean: {i_old.mean():.4f} / {i_new.mean():.4f}")
+    print(f"  identical intervals: {same_intervals}   identical funnel: {list(map(int, f_old)) == f_new}")
+
+
+if __name__ == '__main__':
+    main()
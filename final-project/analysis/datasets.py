@@ -0,0 +1,238 @@
+"""
+datasets.py
+─────────────────────────────────────────────────────────────────────────────
+Загрузка данных для исследований: заказы 2023 из raw_orders (DB_DSN) или,
+если БД недоступна, синтетика с фиксированным seed — те же данные, что
+раньше генерировали сами research_1 / research_2.
+
+backend='lake' — те же заказы из Parquet-лейка (api/lake.py,
+lake/order_date=YYYY-MM-DD/*.parquet) через pyarrow.dataset: фильтр по
+order_date отсекает партиции вне периода, читаются только нужные колонки,
+файлы сканируются в несколько потоков. Боевая БД при этом не нагружается.
+
+Только numpy/pandas (pyarrow — лениво, для lake): модуль импортируют и
+скрипты-исследования (стадия load), и подкоманды analytics.py.
+─────────────────────────────────────────────────────────────────────────────
+"""
+
+import os
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+START, END = date(2023, 1, 1), date(2023, 12, 31)
+LAKE_DIR = os.getenv('LAKE_DIR') or str(Path(__file__).resolve().parent.parent / 'lake')
+BACKENDS = ('db', 'lake')
+
+CUSTOMER_COLUMNS = ['order_id', 'order_date', 'customer_id', 'customer_city',
+                    'customer_gender', 'category', 'revenue', 'profit', 'is_returned', 'rating']
+
+
+# ════════════════════════════════════════════════════════════════════════════
+# LAKE
+# ════════════════════════════════════════════════════════════════════════════
+def lake_table(columns=None, where=None, start=START, end=END, lake_dir=None):
+    """pyarrow.Table заказов за start..end из лейка. where — выражение pyarrow.dataset
+    (проталкивается в сканирование); order_date — колонка партиции (date32)."""
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    root = lake_dir or LAKE_DIR
+    if not os.path.isdir(root):
+        raise FileNotFoundError(f"lake not found: {root} (api/export_lake.py выгрузит историю)")
+    if next(Path(root).glob('order_date=*/*.parquet'), None) is None:
+        raise FileNotFoundError(f"lake is empty: {root} (api/export_lake.py выгрузит историю)")
+    dataset = ds.dataset(root, format='parquet', partitioning=ds.partitioning(
+        pa.schema([('order_date', pa.date32())]), flavor='hive'))
+    # условие на колонку партиции — отбрасывает каталоги вне периода до чтения файлов
+    condition = (ds.field('order_date') >= start) & (ds.field('order_date') <= end)
+    if where is not None:
+        condition = condition & where
+    return dataset.to_table(columns=columns, filter=condition, use_threads=True)
+
+
+def lake_orders(columns=None, start=START, end=END, lake_dir=None) -> pd.DataFrame:
+    df = lake_table(columns, start=start, end=end, lake_dir=lake_dir).to_pandas()
+    print(f"Loaded {len(df)} rows from lake")
+    return df
+
+
+# ════════════════════════════════════════════════════════════════════════════
+# ИССЛЕДОВАНИЕ 1: АССОРТИМЕНТ
+# ════════════════════════════════════════════════════════════════════════════
+def assortment_orders(backend: str = 'db') -> pd.DataFrame:
+    """Заказы 2023 для исследования 1 (все колонки raw_orders); без БД / лейка — синтетика."""
+    if backend == 'lake':
+        try:
+            return lake_orders()
+        except Exception as e:
+            print(f"Lake read failed: {e} — using demo data")
+            return demo_assortment_orders()
+
+    dsn = os.getenv("DB_DSN")
+    if dsn:
+        try:
+            import psycopg2
+            conn = psycopg2.connect(dsn)
+            df = pd.read_sql("""
+                SELECT * FROM raw_orders
+                WHERE order_date BETWEEN '2023-01-01' AND '2023-12-31'
+            """, conn)
+            conn.close()
+            print(f"Loaded {len(df)} rows from DB")
+            return df
+        except Exception as e:
+            print(f"DB connection failed: {e} — using demo data")
+
+    # Demo: генерируем синтетику
+    return demo_assortment_orders()
+
+
+def demo_assortment_orders() -> pd.DataFrame:
+    np.random.seed(42)
+    N = 25000
+    cats = {
+        'Электроника':   {'sub': ['Смартфоны','Ноутбуки','Аудио','Планшеты'],   'price_m': 18000, 'price_s': 10000, 'cost_r': 0.60},
+        'Одежда':        {'sub': ['Верхняя','Платья','Брюки','Аксессуары'],       'price_m':  3500, 'price_s':  2000, 'cost_r': 0.35},
+        'Дом и сад':     {'sub': ['Мебель','Текстиль','Инструменты','Декор'],     'price_m':  5000, 'price_s':  3000, 'cost_r': 0.45},
+        'Спорт':         {'sub': ['Тренажёры','Одежда','Инвентарь','Питание'],    'price_m':  4500, 'price_s':  3000, 'cost_r': 0.42},
+        'Красота':       {'sub': ['Уход','Парфюмерия','Макияж','Волосы'],         'price_m':  1800, 'price_s':   900, 'cost_r': 0.30},
+        'Книги':         {'sub': ['Художественная','Нон-фикшн','Учебники','Дети'],'price_m':   600, 'price_s':   300, 'cost_r': 0.25},
+        'Детские товары':{'sub': ['Игрушки','Одежда','Питание','Развитие'],       'price_m':  3000, 'price_s':  1800, 'cost_r': 0.38},
+    }
+    cat_names = list(cats.keys())
+    cat_w = [0.20, 0.22, 0.15, 0.12, 0.13, 0.08, 0.10]
+    np.random.choice(cat_names, N, p=cat_w)  # результат не нужен, но вызов продвигает генератор — демо-данные прежние
+
+    n_products = 200
+    product_ids   = [f'P{i:04d}' for i in range(1, n_products+1)]
+    product_cats  = np.random.choice(cat_names, n_products, p=cat_w)
+    product_subs  = np.array([np.random.choice(cats[c]['sub']) for c in product_cats])
+    product_names = [f'{c.split()[0]} {s} #{i}' for i, (c, s) in enumerate(zip(product_cats, product_subs), 1)]
+    # Продукты с разной популярностью (Парето: 20% дают 80% продаж)
+    product_pop = np.random.pareto(2, n_products) + 1
+    product_pop = product_pop / product_pop.sum()
+
+    # Генерируем заказы
+    order_products = np.random.choice(n_products, N, p=product_pop)
+    cats_arr = product_cats[order_products]
+    subs_arr = product_subs[order_products]
+
+    prices = np.array([
+        max(50, np.random.normal(cats[c]['price_m'], cats[c]['price_s']))
+        for c in cats_arr
+    ])
+    cost_rates = np.array([cats[c]['cost_r'] for c in cats_arr])
+    costs = prices * cost_rates
+
+    qty = np.clip(np.random.poisson(1.3, N), 1, 6).astype(int)
+    disc = np.random.choice([0,0,0,5,10,15,20,25,30], N,
+                             p=[0.45,0.10,0.10,0.10,0.07,0.07,0.05,0.03,0.03])
+    revenue = prices * qty * (1 - disc/100)
+    profit  = revenue - costs * qty
+
+    dates = pd.to_datetime('2023-01-01') + pd.to_timedelta(np.random.randint(0, 365, N), unit='D')
+    cities = np.random.choice(['Москва','СПб','Новосибирск','Екатеринбург','Казань','Краснодар'],
+                               N, p=[0.30,0.18,0.12,0.10,0.10,0.20])
+    return_prob = np.where(np.isin(cats_arr, ['Одежда']), 0.12,
+                  np.where(np.isin(cats_arr, ['Электроника']), 0.06, 0.04))
+    is_returned = np.random.binomial(1, return_prob)
+
+    customers = np.random.choice([f'C{i:05d}' for i in range(1, 4001)], N)
+
+    df = pd.DataFrame({
+        'order_id':     [f'O{i:06d}' for i in range(N)],
+        'order_date':   dates,
+        'customer_id':  customers,
+        'customer_city':cities,
+        'product_id':   [product_ids[i] for i in order_products],
+        'product_name': [product_names[i] for i in order_products],
+        'category':     cats_arr,
+        'subcategory':  subs_arr,
+        'brand':        np.random.choice(['BrandA','BrandB','BrandC','NoName','Premium'], N,
+                                         p=[0.20,0.18,0.15,0.30,0.17]),
+        'price':        np.round(prices, 0),
+        'cost_price':   np.round(costs, 0),
+        'quantity':     qty,
+        'discount_pct': disc.astype(float),
+        'revenue':      np.round(revenue, 2),
+        'profit':       np.round(profit, 2),
+        'is_returned':  is_returned.astype(bool),
+        'rating':       np.clip(np.round(np.random.normal(4.0, 0.9, N), 1), 1, 5),
+    })
+    print(f"Demo data: {len(df)} rows")
+    return df
+
+
+# ════════════════════════════════════════════════════════════════════════════
+# ИССЛЕДОВАНИЕ 2: КЛИЕНТЫ
+# ════════════════════════════════════════════════════════════════════════════
+def customer_orders(backend: str = 'db') -> pd.DataFrame:
+    """Заказы 2023 для исследования 2 (колонки клиента и суммы); без БД / лейка — синтетика."""
+    if backend == 'lake':
+        try:
+            return lake_orders(CUSTOMER_COLUMNS)
+        except Exception as e:
+            print(f"Lake read failed: {e} — demo mode")
+            backend = 'demo'
+
+    dsn = os.getenv("DB_DSN") if backend == 'db' else None
+    if dsn:
+        try:
+            import psycopg2
+            conn = psycopg2.connect(dsn)
+            df = pd.read_sql("""
+                SELECT order_id, order_date, customer_id, customer_city,
+                       customer_gender, category, revenue, profit, is_returned, rating
+                FROM raw_orders
+                WHERE order_date BETWEEN '2023-01-01' AND '2023-12-31'
+            """, conn)
+            conn.close()
+            return df
+        except Exception as e:
+            print(f"DB failed: {e} — demo mode")
+
+    # Demo
+    np.random.seed(7)
+    N = 25000
+    cats = ['Электроника','Одежда','Дом и сад','Спорт','Красота','Книги','Детские товары']
+    cat_w = [0.20, 0.22, 0.15, 0.12, 0.13, 0.08, 0.10]
+
+    # Клиенты с разной частотой покупок (Парето)
+    n_clients = 4000
+    client_ids = [f'C{i:05d}' for i in range(1, n_clients+1)]
+    client_freq = np.random.pareto(1.5, n_clients) + 1
+    client_freq = client_freq / client_freq.sum()
+
+    customers = np.random.choice(client_ids, N, p=client_freq)
+    categories = np.random.choice(cats, N, p=cat_w)
+    price_m = {'Электроника': 18000, 'Одежда': 3500, 'Дом и сад': 5000,
+               'Спорт': 4500, 'Красота': 1800, 'Книги': 600, 'Детские товары': 3000}
+    price_s = {'Электроника': 10000, 'Одежда': 2000, 'Дом и сад': 3000,
+               'Спорт': 3000, 'Красота': 900, 'Книги': 300, 'Детские товары': 1800}
+    revenue = np.array([max(50, np.random.normal(price_m[c], price_s[c]))
+                        for c in categories])
+    profit = revenue * np.random.uniform(0.20, 0.55, N)
+
+    dates = pd.to_datetime('2023-01-01') + pd.to_timedelta(
+        np.random.randint(0, 365, N), unit='D')
+    cities = np.random.choice(['Москва','СПб','Новосибирск','Екатеринбург','Краснодар'],
+                               N, p=[0.30,0.20,0.15,0.15,0.20])
+    gender = np.random.choice(['M','F',''], N, p=[0.42, 0.50, 0.08])
+    return_prob = np.where(np.array(categories) == 'Одежда', 0.12, 0.05)
+    is_returned = np.random.binomial(1, return_prob).astype(bool)
+
+    return pd.DataFrame({
+        'order_id':       [f'O{i:06d}' for i in range(N)],
+        'order_date':     dates,
+        'customer_id':    customers,
+        'customer_city':  cities,
+        'customer_gender':gender,
+        'category':       categories,
+        'revenue':        np.round(revenue, 2),
+        'profit':         np.round(profit, 2),
+        'is_returned':    is_returned,
+        'rating':         np.clip(np.round(np.random.normal(4.0, 0.9, N), 1), 1, 5),
+    })
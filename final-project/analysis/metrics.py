@@ -0,0 +1,138 @@
+"""
+metrics.py
+─────────────────────────────────────────────────────────────────────────────
+Агрегаты исследований, которые нужны и без графиков: ABC товаров
+(исследование 1) и RFM-сегменты клиентов (исследование 2).
+
+Стадии research_1 / research_2 и подкоманды `analytics abc` / `analytics rfm`
+считают их одним и тем же кодом. Только numpy/pandas.
+
+lake_product_revenue / lake_customer_facts — первые, тяжёлые шаги тех же
+расчётов прямо по Parquet-лейку (group_by в Arrow, многопоточно): в pandas
+приходят уже агрегаты по товарам / клиентам, а не строки заказов. Дальше —
+те же classify_products / rfm_scores.
+─────────────────────────────────────────────────────────────────────────────
+"""
+
+import pandas as pd
+
+from abc_xyz import abc_classify
+
+SNAPSHOT = pd.Timestamp('2024-01-01')
+
+
+def kept(df):
+    return df[~df['is_returned']]  # без возвратов для финансовых метрик
+
+
+# ── ABC товаров ─────────────────────────────────────────────────────────────
+def product_revenue(df: pd.DataFrame) -> pd.DataFrame:
+    """Выручка, прибыль, заказы, штуки, средняя цена и скидка по товарам (без возвратов)."""
+    return kept(df).groupby(['product_id', 'product_name', 'category']).agg(
+        revenue=('revenue', 'sum'),
+        profit=('profit', 'sum'),
+        orders=('order_id', 'count'),
+        units=('quantity', 'sum'),
+        avg_price=('price', 'mean'),
+        avg_disc=('discount_pct', 'mean'),
+    ).reset_index()
+
+
+def classify_products(product_rev: pd.DataFrame) -> pd.DataFrame:
+    """Товары по убыванию выручки: доля, кум. доля, класс A/B/C, маржа."""
+    product_rev = product_rev.sort_values('revenue', ascending=False)
+    abc_cls = abc_classify(product_rev, 'revenue', with_shares=True)
+    product_rev['rev_share']  = abc_cls['share_revenue'] * 100
+    product_rev['cum_share']  = abc_cls['cum_share_revenue'] * 100
+    product_rev['abc'] = abc_cls['abc_revenue']
+    product_rev['margin_pct'] = product_rev['profit'] / product_rev['revenue'] * 100
+    return product_rev
+
+
+def product_abc(df: pd.DataFrame) -> pd.DataFrame:
+    return classify_products(product_revenue(df))
+
+
+def lake_product_revenue(lake_dir=None) -> pd.DataFrame:
+    """product_revenue по лейку: фильтр возвратов — в сканировании, группировка — в Arrow."""
+    import pyarrow.dataset as ds
+    from datasets import lake_table
+
+    keys = ['product_id', 'product_name', 'category']
+    table = lake_table(keys + ['order_id', 'revenue', 'profit', 'quantity', 'price', 'discount_pct'],
+                       where=~ds.field('is_returned'), lake_dir=lake_dir)
+    product_rev = table.group_by(keys).aggregate([
+        ('revenue', 'sum'), ('profit', 'sum'), ('order_id', 'count'),
+        ('quantity', 'sum'), ('price', 'mean'), ('discount_pct', 'mean'),
+    ]).to_pandas().rename(columns={
+        'revenue_sum': 'revenue', 'profit_sum': 'profit', 'order_id_count': 'orders',
+        'quantity_sum': 'units', 'price_mean': 'avg_price', 'discount_pct_mean': 'avg_disc'})
+    # порядок и пропуски ключей — как у groupby в pandas
+    product_rev = product_rev.dropna(subset=keys).sort_values(keys, ignore_index=True)
+    return product_rev[keys + ['revenue', 'profit', 'orders', 'units', 'avg_price', 'avg_disc']]
+
+
+# ── RFM ─────────────────────────────────────────────────────────────────────
+def segment(row):
+    r, f, m = row['R'], row['F'], row['M']
+    if r >= 4 and f >= 4:             return 'Champions'
+    if r >= 3 and f >= 3:             return 'Loyal'
+    if r >= 4 and f < 2:              return 'New Customers'
+    if r >= 3 and f < 3:              return 'Potential Loyal'
+    if r == 2 and f >= 3:             return 'At Risk'
+    if r <= 2 and f <= 2 and m >= 3:  return 'Can\'t Lose'
+    if r <= 2:                        return 'Lost'
+    return 'Others'
+
+
+def customer_facts(df_clean: pd.DataFrame) -> pd.DataFrame:
+    """Последний заказ, число заказов и выручка по клиентам; df_clean — без возвратов."""
+    return df_clean.groupby('customer_id').agg(
+        last_date=('order_date', 'max'),
+        frequency=('order_id', 'count'),
+        monetary=('revenue', 'sum'),
+    ).reset_index()
+
+
+def lake_customer_facts(lake_dir=None) -> pd.DataFrame:
+    """customer_facts по лейку (без возвратов): max(order_date), count, sum — в Arrow."""
+    import pyarrow.dataset as ds
+    from datasets import lake_table
+
+    table = lake_table(['customer_id', 'order_date', 'order_id', 'revenue'],
+                       where=~ds.field('is_returned'), lake_dir=lake_dir)
+    facts = table.group_by('customer_id').aggregate([
+        ('order_date', 'max'), ('order_id', 'count'), ('revenue', 'sum'),
+    ]).to_pandas().rename(columns={
+        'order_date_max': 'last_date', 'order_id_count': 'frequency', 'revenue_sum': 'monetary'})
+    facts['last_date'] = pd.to_datetime(facts['last_date'])
+    facts = facts.dropna(subset=['customer_id']).sort_values('customer_id', ignore_index=True)
+    return facts[['customer_id', 'last_date', 'frequency', 'monetary']]
+
+
+def rfm_scores(rfm: pd.DataFrame, snapshot=SNAPSHOT) -> pd.DataFrame:
+    """R/F/M по квинтилям и сегмент. Строки — по customer_id (от порядка зависит rank 'first')."""
+    rfm['recency'] = (snapshot - rfm['last_date']).dt.days
+
+    rfm['R'] = pd.qcut(rfm['recency'],   5, labels=[5,4,3,2,1]).astype(int)
+    rfm['F'] = pd.qcut(rfm['frequency'].rank(method='first'), 5, labels=[1,2,3,4,5]).astype(int)
+    rfm['M'] = pd.qcut(rfm['monetary'].rank(method='first'),  5, labels=[1,2,3,4,5]).astype(int)
+    rfm['rfm_score'] = rfm['R']*100 + rfm['F']*10 + rfm['M']
+    rfm['segment'] = rfm.apply(segment, axis=1)
+    return rfm
+
+
+def rfm_table(df_clean: pd.DataFrame, snapshot=SNAPSHOT) -> pd.DataFrame:
+    """RFM по клиентам: df_clean — заказы без возвратов, order_date — datetime."""
+    return rfm_scores(customer_facts(df_clean), snapshot)
+
+
+def segment_stats(rfm: pd.DataFrame) -> pd.DataFrame:
+    seg_stats = rfm.groupby('segment').agg(
+        count=('customer_id', 'count'),
+        avg_monetary=('monetary', 'mean'),
+        avg_frequency=('frequency', 'mean'),
+        avg_recency=('recency', 'mean'),
+    ).reset_index()
+    seg_stats['share'] = seg_stats['count'] / seg_stats['count'].sum() * 100
+    return seg_stats
@@ -0,0 +1,64 @@
+"""
+plotting.py
+─────────────────────────────────────────────────────────────────────────────
+Ленивый matplotlib/seaborn для скриптов-исследований.
+
+  from plotting import plt, sns, mpatches
+
+plt, sns, mpatches — заглушки модулей: настоящий импорт (и настройка Agg,
+шрифтов DejaVu, rcParams) происходит при первом обращении к атрибуту, то есть
+в первой стадии-графике. --list, --only summary и подкоманды analytics без
+графиков matplotlib не импортируют вовсе.
+
+pyplot() кэширован: в одном процессе (`analytics report all`) шрифты
+регистрируются один раз; файл, уже известный font_manager (его кэш
+fontlist-*.json), повторно не добавляется.
+─────────────────────────────────────────────────────────────────────────────
+"""
+
+import functools
+import importlib
+import os
+
+FONTS = ['/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+         '/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf']
+
+
+@functools.cache
+def pyplot():
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import matplotlib.font_manager as fm
+
+    known = {f.fname for f in fm.fontManager.ttflist}
+    for f in FONTS:
+        if os.path.exists(f) and f not in known:
+            fm.fontManager.addfont(f)
+    plt.rcParams['font.family'] = 'DejaVu Sans'
+    plt.rcParams['axes.unicode_minus'] = False
+    plt.rcParams['figure.dpi'] = 130
+    return plt
+
+
+class LazyModule:
+    """Модуль, импортируемый при первом обращении к атрибуту (после pyplot())."""
+
+    def __init__(self, name: str):
+        self._name = name
+
+    @functools.cached_property
+    def _module(self):
+        pyplot()
+        return importlib.import_module(self._name)
+
+    def __getattr__(self, attr):
+        return getattr(self._module, attr)
+
+    def __repr__(self):
+        return f'<lazy module {self._name!r}>'
+
+
+plt = LazyModule('matplotlib.pyplot')
+sns = LazyModule('seaborn')
+mpatches = LazyModule('matplotlib.patches')
@@ -0,0 +1,115 @@
+"""
+profiling.py
+─────────────────────────────────────────────────────────────────────────────
+Посекционный профиль скриптов-исследований (--profile): где уходят минуты —
+загрузка, groupby, apply или отрисовка.
+
+Для каждой секции: wall-время, CPU-время процесса и пик памяти tracemalloc
+(прирост над уровнем на входе в секцию; numpy-буферы tracemalloc тоже видит).
+Секции идут подряд: prof.mark('rfm') закрывает предыдущую и открывает новую —
+скрипт не приходится переформатировать под with-блоки; для отдельных
+фрагментов есть prof.section('name') (без вложенности).
+
+С cprofile=True весь прогон дополнительно пишется в cProfile:
+<out>/profile.prof (snakeviz / pstats) и топ функций в <out>/profile_top.txt.
+Отчёт — <out>/profile.csv и таблица в консоли.
+
+Выключенный профайлер (enabled=False) ничего не замеряет и не пишет.
+─────────────────────────────────────────────────────────────────────────────
+"""
+
+import cProfile
+import io
+import pstats
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+
+import pandas as pd
+
+MB = 1 << 20
+TOP_FUNCTIONS = 40
+
+
+class Profiler:
+    def __init__(self, enabled: bool = False, cprofile: bool = False):
+        self.enabled = enabled or cprofile
+        self.rows = []
+        self._current = None
+        self._cprofile = None
+        self._peak = 0
+        if not self.enabled:
+            return
+        tracemalloc.start()
+        if cprofile:
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+        self._started = (time.perf_counter(), time.process_time())
+
+    def mark(self, name: str):
+        """Закрыть текущую секцию и начать секцию name."""
+        if not self.enabled:
+            return
+        self.stop()
+        tracemalloc.reset_peak()
+        self._current = (name, time.perf_counter(), time.process_time(), tracemalloc.get_traced_memory()[0])
+
+    def stop(self):
+        """Закрыть текущую секцию (если открыта)."""
+        if not self.enabled or self._current is None:
+            return
+        name, wall0, cpu0, mem0 = self._current
+        wall, cpu = time.perf_counter() - wall0, time.process_time() - cpu0
+        current, peak = tracemalloc.get_traced_memory()
+        self._peak = max(self._peak, peak)
+        self.rows.append({'section': name, 'wall_s': wall, 'cpu_s': cpu,
+                          'peak_mb': (peak - mem0) / MB, 'net_mb': (current - mem0) / MB})
+        self._current = None
+
+    @contextmanager
+    def section(self, name: str):
+        self.mark(name)
+        try:
+            yield
+        finally:
+            self.stop()
+
+    def report(self) -> pd.DataFrame:
+        report = pd.DataFrame(self.rows, columns=['section', 'wall_s', 'cpu_s', 'peak_mb', 'net_mb'])
+        # одноимённые секции (например, в цикле) суммируются, пик — максимальный
+        report = report.groupby('section', sort=False, as_index=False).agg(
+            calls=('wall_s', 'size'), wall_s=('wall_s', 'sum'), cpu_s=('cpu_s', 'sum'),
+            peak_mb=('peak_mb', 'max'), net_mb=('net_mb', 'sum'))
+        total_wall = time.perf_counter() - self._started[0]
+        report['wall_pct'] = report['wall_s'] / total_wall * 100
+        total = {'section': 'TOTAL', 'calls': len(self.rows), 'wall_s': total_wall,
+                 'cpu_s': time.process_time() - self._started[1],
+                 'peak_mb': self._peak / MB,   # абсолютный пик за прогон
+                 'net_mb': report['net_mb'].sum(), 'wall_pct': 100.0}
+        return pd.concat([report, pd.DataFrame([total])], ignore_index=True)
+
+    def save(self, out_dir) -> pd.DataFrame | None:
+        """Закрыть секцию, напечатать отчёт и записать его (и cProfile) в out_dir."""
+        if not self.enabled:
+            return None
+        self.stop()
+        if self._cprofile is not None:
+            self._cprofile.disable()
+        out_dir = Path(out_dir)
+        out_dir.mkdir(parents=True, exist_ok=True)
+
+        report = self.report()
+        report.round(3).to_csv(out_dir / 'profile.csv', index=False)
+        print('\n=== Profile (wall / CPU / tracemalloc peak per section) ===')
+        print(report.to_string(index=False, float_format=lambda x: f'{x:.2f}'))
+        print(f'Profile saved: {out_dir / "profile.csv"}')
+
+        if self._cprofile is not None:
+            self._cprofile.dump_stats(out_dir / 'profile.prof')
+            buf = io.StringIO()
+            pstats.Stats(self._cprofile, stream=buf).sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+            (out_dir / 'profile_top.txt').write_text(buf.getvalue(), encoding='utf-8')
+            print(f'cProfile saved: {out_dir / "profile.prof"}, {out_dir / "profile_top.txt"}')
+        tracemalloc.stop()
+        return report
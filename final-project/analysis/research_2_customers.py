@@ -9,30 +9,32 @@ research_2_customers.py
   - Анализ LTV по сегментам
   - Воронка повторных покупок
   - Анализ времени между заказами (inter-purchase interval)
+
+Профиль по секциям (время, CPU, память): --profile; + дамп cProfile: --cprofile
+Заказы из Parquet-лейка вместо БД: --backend lake (см. api/lake.py, datasets.py)
+Стадии с кэшем в OUT/.stages: пересчитывается только изменившееся;
+  --only charts.cohort_retention — один график из сохранённых агрегатов, --list — состояние стадий
 ─────────────────────────────────────────────────────────────────────────────
 """
 
+import argparse
 import os
 import sys
 import warnings
 import numpy as np
 import pandas as pd
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-import matplotlib.patches as mpatches
-import seaborn as sns
-from datetime import timedelta
 warnings.filterwarnings('ignore')
 
-import matplotlib.font_manager as fm
-for f in ['/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
-          '/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf']:
-    if os.path.exists(f):
-        fm.fontManager.addfont(f)
-plt.rcParams['font.family'] = 'DejaVu Sans'
-plt.rcParams['axes.unicode_minus'] = False
-plt.rcParams['figure.dpi'] = 130
+import abc_xyz
+import datasets
+import metrics
+import purchase_intervals
+from datasets import BACKENDS, customer_orders
+from metrics import SNAPSHOT, rfm_table, segment_stats
+from plotting import plt, sns   # импорт matplotlib/seaborn — при первом графике
+from profiling import Profiler
+from stages import Pipeline, lake_source, orders_source, print_status
+from purchase_intervals import purchase_stats, FUNNEL_BUCKETS
 
 PALETTE = ['#2E4057', '#048A81', '#E4572E', '#FFB703', '#8338EC',
            '#54C6EB', '#06D6A0', '#EF476F']
@@ -40,6 +42,20 @@ PALETTE = ['#2E4057', '#048A81', '#E4572E', '#FFB703', '#8338EC',
 OUT = 'output/research2'
 os.makedirs(OUT, exist_ok=True)
 
+ap = argparse.ArgumentParser(description="Research 2: customer base, RFM, cohorts, LTV")
+ap.add_argument('--profile', action='store_true',
+                help='время (wall/CPU) и пик памяти по секциям → OUT/profile.csv')
+ap.add_argument('--cprofile', action='store_true',
+                help='--profile + дамп cProfile → OUT/profile.prof, profile_top.txt')
+ap.add_argument('--only', nargs='+', metavar='STAGE',
+                help='только эти стадии (и устаревшие предки): charts.ltv, charts, cohort ...')
+ap.add_argument('--force', action='store_true', help='пересчитать выбранные стадии, даже если они свежие')
+ap.add_argument('--list', action='store_true', help='стадии и их состояние (fresh/stale)')
+ap.add_argument('--backend', choices=BACKENDS, default=os.getenv('ANALYTICS_BACKEND', 'db'),
+                help='откуда заказы: db — raw_orders, lake — Parquet в LAKE_DIR (pyarrow)')
+args = ap.parse_args()
+prof = Profiler(enabled=args.profile, cprofile=args.cprofile)
+
 def save(name):
     path = f'{OUT}/{name}.png'
     plt.savefig(path, bbox_inches='tight', facecolor='white')
@@ -48,150 +64,90 @@ def save(name):
 
 
 # ════════════════════════════════════════════════════════════════════════════
-# ЗАГРУЗКА
+# ЗАГРУЗКА: datasets.customer_orders (raw_orders, lake или синтетика)
 # ════════════════════════════════════════════════════════════════════════════
-def load_data():
-    dsn = os.getenv("DB_DSN")
-    if dsn:
-        try:
-            import psycopg2
-            conn = psycopg2.connect(dsn)
-            df = pd.read_sql("""
-                SELECT order_id, order_date, customer_id, customer_city,
-                       customer_gender, category, revenue, profit, is_returned, rating
-                FROM raw_orders
-                WHERE order_date BETWEEN '2023-01-01' AND '2023-12-31'
-            """, conn)
-            conn.close()
-            return df
-        except Exception as e:
-            print(f"DB failed: {e} — demo mode")
-
-    # Demo
-    np.random.seed(7)
-    N = 25000
-    cats = ['Электроника','Одежда','Дом и сад','Спорт','Красота','Книги','Детские товары']
-    cat_w = [0.20, 0.22, 0.15, 0.12, 0.13, 0.08, 0.10]
-
-    # Клиенты с разной частотой покупок (Парето)
-    n_clients = 4000
-    client_ids = [f'C{i:05d}' for i in range(1, n_clients+1)]
-    client_freq = np.random.pareto(1.5, n_clients) + 1
-    client_freq = client_freq / client_freq.sum()
-
-    customers = np.random.choice(client_ids, N, p=client_freq)
-    categories = np.random.choice(cats, N, p=cat_w)
-    price_m = {'Электроника': 18000, 'Одежда': 3500, 'Дом и сад': 5000,
-               'Спорт': 4500, 'Красота': 1800, 'Книги': 600, 'Детские товары': 3000}
-    price_s = {'Электроника': 10000, 'Одежда': 2000, 'Дом и сад': 3000,
-               'Спорт': 3000, 'Красота': 900, 'Книги': 300, 'Детские товары': 1800}
-    revenue = np.array([max(50, np.random.normal(price_m[c], price_s[c]))
-                        for c in categories])
-    profit = revenue * np.random.uniform(0.20, 0.55, N)
-
-    dates = pd.to_datetime('2023-01-01') + pd.to_timedelta(
-        np.random.randint(0, 365, N), unit='D')
-    cities = np.random.choice(['Москва','СПб','Новосибирск','Екатеринбург','Краснодар'],
-                               N, p=[0.30,0.20,0.15,0.15,0.20])
-    gender = np.random.choice(['M','F',''], N, p=[0.42, 0.50, 0.08])
-    return_prob = np.where(np.array(categories) == 'Одежда', 0.12, 0.05)
-    is_returned = np.random.binomial(1, return_prob).astype(bool)
-
-    return pd.DataFrame({
-        'order_id':       [f'O{i:06d}' for i in range(N)],
-        'order_date':     dates,
-        'customer_id':    customers,
-        'customer_city':  cities,
-        'customer_gender':gender,
-        'category':       categories,
-        'revenue':        np.round(revenue, 2),
-        'profit':         np.round(profit, 2),
-        'is_returned':    is_returned,
-        'rating':         np.clip(np.round(np.random.normal(4.0, 0.9, N), 1), 1, 5),
-    })
-
-
-df = load_data()
-df['order_date'] = pd.to_datetime(df['order_date'])
-df_clean = df[~df['is_returned']].copy()
-SNAPSHOT = pd.Timestamp('2024-01-01')
+source_fingerprint = (lake_source if args.backend == 'lake' else orders_source)('2023-01-01', '2023-12-31')
+
+
+def median_interval_of(purchases):
+    return np.median(purchases.intervals) if len(purchases.intervals) else np.nan
+
+
+# ════════════════════════════════════════════════════════════════════════════
+# СТАДИИ: load → clean → rfm → segments / ltv, cohort, purchases → charts.*
+#         → summary. Результаты — в OUT/.stages, см. stages.py
+# ════════════════════════════════════════════════════════════════════════════
+pipe = Pipeline(f'{OUT}/.stages', profiler=prof,
+                shared=[save, abc_xyz, datasets, metrics, purchase_intervals, median_interval_of,
+                        PALETTE, SNAPSHOT])
+
+
+@pipe.stage('load', source=source_fingerprint)
+def load():
+    return customer_orders(args.backend)
+
+
+@pipe.stage('clean', inputs=['load'])
+def clean(df):
+    df = df.copy()
+    df['order_date'] = pd.to_datetime(df['order_date'])
+    return df[~df['is_returned']].copy()
 
 
 # ════════════════════════════════════════════════════════════════════════════
 # RFM
 # ════════════════════════════════════════════════════════════════════════════
-rfm = df_clean.groupby('customer_id').agg(
-    last_date=('order_date', 'max'),
-    frequency=('order_id', 'count'),
-    monetary=('revenue', 'sum'),
-).reset_index()
-rfm['recency'] = (SNAPSHOT - rfm['last_date']).dt.days
-
-rfm['R'] = pd.qcut(rfm['recency'],   5, labels=[5,4,3,2,1]).astype(int)
-rfm['F'] = pd.qcut(rfm['frequency'].rank(method='first'), 5, labels=[1,2,3,4,5]).astype(int)
-rfm['M'] = pd.qcut(rfm['monetary'].rank(method='first'),  5, labels=[1,2,3,4,5]).astype(int)
-rfm['rfm_score'] = rfm['R']*100 + rfm['F']*10 + rfm['M']
-
-def segment(row):
-    r, f, m = row['R'], row['F'], row['M']
-    if r >= 4 and f >= 4:             return 'Champions'
-    if r >= 3 and f >= 3:             return 'Loyal'
-    if r >= 4 and f < 2:              return 'New Customers'
-    if r >= 3 and f < 3:              return 'Potential Loyal'
-    if r == 2 and f >= 3:             return 'At Risk'
-    if r <= 2 and f <= 2 and m >= 3:  return 'Can\'t Lose'
-    if r <= 2:                        return 'Lost'
-    return 'Others'
-
-rfm['segment'] = rfm.apply(segment, axis=1)
-seg_stats = rfm.groupby('segment').agg(
-    count=('customer_id', 'count'),
-    avg_monetary=('monetary', 'mean'),
-    avg_frequency=('frequency', 'mean'),
-    avg_recency=('recency', 'mean'),
-).reset_index()
-seg_stats['share'] = seg_stats['count'] / seg_stats['count'].sum() * 100
-
-print("\n=== RFM Segments ===")
-print(seg_stats.sort_values('count', ascending=False).to_string(index=False))
+@pipe.stage('rfm', inputs=['clean'])
+def rfm_stage(df_clean):
+    return rfm_table(df_clean, SNAPSHOT)
+
+
+@pipe.stage('segments', inputs=['rfm'])
+def segments(rfm):
+    return segment_stats(rfm)
 
 
 # ════════════════════════════════════════════════════════════════════════════
 # КОГОРТНЫЙ АНАЛИЗ
 # ════════════════════════════════════════════════════════════════════════════
-df_clean['cohort_month'] = df_clean.groupby('customer_id')['order_date'] \
-    .transform('min').dt.to_period('M')
-df_clean['order_month']  = df_clean['order_date'].dt.to_period('M')
-df_clean['month_number'] = (df_clean['order_month'] - df_clean['cohort_month']).apply(
-    lambda x: x.n if hasattr(x, 'n') else int(x))
-
-cohort_data = df_clean.groupby(['cohort_month', 'month_number'])['customer_id'] \
-    .nunique().reset_index(name='customers')
-cohort_pivot = cohort_data.pivot(index='cohort_month', columns='month_number', values='customers')
-cohort_size  = cohort_pivot[0]
-retention    = cohort_pivot.div(cohort_size, axis=0) * 100
-retention    = retention.iloc[:, :12]  # первые 12 месяцев
+@pipe.stage('cohort', inputs=['clean'])
+def cohort(df_clean):
+    df_clean = df_clean.copy()
+    df_clean['cohort_month'] = df_clean.groupby('customer_id')['order_date'] \
+        .transform('min').dt.to_period('M')
+    df_clean['order_month']  = df_clean['order_date'].dt.to_period('M')
+    df_clean['month_number'] = (df_clean['order_month'] - df_clean['cohort_month']).apply(
+        lambda x: x.n if hasattr(x, 'n') else int(x))
+
+    cohort_data = df_clean.groupby(['cohort_month', 'month_number'])['customer_id'] \
+        .nunique().reset_index(name='customers')
+    cohort_pivot = cohort_data.pivot(index='cohort_month', columns='month_number', values='customers')
+    cohort_size  = cohort_pivot[0]
+    retention    = cohort_pivot.div(cohort_size, axis=0) * 100
+    return retention.iloc[:, :12]  # первые 12 месяцев
 
 
 # ════════════════════════════════════════════════════════════════════════════
 # INTER-PURCHASE INTERVAL
 # ════════════════════════════════════════════════════════════════════════════
-repeat = df_clean[df_clean['customer_id'].isin(
-    df_clean.groupby('customer_id')['order_id'].count()[
-        lambda x: x >= 2].index)].copy()
-repeat = repeat.sort_values(['customer_id', 'order_date'])
-repeat['prev_date'] = repeat.groupby('customer_id')['order_date'].shift(1)
-repeat['interval_days'] = (repeat['order_date'] - repeat['prev_date']).dt.days
-intervals = repeat['interval_days'].dropna()
-median_interval = intervals.median()
-print(f"\nМедианный интервал между заказами: {median_interval:.0f} дней")
+@pipe.stage('purchases', inputs=['clean'])
+def purchases_stage(df_clean):
+    # Один проход: интервалы повторных клиентов и число заказов на клиента (для воронки)
+    return purchase_stats(df_clean['customer_id'], df_clean['order_date'])
 
 
 # ════════════════════════════════════════════════════════════════════════════
 # LTV по сегментам
 # ════════════════════════════════════════════════════════════════════════════
-ltv = rfm[['customer_id', 'segment', 'monetary', 'frequency']].copy()
-ltv['ltv_projected'] = ltv['monetary'] * (ltv['frequency'] / 12 * 24)  # проекция на 24 мес
+@pipe.stage('ltv', inputs=['rfm'])
+def ltv_stage(rfm):
+    ltv = rfm[['customer_id', 'segment', 'monetary', 'frequency']].copy()
+    ltv['ltv_projected'] = ltv['monetary'] * (ltv['frequency'] / 12 * 24)  # проекция на 24 мес
+    return ltv.groupby('segment').agg(
+        customers=('customer_id', 'count'),
+        avg_ltv=('monetary', 'mean'),
+        total_ltv=('monetary', 'sum'),
+    ).sort_values('avg_ltv', ascending=False).reset_index()
 
 
 # ════════════════════════════════════════════════════════════════════════════
@@ -199,140 +155,146 @@ ltv['ltv_projected'] = ltv['monetary'] * (ltv['frequency'] / 12 * 24)  # про
 # ════════════════════════════════════════════════════════════════════════════
 
 # ── Г1: RFM-сегменты — bubble chart ─────────────────────────────────────────
-seg_stats_sorted = seg_stats.sort_values('avg_monetary', ascending=False)
-fig, ax = plt.subplots(figsize=(12, 6))
-fig.patch.set_facecolor('white')
-colors_seg = PALETTE[:len(seg_stats_sorted)]
-scatter = ax.scatter(seg_stats_sorted['avg_frequency'],
-                     seg_stats_sorted['avg_monetary'],
-                     s=seg_stats_sorted['count'] * 1.5,
-                     c=colors_seg, alpha=0.75, edgecolors='white', lw=2)
-for _, row in seg_stats_sorted.iterrows():
-    ax.annotate(f'{row["segment"]}\n({row["count"]} кл., {row["share"]:.1f}%)',
-                (row['avg_frequency'], row['avg_monetary']),
-                fontsize=8, ha='center', va='bottom',
-                xytext=(0, 10), textcoords='offset points')
-ax.set_xlabel('Средняя частота покупок', fontsize=11)
-ax.set_ylabel('Средняя выручка (LTV за год), ₽', fontsize=11)
-ax.set_title('RFM-сегменты клиентской базы 2023\n(размер кружка = число клиентов)',
-             fontsize=13, fontweight='bold')
-ax.spines[['top','right']].set_visible(False)
-ax.grid(alpha=0.3)
-plt.tight_layout()
-save('01_rfm_segments')
+@pipe.stage('charts.rfm_segments', inputs=['segments'], outputs=[f'{OUT}/01_rfm_segments.png'])
+def chart_rfm_segments(seg_stats):
+    seg_stats_sorted = seg_stats.sort_values('avg_monetary', ascending=False)
+    fig, ax = plt.subplots(figsize=(12, 6))
+    fig.patch.set_facecolor('white')
+    colors_seg = PALETTE[:len(seg_stats_sorted)]
+    ax.scatter(seg_stats_sorted['avg_frequency'],
+               seg_stats_sorted['avg_monetary'],
+               s=seg_stats_sorted['count'] * 1.5,
+               c=colors_seg, alpha=0.75, edgecolors='white', lw=2)
+    for _, row in seg_stats_sorted.iterrows():
+        ax.annotate(f'{row["segment"]}\n({row["count"]} кл., {row["share"]:.1f}%)',
+                    (row['avg_frequency'], row['avg_monetary']),
+                    fontsize=8, ha='center', va='bottom',
+                    xytext=(0, 10), textcoords='offset points')
+    ax.set_xlabel('Средняя частота покупок', fontsize=11)
+    ax.set_ylabel('Средняя выручка (LTV за год), ₽', fontsize=11)
+    ax.set_title('RFM-сегменты клиентской базы 2023\n(размер кружка = число клиентов)',
+                 fontsize=13, fontweight='bold')
+    ax.spines[['top','right']].set_visible(False)
+    ax.grid(alpha=0.3)
+    plt.tight_layout()
+    return save('01_rfm_segments')
 
 
 # ── Г2: Когортное удержание — heatmap ────────────────────────────────────────
-fig, ax = plt.subplots(figsize=(14, 6))
-fig.patch.set_facecolor('white')
-ret_display = retention.fillna(0)
-try:
-    sns.heatmap(ret_display, annot=True, fmt='.0f', cmap='RdYlGn',
-                ax=ax, linewidths=0.3, linecolor='white',
-                vmin=0, vmax=100,
-                annot_kws={'size': 8})
-except Exception:
-    im = ax.imshow(ret_display.values, cmap='RdYlGn', aspect='auto', vmin=0, vmax=100)
-    for i in range(ret_display.shape[0]):
-        for j in range(ret_display.shape[1]):
-            v = ret_display.values[i, j]
-            if not np.isnan(v):
-                ax.text(j, i, f'{v:.0f}', ha='center', va='center', fontsize=7)
-    plt.colorbar(im, ax=ax)
-    ax.set_xticks(range(len(ret_display.columns)))
-    ax.set_yticks(range(len(ret_display.index)))
-    ax.set_xticklabels(ret_display.columns)
-    ax.set_yticklabels([str(p) for p in ret_display.index], rotation=0)
-ax.set_title('Когортное удержание клиентов, % (по месяцу первой покупки)', fontsize=12, fontweight='bold')
-ax.set_xlabel('Месяц с момента первой покупки', fontsize=10)
-ax.set_ylabel('Когорта (месяц первой покупки)', fontsize=10)
-plt.tight_layout()
-save('02_cohort_retention')
+@pipe.stage('charts.cohort_retention', inputs=['cohort'], outputs=[f'{OUT}/02_cohort_retention.png'])
+def chart_cohort_retention(retention):
+    fig, ax = plt.subplots(figsize=(14, 6))
+    fig.patch.set_facecolor('white')
+    ret_display = retention.fillna(0)
+    try:
+        sns.heatmap(ret_display, annot=True, fmt='.0f', cmap='RdYlGn',
+                    ax=ax, linewidths=0.3, linecolor='white',
+                    vmin=0, vmax=100,
+                    annot_kws={'size': 8})
+    except Exception:
+        im = ax.imshow(ret_display.values, cmap='RdYlGn', aspect='auto', vmin=0, vmax=100)
+        for i in range(ret_display.shape[0]):
+            for j in range(ret_display.shape[1]):
+                v = ret_display.values[i, j]
+                if not np.isnan(v):
+                    ax.text(j, i, f'{v:.0f}', ha='center', va='center', fontsize=7)
+        plt.colorbar(im, ax=ax)
+        ax.set_xticks(range(len(ret_display.columns)))
+        ax.set_yticks(range(len(ret_display.index)))
+        ax.set_xticklabels(ret_display.columns)
+        ax.set_yticklabels([str(p) for p in ret_display.index], rotation=0)
+    ax.set_title('Когортное удержание клиентов, % (по месяцу первой покупки)', fontsize=12, fontweight='bold')
+    ax.set_xlabel('Месяц с момента первой покупки', fontsize=10)
+    ax.set_ylabel('Когорта (месяц первой покупки)', fontsize=10)
+    plt.tight_layout()
+    return save('02_cohort_retention')
 
 
 # ── Г3: Воронка повторных покупок ─────────────────────────────────────────────
-purchase_counts = df_clean.groupby('customer_id')['order_id'].count()
-funnel_labels = ['1 покупка', '2 покупки', '3–5 покупок', '6–10 покупок', '11+ покупок']
-funnel_vals = [
-    (purchase_counts == 1).sum(),
-    (purchase_counts == 2).sum(),
-    ((purchase_counts >= 3) & (purchase_counts <= 5)).sum(),
-    ((purchase_counts >= 6) & (purchase_counts <= 10)).sum(),
-    (purchase_counts >= 11).sum(),
-]
-total_clients = sum(funnel_vals)
-
-fig, ax = plt.subplots(figsize=(10, 5))
-fig.patch.set_facecolor('white')
-bars = ax.barh(funnel_labels[::-1], [v/total_clients*100 for v in funnel_vals[::-1]],
-               color=PALETTE[:5][::-1], alpha=0.85, edgecolor='white')
-for bar, val, pct in zip(bars, funnel_vals[::-1], [v/total_clients*100 for v in funnel_vals[::-1]]):
-    ax.text(pct + 0.3, bar.get_y() + bar.get_height()/2,
-            f'{val:,} клиентов ({pct:.1f}%)'.replace(',', ' '),
-            va='center', fontsize=9)
-ax.set_xlabel('Доля клиентов, %', fontsize=10)
-ax.set_title('Воронка повторных покупок (2023)', fontsize=13, fontweight='bold')
-ax.spines[['top','right']].set_visible(False)
-ax.grid(axis='x', alpha=0.3)
-plt.tight_layout()
-save('03_purchase_funnel')
+@pipe.stage('charts.purchase_funnel', inputs=['purchases'], outputs=[f'{OUT}/03_purchase_funnel.png'])
+def chart_purchase_funnel(purchases):
+    funnel_labels = [label for label, _, _ in FUNNEL_BUCKETS]
+    funnel_vals = purchases.funnel()
+    total_clients = sum(funnel_vals)
+
+    fig, ax = plt.subplots(figsize=(10, 5))
+    fig.patch.set_facecolor('white')
+    bars = ax.barh(funnel_labels[::-1], [v/total_clients*100 for v in funnel_vals[::-1]],
+                   color=PALETTE[:5][::-1], alpha=0.85, edgecolor='white')
+    for bar, val, pct in zip(bars, funnel_vals[::-1], [v/total_clients*100 for v in funnel_vals[::-1]]):
+        ax.text(pct + 0.3, bar.get_y() + bar.get_height()/2,
+                f'{val:,} клиентов ({pct:.1f}%)'.replace(',', ' '),
+                va='center', fontsize=9)
+    ax.set_xlabel('Доля клиентов, %', fontsize=10)
+    ax.set_title('Воронка повторных покупок (2023)', fontsize=13, fontweight='bold')
+    ax.spines[['top','right']].set_visible(False)
+    ax.grid(axis='x', alpha=0.3)
+    plt.tight_layout()
+    return save('03_purchase_funnel')
 
 
 # ── Г4: Распределение интервалов между заказами ───────────────────────────────
-fig, ax = plt.subplots(figsize=(11, 4.5))
-fig.patch.set_facecolor('white')
-ax.hist(intervals[intervals <= 200], bins=40, color=PALETTE[0], alpha=0.8, edgecolor='white')
-ax.axvline(median_interval, color=PALETTE[2], lw=2.5, ls='--',
-           label=f'Медиана: {median_interval:.0f} дней')
-ax.axvline(intervals.mean(), color=PALETTE[1], lw=2, ls=':',
-           label=f'Среднее: {intervals.mean():.0f} дней')
-ax.set_xlabel('Дней между заказами', fontsize=10)
-ax.set_ylabel('Число пар заказов', fontsize=10)
-ax.set_title('Распределение интервалов между покупками (повторные клиенты)',
-             fontsize=12, fontweight='bold')
-ax.legend(fontsize=10)
-ax.spines[['top','right']].set_visible(False)
-plt.tight_layout()
-save('04_purchase_intervals')
+@pipe.stage('charts.purchase_intervals', inputs=['purchases'], outputs=[f'{OUT}/04_purchase_intervals.png'])
+def chart_purchase_intervals(purchases):
+    intervals = purchases.intervals
+    median_interval = median_interval_of(purchases)
+    fig, ax = plt.subplots(figsize=(11, 4.5))
+    fig.patch.set_facecolor('white')
+    ax.hist(intervals[intervals <= 200], bins=40, color=PALETTE[0], alpha=0.8, edgecolor='white')
+    ax.axvline(median_interval, color=PALETTE[2], lw=2.5, ls='--',
+               label=f'Медиана: {median_interval:.0f} дней')
+    ax.axvline(intervals.mean(), color=PALETTE[1], lw=2, ls=':',
+               label=f'Среднее: {intervals.mean():.0f} дней')
+    ax.set_xlabel('Дней между заказами', fontsize=10)
+    ax.set_ylabel('Число пар заказов', fontsize=10)
+    ax.set_title('Распределение интервалов между покупками (повторные клиенты)',
+                 fontsize=12, fontweight='bold')
+    ax.legend(fontsize=10)
+    ax.spines[['top','right']].set_visible(False)
+    plt.tight_layout()
+    return save('04_purchase_intervals')
 
 
 # ── Г5: LTV по сегментам ──────────────────────────────────────────────────────
-ltv_seg = ltv.groupby('segment').agg(
-    customers=('customer_id', 'count'),
-    avg_ltv=('monetary', 'mean'),
-    total_ltv=('monetary', 'sum'),
-).sort_values('avg_ltv', ascending=False).reset_index()
-
-fig, ax = plt.subplots(figsize=(10, 5))
-fig.patch.set_facecolor('white')
-bars = ax.bar(range(len(ltv_seg)), ltv_seg['avg_ltv'],
-              color=PALETTE[:len(ltv_seg)], alpha=0.85, edgecolor='white')
-ax.set_xticks(range(len(ltv_seg)))
-ax.set_xticklabels(ltv_seg['segment'], rotation=20, ha='right', fontsize=9)
-for bar, val, n in zip(bars, ltv_seg['avg_ltv'], ltv_seg['customers']):
-    ax.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 200,
-            f'{val:,.0f} ₽\n({n} кл.)'.replace(',', ' '),
-            ha='center', va='bottom', fontsize=8)
-ax.set_ylabel('Средний LTV за 2023, ₽', fontsize=10)
-ax.set_title('Средний LTV по RFM-сегментам', fontsize=12, fontweight='bold')
-ax.spines[['top','right']].set_visible(False)
-ax.grid(axis='y', alpha=0.3)
-plt.tight_layout()
-save('05_ltv_by_segment')
+@pipe.stage('charts.ltv', inputs=['ltv'], outputs=[f'{OUT}/05_ltv_by_segment.png'])
+def chart_ltv(ltv_seg):
+    fig, ax = plt.subplots(figsize=(10, 5))
+    fig.patch.set_facecolor('white')
+    bars = ax.bar(range(len(ltv_seg)), ltv_seg['avg_ltv'],
+                  color=PALETTE[:len(ltv_seg)], alpha=0.85, edgecolor='white')
+    ax.set_xticks(range(len(ltv_seg)))
+    ax.set_xticklabels(ltv_seg['segment'], rotation=20, ha='right', fontsize=9)
+    for bar, val, n in zip(bars, ltv_seg['avg_ltv'], ltv_seg['customers']):
+        ax.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 200,
+                f'{val:,.0f} ₽\n({n} кл.)'.replace(',', ' '),
+                ha='center', va='bottom', fontsize=8)
+    ax.set_ylabel('Средний LTV за 2023, ₽', fontsize=10)
+    ax.set_title('Средний LTV по RFM-сегментам', fontsize=12, fontweight='bold')
+    ax.spines[['top','right']].set_visible(False)
+    ax.grid(axis='y', alpha=0.3)
+    plt.tight_layout()
+    return save('05_ltv_by_segment')
 
 
 # ════════════════════════════════════════════════════════════════════════════
-# ВЫВОДЫ
+# ВЫВОДЫ (каждый запуск, из сохранённых агрегатов)
 # ════════════════════════════════════════════════════════════════════════════
-one_time = funnel_vals[0] / total_clients * 100
-top2_segs = ltv_seg.head(2)['segment'].tolist()
-champions_ltv = ltv_seg[ltv_seg['segment']=='Champions']['avg_ltv'].values
-loyal_ltv     = ltv_seg[ltv_seg['segment']=='Loyal']['avg_ltv'].values
-
-print("\n" + "="*60)
-print("ВЫВОДЫ И РЕКОМЕНДАЦИИ (Исследование 2)")
-print("="*60)
-print(f"""
+@pipe.stage('summary', inputs=['rfm', 'segments', 'cohort', 'purchases', 'ltv'], cache=False)
+def summary(rfm, seg_stats, retention, purchases, ltv_seg):
+    print("\n=== RFM Segments ===")
+    print(seg_stats.sort_values('count', ascending=False).to_string(index=False))
+
+    median_interval = median_interval_of(purchases)
+    print(f"\nМедианный интервал между заказами: {median_interval:.0f} дней")
+
+    funnel_vals = purchases.funnel()
+    total_clients = sum(funnel_vals)
+    one_time = funnel_vals[0] / total_clients * 100
+
+    print("\n" + "="*60)
+    print("ВЫВОДЫ И РЕКОМЕНДАЦИИ (Исследование 2)")
+    print("="*60)
+    print(f"""
 1. Воронка повторных покупок:
    • {one_time:.1f}% клиентов сделали только 1 заказ.
    РЕКОМЕНДАЦИЯ: запустить триггерную email-цепочку через {median_interval:.0f} дней
@@ -368,4 +330,12 @@ print(f"""
    └──────────────────┴──────────┴──────────┴─────────────────┘
 """)
 
+
+if args.list:
+    for name, inputs, state in pipe.describe():
+        print(f'{name:<28} {state:<7} ← {inputs}')
+    sys.exit(0)
+
+print_status(pipe.run(args.only, force=args.force))
 print(f"Графики сохранены в {OUT}/")
+prof.save(OUT)
@@ -0,0 +1,215 @@
+"""
+stages.py
+─────────────────────────────────────────────────────────────────────────────
+Граф стадий для скриптов-исследований: load → clean → агрегаты → графики.
+
+Стадия — функция с именованными входами (результатами других стадий).
+Результат сохраняется на диск (pickle) вместе с отпечатком:
+  отпечаток = sha256(код функции стадии + общий код (shared) +
+                     отпечатки входов [+ отпечаток внешнего источника]).
+Отпечатки считаются до выполнения, по цепочке — поэтому правка графика меняет
+отпечаток только этой стадии, а новая выгрузка из БД (source у load) —
+всех стадий ниже. При запуске выполняются только устаревшие стадии из
+запрошенных и их устаревшие предки; свежие результаты входов читаются с диска.
+
+  pipe = Pipeline('output/research1/.stages', shared=[save, PALETTE])
+
+  @pipe.stage('clean', inputs=['load'])
+  def clean(df): ...
+
+  pipe.run(['charts.bcg'])     # или ['charts'] — все charts.*
+
+cache=False — стадия без результата на диске, выполняется при каждом запуске
+(вывод в консоль). outputs — файлы стадии (графики): нет файла — стадия устарела.
+Правка кода вне стадий и shared отпечаток не меняет — для этого --force
+(модуль целиком можно передать в shared).
+─────────────────────────────────────────────────────────────────────────────
+"""
+
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+
+@dataclass
+class Stage:
+    name: str
+    fn: callable
+    inputs: tuple
+    outputs: tuple
+    source: callable = None   # отпечаток внешних данных (строка), для стадий-источников
+    cache: bool = True
+
+
+def _code(obj) -> str:
+    try:
+        return inspect.getsource(obj)
+    except (TypeError, OSError):
+        return repr(obj)
+
+
+class Pipeline:
+    def __init__(self, cache_dir, shared=(), profiler=None):
+        self.cache_dir = Path(cache_dir)
+        self.shared = ''.join(_code(obj) for obj in shared)
+        self.profiler = profiler
+        self.stages: dict[str, Stage] = {}
+        self._fingerprints = {}
+
+    def stage(self, name: str, inputs=(), outputs=(), source=None, cache=True):
+        def register(fn):
+            missing = [i for i in inputs if i not in self.stages]
+            if missing:
+                raise ValueError(f"Stage {name!r}: unknown inputs {missing} (declare them first)")
+            self.stages[name] = Stage(name, fn, tuple(inputs), tuple(map(str, outputs)), source, cache)
+            return fn
+        return register
+
+    # ── отпечатки и состояние ─────────────────────────────────────────────
+    def fingerprint(self, name: str) -> str:
+        if name not in self._fingerprints:
+            st = self.stages[name]
+            parts = {
+                'name': name,
+                'code': _code(st.fn),
+                'shared': self.shared,
+                'inputs': [self.fingerprint(i) for i in st.inputs],
+                'source': st.source() if st.source else None,
+            }
+            digest = hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode('utf-8'))
+            self._fingerprints[name] = digest.hexdigest()
+        return self._fingerprints[name]
+
+    def _paths(self, name: str) -> tuple[Path, Path]:
+        return self.cache_dir / f'{name}.pkl', self.cache_dir / f'{name}.json'
+
+    def is_fresh(self, name: str) -> bool:
+        st = self.stages[name]
+        if not st.cache:
+            return False
+        data_path, meta_path = self._paths(name)
+        try:
+            meta = json.loads(meta_path.read_text(encoding='utf-8'))
+        except (FileNotFoundError, ValueError):
+            return False
+        return (meta.get('fingerprint') == self.fingerprint(name) and data_path.exists()
+                and all(os.path.exists(p) for p in st.outputs))
+
+    def select(self, patterns) -> list[str]:
+        """Имена стадий по шаблонам: точное имя или префикс группы ('charts' → charts.*)."""
+        selected = []
+        for pattern in patterns:
+            names = [n for n in self.stages if n == pattern or n.startswith(pattern + '.')]
+            if not names:
+                raise ValueError(f"Unknown stage {pattern!r}; available: {', '.join(self.stages)}")
+            selected += [n for n in names if n not in selected]
+        return selected
+
+    # ── выполнение ────────────────────────────────────────────────────────
+    def _load(self, name: str):
+        with open(self._paths(name)[0], 'rb') as f:
+            return pickle.load(f)
+
+    def _store(self, name: str, value, seconds: float):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        data_path, meta_path = self._paths(name)
+        tmp = data_path.with_suffix('.tmp')
+        with open(tmp, 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, data_path)
+        meta_path.write_text(json.dumps({
+            'fingerprint': self.fingerprint(name),
+            'inputs': {i: self.fingerprint(i) for i in self.stages[name].inputs},
+            'seconds': round(seconds, 3),
+            'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+        }, ensure_ascii=False, indent=2), encoding='utf-8')
+
+    def run(self, targets=None, force=False) -> dict:
+        """Выполнить устаревшие стадии из targets (по умолчанию все) и их устаревших предков.
+        force — выполнить targets заново, даже если они свежие. Возвращает {стадия: статус}."""
+        targets = self.select(targets) if targets else list(self.stages)
+        forced = set(targets) if force else set()
+        values, status = {}, {}
+
+        def get(name):
+            if name in values:
+                return values[name]
+            st = self.stages[name]
+            if name not in forced and self.is_fresh(name):
+                values[name] = self._load(name)
+                status.setdefault(name, 'cached')
+                return values[name]
+            args = [get(i) for i in st.inputs]
+            t0 = time.perf_counter()
+            if self.profiler is not None:
+                with self.profiler.section(name):
+                    values[name] = st.fn(*args)
+            else:
+                values[name] = st.fn(*args)
+            seconds = time.perf_counter() - t0
+            if st.cache:
+                self._store(name, values[name], seconds)
+            status[name] = f'ran {seconds:.2f} s'
+            return values[name]
+
+        for name in targets:
+            if name not in forced and self.is_fresh(name):
+                status.setdefault(name, 'fresh')   # свежая цель — даже не читаем с диска
+            else:
+                get(name)
+        return status
+
+    def describe(self) -> list[tuple[str, str, str]]:
+        """(стадия, входы, fresh/stale/always) — для --list."""
+        return [(n, ', '.join(st.inputs) or '-',
+                 'always' if not st.cache else 'fresh' if self.is_fresh(n) else 'stale')
+                for n, st in self.stages.items()]
+
+
+def orders_source(start: str, end: str):
+    """Отпечаток выгрузки заказов за период для source= стадии load: DSN + число строк,
+    последний fetched_at и сумма row_hash по fact_orders (правки строк меняют row_hash).
+    Без DB_DSN или без связи с БД — 'demo' (скрипты тогда берут синтетику)."""
+    def fingerprint() -> str:
+        dsn = os.getenv('DB_DSN')
+        if not dsn:
+            return 'demo'
+        try:
+            import psycopg2
+            with psycopg2.connect(dsn) as conn, conn.cursor() as cur:
+                cur.execute("""
+                    SELECT count(*), max(fetched_at)::text, sum(row_hash)::text
+                    FROM fact_orders WHERE order_date BETWEEN %s AND %s
+                """, (start, end))
+                state = cur.fetchone()
+            conn.close()
+        except Exception:
+            return 'demo'
+        return json.dumps([dsn, start, end, *state])
+    return fingerprint
+
+
+def lake_source(start: str, end: str, lake_dir: str = None):
+    """Отпечаток лейка за период (--backend lake): партиции order_date=... в периоде
+    с размером и mtime файлов — новая запись дня (fetch_and_store, export_lake) его меняет."""
+    def fingerprint() -> str:
+        from datasets import LAKE_DIR
+        root = Path(lake_dir or LAKE_DIR)
+        files = []
+        for part in sorted(root.glob('order_date=*')):
+            if start <= part.name.split('=', 1)[1] <= end:
+                files += [(str(f.relative_to(root)), f.stat().st_size, f.stat().st_mtime_ns)
+                          for f in sorted(part.glob('*.parquet'))]
+        return json.dumps(['lake', str(root), start, end, files]) if files else 'demo'
+    return fingerprint
+
+
+def print_status(status: dict):
+    print('\n=== Stages ===')
+    for name, state in status.items():
+        print(f'  {name:<28} {state}')
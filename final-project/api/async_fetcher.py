@@ -0,0 +1,173 @@
+"""
+async_fetcher.py — асинхронный вариант fetcher (aiohttp + asyncpg).
+
+В синхронном fetcher день сначала целиком скачивается (со sleep между
+страницами), и только потом пишется в БД — сетевые и дисковые задержки
+складываются. Здесь загрузка и запись идут конвейером:
+
+    producer: страницы API (день за днём) ──► asyncio.Queue(maxsize=QUEUE_PAGES) ──► consumer:
+                                                                                   normalize + INSERT
+
+Пока страница N нормализуется и пишется, страница N+1 уже качается.
+Темп запросов — тот же общий fetcher.limiter (AIMD), что и в синхронном варианте.
+Ограниченная очередь держит память в пределах QUEUE_PAGES страниц, если БД
+не успевает. Нормализация и row_hash — те же fetcher.prepare_rows, схема (fact_orders +
+справочники) и ON CONFLICT ... WHERE row_hash IS DISTINCT FROM — те же, поэтому
+движки взаимозаменяемы (load_history --engine async, FETCH_ENGINE=async для daily_fetch).
+Копия дня в lake (lake.py) пишется, как в fetcher, по концу дня — fetcher.store_lake.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import Counter
+from datetime import date, timedelta
+
+import aiohttp
+import asyncpg
+
+import fetcher
+from rate_limiter import parse_retry_after
+
+log = logging.getLogger(__name__)
+
+QUEUE_PAGES = int(os.getenv("QUEUE_PAGES", "4"))   # страниц в очереди между fetch и записью
+
+# Колонки приходят text[]-массивами, типы приводит сам PostgreSQL — так же,
+# как при литералах psycopg2 в fetcher. На страницу — три команды в одной
+# транзакции: справочники, затем fact_orders с ключами из них (см. fetcher.INSERT_SQL).
+def _unnest_source(columns: list[str]) -> str:
+    arrays = ", ".join(f"${i}::text[]" for i in range(1, len(columns) + 1))
+    return f"unnest({arrays}) AS v({', '.join(columns)})"
+
+
+def build_insert_sql() -> dict[str, str]:
+    return {
+        "customers": fetcher.build_dim_sql("dim_customer", fetcher.CUSTOMER_COLUMNS,
+                                           _unnest_source(fetcher.CUSTOMER_COLUMNS)),
+        "products":  fetcher.build_dim_sql("dim_product", fetcher.PRODUCT_COLUMNS,
+                                           _unnest_source(fetcher.PRODUCT_COLUMNS)),
+        "facts":     fetcher.build_fact_sql(_unnest_source(fetcher.FACT_SOURCE_COLUMNS), cast=True),
+    }
+
+
+def _text(v):
+    return None if v is None else str(v)
+
+
+def _arrays(rows, columns: list[str]) -> list[list]:
+    """Строки (dict или tuple в порядке columns) → по text-массиву на колонку."""
+    if rows and isinstance(rows[0], dict):
+        return [[_text(r[c]) for r in rows] for c in columns]
+    return [[_text(r[i]) for r in rows] for i in range(len(columns))]
+
+
+async def write_rows(conn: asyncpg.Connection, rows: list[dict], sql: dict[str, str]) -> int:
+    if not rows:
+        return 0
+    async with conn.transaction():
+        for name, columns in (("customers", fetcher.CUSTOMER_COLUMNS), ("products", fetcher.PRODUCT_COLUMNS)):
+            await conn.execute(sql[name], *_arrays(fetcher.dim_rows(rows, columns), columns))
+        result = await conn.fetch(sql["facts"], *_arrays(rows, fetcher.FACT_SOURCE_COLUMNS))
+    inserted = sum(1 for r in result if r["inserted"])
+    log.info(f"  upsert: {inserted} new, {len(result) - inserted} changed, "
+             f"{len(rows) - len(result)} unchanged")
+    return len(rows)
+
+
+# ── Конвейер ─────────────────────────────────────────────────────────────────
+async def produce(session: aiohttp.ClientSession, days, queue: asyncio.Queue,
+                  day_delay: float, errors: dict):
+    """Качает страницы по дням и кладёт в очередь (day, records); (day, None) — конец дня."""
+    limiter = fetcher.limiter
+    for d in days:
+        params = {"date": d.strftime("%Y-%m-%d")}
+        page = 1
+        retries = 0
+        while True:
+            if page > 1:
+                params["page"] = page
+
+            await limiter.wait_async()
+            t0 = time.monotonic()
+            try:
+                async with session.get(fetcher.API_URL, params=params) as resp:
+                    retry = limiter.record(resp.status, time.monotonic() - t0,
+                                           parse_retry_after(resp.headers.get("Retry-After")))
+                    if retry and retries < fetcher.MAX_RETRIES:
+                        retries += 1
+                        continue
+                    resp.raise_for_status()
+                    data = await resp.json(content_type=None)
+            except aiohttp.ClientResponseError as e:
+                log.error(f"API error on {d} page {page}: {e}")
+                errors[d] = str(e)
+                break
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                limiter.record(None, time.monotonic() - t0)
+                if retries < fetcher.MAX_RETRIES:
+                    retries += 1
+                    continue
+                log.error(f"API error on {d} page {page}: {e}")
+                errors[d] = str(e)
+                break
+            retries = 0
+
+            records, has_more = fetcher.parse_page(data)
+            log.info(f"  {d} page {page}: got {len(records)} records ({limiter.rate:.2f} req/s)")
+            await queue.put((d, records))
+
+            if not has_more or len(records) == 0:
+                break
+            page += 1
+        await queue.put((d, None))
+        if day_delay:
+            await asyncio.sleep(day_delay)
+    await queue.put(None)
+
+
+async def consume(conn: asyncpg.Connection, queue: asyncio.Queue, counts: Counter):
+    sql = build_insert_sql()
+    day_rows = []   # строки текущего дня для lake (пишется целиком по концу дня)
+    while (item := await queue.get()) is not None:
+        d, records = item
+        if records is None:
+            # в отдельном потоке: следующая страница тем временем качается
+            await asyncio.to_thread(fetcher.store_lake, day_rows, d)
+            day_rows = []
+            log.info(f"  Stored {counts[d]} rows for {d}")
+            continue
+        rows = fetcher.prepare_rows(records)
+        counts[d] += await write_rows(conn, rows, sql)
+        if fetcher.lake.enabled():
+            day_rows += rows
+
+
+async def store_range(start: date, end: date, day_delay: float = 0.0) -> tuple[Counter, dict]:
+    """Забирает дни start..end конвейером. Возвращает (строк по дням, ошибки API по дням)."""
+    days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    queue: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_PAGES)
+    counts, errors = Counter(), {}
+
+    timeout = aiohttp.ClientTimeout(total=30)
+    conn = await asyncpg.connect(fetcher.DB_DSN)
+    try:
+        async with aiohttp.ClientSession(timeout=timeout) as session, asyncio.TaskGroup() as tg:
+            tg.create_task(produce(session, days, queue, day_delay, errors))
+            tg.create_task(consume(conn, queue, counts))
+    finally:
+        await conn.close()
+    return counts, errors
+
+
+# ── Публичный интерфейс (как у fetcher) ───────────────────────────────────────
+def fetch_and_store(target_date: date) -> int:
+    """То же, что fetcher.fetch_and_store, но через конвейер."""
+    log.info(f"Fetching {target_date} (async)...")
+    counts, _ = asyncio.run(store_range(target_date, target_date))
+    return counts[target_date]
+
+
+def load_range(start: date, end: date, day_delay: float = 0.0) -> tuple[Counter, dict]:
+    return asyncio.run(store_range(start, end, day_delay))
@@ -0,0 +1,298 @@
+"""
+bench_ingest.py — сквозной бенчмарк загрузки: локальный API (fake_api) → fetcher → PostgreSQL.
+
+Поднимает fake_api в отдельном процессе, направляет на него fetcher (API_URL)
+и прогоняет один из сценариев:
+  - fetch_and_store — день за днём через fetcher.fetch_and_store;
+  - load_history    — как при первичном заполнении (load_history.main);
+  - async           — конвейер async_fetcher.load_range (fetch и запись внахлёст).
+
+Время по стадиям снимается обёртками вокруг функций fetcher:
+  fetch     — fetch_day (HTTP + JSON + ожидание в rate limiter),
+  normalize — normalize (суммарно по всем записям),
+  db        — upsert_rows (справочники + fact_orders + commit),
+  lake      — store_lake (Parquet-копия дня, --lake-dir; по умолчанию выключено),
+  connect   — get_conn.
+В сценарии async fetch идёт параллельно с записью и отдельно не считается;
+db — время async_fetcher.write_rows.
+Плюс pages/s, rows/s и пиковый RSS процесса. Результат — JSON в bench_results/,
+чтобы сравнивать прогоны между изменениями (--compare).
+
+ВНИМАНИЕ: при --reset (по умолчанию) fact_orders и справочники в целевой БД очищаются —
+указывайте отдельную базу (--dsn / BENCH_DB_DSN), не боевую.
+
+Использование:
+    createdb marketplace_bench
+    python bench_ingest.py --dsn postgresql://localhost/marketplace_bench --days 3 \\
+        --rows-per-day 20000 --page-size 1000 --aliases mixed
+    python bench_ingest.py --dsn ... --scenario load_history --latency-ms 50 \\
+        --compare bench_results/ingest_20240101_120000.json
+"""
+
+import argparse
+import functools
+import json
+import logging
+import os
+import resource
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from dataclasses import asdict
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import fetcher
+import lake
+import load_history
+from fake_api import FakeAPIProcess, add_config_args, config_from_args
+from rate_limiter import AdaptiveRateLimiter
+
+RESULTS_DIR = Path(__file__).resolve().parent / "bench_results"
+STAGES = ["fetch", "normalize", "db", "lake", "connect"]
+COMPARE_KEYS = ["wall_s", "pages_per_s", "rows_per_s", "peak_rss_mb",
+                "fetch_s", "normalize_s", "db_s", "lake_s"]
+
+log = logging.getLogger("bench_ingest")
+
+
+# ── Замер стадий ─────────────────────────────────────────────────────────────
+class StageTimer:
+    def __init__(self):
+        self.seconds = dict.fromkeys(STAGES, 0.0)
+        self.calls = dict.fromkeys(STAGES, 0)
+
+    def wrap(self, stage: str, fn):
+        """Обёртка, копящая время fn в stage."""
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.seconds[stage] += time.perf_counter() - t0
+                self.calls[stage] += 1
+        return wrapper
+
+    def wrap_async(self, stage: str, fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                self.seconds[stage] += time.perf_counter() - t0
+                self.calls[stage] += 1
+        return wrapper
+
+
+@contextmanager
+def patched(module, **attrs):
+    saved = {name: getattr(module, name) for name in attrs}
+    for name, value in attrs.items():
+        setattr(module, name, value)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            setattr(module, name, value)
+
+
+@contextmanager
+def instrumented(timer: StageTimer, api_url: str, dsn: str, limiter: AdaptiveRateLimiter,
+                 lake_dir: str = ""):
+    """Подменяет настройки и функции fetcher на время прогона и возвращает их обратно."""
+    with patched(fetcher,
+                 API_URL=api_url,
+                 DB_DSN=dsn,
+                 limiter=limiter,
+                 fetch_day=timer.wrap("fetch", fetcher.fetch_day),
+                 normalize=timer.wrap("normalize", fetcher.normalize),
+                 upsert_rows=timer.wrap("db", fetcher.upsert_rows),
+                 store_lake=timer.wrap("lake", fetcher.store_lake),
+                 get_conn=timer.wrap("connect", fetcher.get_conn)), \
+         patched(lake, LAKE_DIR=lake_dir), \
+         patched(load_history, limiter=limiter):
+        if "async_fetcher" in sys.modules:
+            async_fetcher = sys.modules["async_fetcher"]
+            with patched(async_fetcher, write_rows=timer.wrap_async("db", async_fetcher.write_rows)):
+                yield
+        else:
+            yield
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss: КБ в Linux, байты в macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1 << 20) if sys.platform == "darwin" else rss / 1024
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       cwd=Path(__file__).parent, text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# ── Сценарии ─────────────────────────────────────────────────────────────────
+def run_fetch_and_store(start: date, end: date, args) -> int:
+    rows = 0
+    for d in load_history.daterange(start, end):
+        rows += fetcher.fetch_and_store(d)
+    return rows
+
+
+def run_load_history(start: date, end: date, args) -> int:
+    argv = sys.argv
+    sys.argv = ["load_history.py", "--start", start.isoformat(), "--end", end.isoformat(),
+                "--delay", str(args.day_delay)]
+    try:
+        load_history.main()
+    finally:
+        sys.argv = argv
+    return None  # load_history не возвращает счётчик — берём из БД
+
+
+def run_async(start: date, end: date, args) -> int:
+    import async_fetcher
+    counts, _ = async_fetcher.load_range(start, end, day_delay=args.day_delay)
+    return sum(counts.values())
+
+
+SCENARIOS = {
+    "fetch_and_store": run_fetch_and_store,
+    "load_history":    run_load_history,
+    "async":           run_async,
+}
+
+
+def reset_table(dsn: str):
+    conn = fetcher.psycopg2.connect(dsn)
+    try:
+        fetcher.ensure_schema(conn)
+        with conn.cursor() as cur:
+            cur.execute("TRUNCATE fact_orders, dim_customer, dim_product RESTART IDENTITY")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def count_rows(dsn: str) -> int:
+    conn = fetcher.psycopg2.connect(dsn)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT count(*) FROM raw_orders")
+            return cur.fetchone()[0]
+    finally:
+        conn.close()
+
+
+def run(args) -> dict:
+    start = date.fromisoformat(args.start)
+    end = start + timedelta(days=args.days - 1)
+    if args.reset:
+        reset_table(args.dsn)
+    rows_before = count_rows(args.dsn)
+
+    if args.scenario == "async":
+        import async_fetcher  # noqa: F401 — aiohttp/asyncpg нужны только здесь; до instrumented(), чтобы обернуть write_rows
+    timer = StageTimer()
+    api_config = config_from_args(args)
+    limiter = AdaptiveRateLimiter(initial_rate=args.rate_initial, max_rate=args.rate_max, log_every=0)
+    with FakeAPIProcess(api_config) as api, instrumented(timer, api.url, args.dsn, limiter, args.lake_dir):
+        t0 = time.perf_counter()
+        cpu0 = time.process_time()
+        returned = SCENARIOS[args.scenario](start, end, args)
+        wall = time.perf_counter() - t0
+        cpu = time.process_time() - cpu0
+        server = api.stats()
+
+    stored = count_rows(args.dsn) - rows_before
+    rows = returned if returned is not None else stored
+    pages = server["requests"]
+    result = {
+        "wall_s":      round(wall, 3),
+        "cpu_s":       round(cpu, 3),
+        "pages":       pages,
+        "rows":        rows,
+        "rows_stored": stored,
+        "pages_per_s": round(pages / wall, 2) if wall else None,
+        "rows_per_s":  round(rows / wall, 1) if wall else None,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "api_mb":      round(server["bytes_sent"] / (1 << 20), 2),
+        "api_throttled": server["throttled"],
+        "api_failed":  server["failed"],
+        "final_rate":  round(limiter.rate, 3),
+        "backoffs":    limiter.backoffs,
+    }
+    for stage in STAGES:
+        result[f"{stage}_s"] = round(timer.seconds[stage], 3)
+        result[f"{stage}_calls"] = timer.calls[stage]
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "scenario": args.scenario,
+        "params": {"start": start.isoformat(), "days": args.days,
+                   "rate_initial": args.rate_initial, "rate_max": args.rate_max,
+                   "day_delay": args.day_delay, "lake_dir": args.lake_dir},
+        "api": asdict(api_config),
+        "result": result,
+    }
+
+
+def print_report(report: dict, baseline: dict = None):
+    res = report["result"]
+    print(f"\n=== {report['scenario']}  {report['params']['days']} day(s) × "
+          f"{report['api']['rows_per_day']} rows, page {report['api']['page_size']}, "
+          f"aliases={report['api']['aliases']} ===")
+    base = baseline["result"] if baseline else {}
+    for key in ["wall_s", "cpu_s", "pages", "rows", "pages_per_s", "rows_per_s", "peak_rss_mb",
+                *(f"{s}_s" for s in STAGES), "api_throttled", "api_failed", "final_rate", "backoffs"]:
+        line = f"  {key:<12} {res[key]!s:>12}"
+        if key in COMPARE_KEYS and base.get(key):
+            line += f"   (baseline {base[key]}, x{res[key] / base[key]:.2f})"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end ingest benchmark against a local API stand-in")
+    parser.add_argument("--dsn", default=os.getenv("BENCH_DB_DSN"),
+                        help="DSN отдельной БД для бенчмарка (или BENCH_DB_DSN)")
+    parser.add_argument("--scenario", choices=list(SCENARIOS), default="fetch_and_store")
+    parser.add_argument("--start", default="2023-01-01")
+    parser.add_argument("--days", type=int, default=3)
+    parser.add_argument("--rate-initial", type=float, default=1.0,
+                        help="стартовый темп rate limiter, запросов/с")
+    parser.add_argument("--rate-max", type=float, default=0.0,
+                        help="потолок темпа, запросов/с (0 — без ограничения, чистая пропускная способность)")
+    parser.add_argument("--day-delay", type=float, default=0.0,
+                        help="доп. пауза между днями (load_history --delay)")
+    parser.add_argument("--lake-dir", default="",
+                        help="писать Parquet-копию дней в этот каталог (отдельный, не боевой lake); по умолчанию lake выключен")
+    parser.add_argument("--no-reset", dest="reset", action="store_false",
+                        help="не очищать fact_orders перед прогоном")
+    parser.add_argument("--out", type=Path, help="куда сохранить JSON (по умолчанию bench_results/)")
+    parser.add_argument("--compare", type=Path, help="JSON прошлого прогона для сравнения")
+    parser.add_argument("--log-level", default="WARNING")
+    add_config_args(parser)
+    args = parser.parse_args()
+
+    if not args.dsn:
+        parser.error("нужен --dsn или BENCH_DB_DSN (отдельная база: fact_orders будет очищена)")
+    logging.getLogger().setLevel(args.log_level)
+
+    report = run(args)
+    baseline = json.loads(args.compare.read_text(encoding="utf-8")) if args.compare else None
+    print_report(report, baseline)
+
+    out = args.out or RESULTS_DIR / f"ingest_{datetime.now():%Y%m%d_%H%M%S}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"\nSaved: {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+export_lake.py — единоразово выгружает уже загруженную историю из PostgreSQL
+в lake/order_date=YYYY-MM-DD/part-0.parquet (см. lake.py).
+
+Дальше партиции ведёт fetch_and_store; скрипт нужен для истории, загруженной
+до появления лейка, и чтобы переписать день, если запись в лейк не удалась.
+Каждая партиция периода пишется целиком из raw_orders (БД — источник истины).
+День читается через COPY ... CSV прямо в pyarrow (в памяти — один день).
+
+Использование:
+    python export_lake.py --start 2023-01-01 --end 2023-12-31
+    python export_lake.py --start 2023-06-01 --end 2023-06-01 --lake-dir /data/lake
+"""
+
+import argparse
+import io
+import logging
+import time
+from datetime import date
+
+import lake
+from fetcher import get_conn
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+)
+log = logging.getLogger(__name__)
+
+# numeric → float8: в Parquet меры — float64, как и в pandas после read_sql
+DAY_SQL = "SELECT {cols} FROM raw_orders WHERE order_date = '{day}' ORDER BY order_id"
+DAYS_SQL = "SELECT DISTINCT order_date FROM fact_orders WHERE order_date BETWEEN %s AND %s ORDER BY 1"
+SELECT_COLUMNS = ", ".join(f"{c}::float8 AS {c}" if kind == lake.FLOAT else c
+                           for c, kind in lake.SCHEMA_TYPES.items())
+
+
+def read_day(cur, day: date):
+    """День из raw_orders → pyarrow.Table через COPY ... CSV (быстрее построчного fetch)."""
+    import pyarrow.csv as pv
+    buf = io.BytesIO()
+    cur.copy_expert(f"COPY ({DAY_SQL.format(cols=SELECT_COLUMNS, day=day.isoformat())}) "
+                    f"TO STDOUT WITH CSV HEADER", buf)
+    buf.seek(0)
+    return pv.read_csv(buf, convert_options=pv.ConvertOptions(
+        column_types=lake.schema(),
+        true_values=["t"], false_values=["f"],
+        strings_can_be_null=True,           # NULL в CSV PostgreSQL — пустое без кавычек, '' — ""
+        quoted_strings_can_be_null=False,
+    ))
+
+
+def export(start: date, end: date, lake_dir: str) -> tuple[int, int]:
+    """Переписывает партиции дней start..end, в которых есть заказы. Возвращает (дней, строк)."""
+    days = rows = 0
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute(DAYS_SQL, (start, end))
+        for (day,) in cur.fetchall():
+            table = read_day(cur, day)
+            lake.write_day(table, day, lake_dir, replace=True)
+            days += 1
+            rows += table.num_rows
+    return days, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export order history from PostgreSQL to the Parquet lake")
+    parser.add_argument("--start", default="2023-01-01", help="Start date YYYY-MM-DD")
+    parser.add_argument("--end",   default="2023-12-31", help="End date YYYY-MM-DD")
+    parser.add_argument("--lake-dir", default=lake.LAKE_DIR, help="корень лейка (LAKE_DIR)")
+    args = parser.parse_args()
+    if not args.lake_dir:
+        parser.error("LAKE_DIR пуст — укажите --lake-dir")
+
+    start, end = date.fromisoformat(args.start), date.fromisoformat(args.end)
+    log.info(f"Exporting {start} → {end} to {args.lake_dir}")
+    t0 = time.perf_counter()
+    days, rows = export(start, end, args.lake_dir)
+    log.info(f"=== Done. {rows} rows in {days} partitions, {time.perf_counter() - t0:.1f} s ===")
+
+
+if __name__ == "__main__":
+    main()
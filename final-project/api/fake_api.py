@@ -0,0 +1,364 @@
+"""
+fake_api.py — локальная подмена API маркетплейса (/data) для бенчмарков и отладки.
+
+Отдаёт детерминированные заказы за любую дату с настраиваемыми:
+  - пагинацией (rows_per_day, page_size, стиль has_more / next);
+  - «обёрткой» ответа (data / results / items / orders / голый список);
+  - вариантом имён полей (все алиасы, которые понимает fetcher.normalize);
+  - размером записи (extra_bytes — «лишнее» текстовое поле);
+  - задержкой ответа (latency_ms);
+  - поздними правками: доля заказов, у которых меняются is_returned и rating
+    (changed_rate, changed_seed — «ревизия» данных для проверки перезабора);
+  - отказами: доля случайных 503 (error_rate) и лимит запросов в секунду,
+    сверх которого отвечает 429 + Retry-After (max_rps).
+
+Использование:
+    python fake_api.py --port 8765 --rows-per-day 5000 --page-size 1000 --aliases mixed
+    API_URL=http://127.0.0.1:8765/data python fetcher.py 2023-01-01
+"""
+
+import argparse
+import functools
+import json
+import multiprocessing
+import random
+import threading
+import time
+from dataclasses import dataclass, asdict
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from urllib.request import urlopen
+
+# Варианты имён полей — те же алиасы, что перебирает fetcher.normalize
+ALIASES = {
+    "canonical": {},
+    "camel": {
+        "order_id": "orderId", "order_date": "orderDate", "order_datetime": "createdAt",
+        "customer_id": "customerId", "customer_name": "customerName",
+        "product_id": "productId", "product_name": "productName", "subcategory": "subCategory",
+        "price": "unitPrice", "cost_price": "costPrice", "discount_pct": "discountPct",
+        "discount_amount": "discountAmount", "payment_method": "paymentMethod",
+        "delivery_days": "deliveryDays", "is_returned": "isReturned",
+    },
+    "short": {
+        "order_id": "id", "order_date": "date", "order_datetime": "datetime",
+        "customer_id": "client_id", "customer_name": "name", "customer_email": "email",
+        "customer_city": "city", "customer_gender": "gender", "product_id": "sku",
+        "product_name": "product", "category": "product_category", "subcategory": "sub_category",
+        "price": "unit_price", "cost_price": "cost", "quantity": "qty", "discount_pct": "discount",
+        "revenue": "total", "profit": "margin", "payment_method": "payment",
+        "delivery_days": "delivery", "is_returned": "returned", "rating": "score",
+    },
+}
+ALIAS_VARIANTS = [*ALIASES, "mixed"]
+ENVELOPES = ["data", "results", "items", "orders", "list"]
+
+CATEGORIES = {
+    "Электроника": ["Смартфоны", "Ноутбуки", "Аксессуары"],
+    "Одежда":      ["Мужская", "Женская", "Детская"],
+    "Дом":         ["Кухня", "Текстиль", "Декор"],
+    "Красота":     ["Уход", "Макияж"],
+    "Спорт":       ["Фитнес", "Туризм"],
+}
+CITIES = ["Москва", "Санкт-Петербург", "Казань", "Новосибирск", "Екатеринбург"]
+PAYMENTS = ["card", "cash", "sbp", "installments"]
+
+
+@dataclass
+class FakeAPIConfig:
+    rows_per_day: int = 5000
+    page_size: int = 1000          # 0 — всё одной страницей
+    latency_ms: float = 0.0        # задержка на каждый ответ
+    extra_bytes: int = 0           # размер «лишнего» поля в каждой записи
+    aliases: str = "canonical"     # canonical | camel | short | mixed
+    envelope: str = "data"         # data | results | items | orders | list (без пагинации)
+    next_style: str = "has_more"   # has_more | next
+    error_rate: float = 0.0        # доля ответов 503
+    max_rps: float = 0.0           # 0 — без лимита; сверх лимита — 429
+    changed_rate: float = 0.0      # доля заказов с поздней правкой (возврат, новая оценка)
+    changed_seed: int = 1          # номер «ревизии»: другой seed — другие правки
+    seed: int = 42
+
+
+# Атрибуты клиента и товара определяются их id (как в настоящем API):
+# один и тот же customer_id всегда с тем же именем, городом и т.д.
+N_CUSTOMERS = 200_000
+N_PRODUCTS = 50_000
+
+
+@functools.lru_cache(maxsize=None)
+def customer(n: int) -> dict:
+    rng = random.Random(f"customer-{n}")
+    return {
+        "customer_id":     f"C{n:06d}",
+        "customer_name":   f"Клиент {n}",
+        "customer_email":  f"user{n}@example.com",
+        "customer_city":   rng.choice(CITIES),
+        "customer_gender": rng.choice("MF"),
+    }
+
+
+@functools.lru_cache(maxsize=None)
+def product(n: int) -> dict:
+    rng = random.Random(f"product-{n}")
+    category = rng.choice(list(CATEGORIES))
+    return {
+        "product_id":      f"P{n:05d}",
+        "product_name":    f"Товар {n}",
+        "category":        category,
+        "subcategory":     rng.choice(CATEGORIES[category]),
+        "brand":           f"Brand{rng.randint(1, 300)}",
+    }
+
+
+def make_record(d: date, i: int, rng: random.Random, extra: str) -> dict:
+    price = round(rng.uniform(100, 50_000), 2)
+    cost = round(price * rng.uniform(0.4, 0.8), 2)
+    qty = rng.randint(1, 5)
+    disc = rng.choice([0, 0, 5, 10, 15, 25])
+    disc_amount = round(price * qty * disc / 100, 2)
+    revenue = round(price * qty - disc_amount, 2)
+    ts = datetime(d.year, d.month, d.day) + timedelta(seconds=rng.randint(0, 86_399))
+    rec = {
+        "order_id":        f"{d:%Y%m%d}-{i:07d}",
+        "order_date":      d.isoformat(),
+        "order_datetime":  ts.isoformat(),
+        **customer(rng.randint(1, N_CUSTOMERS)),
+        **product(rng.randint(1, N_PRODUCTS)),
+        "price":           price,
+        "cost_price":      cost,
+        "quantity":        qty,
+        "discount_pct":    disc,
+        "discount_amount": disc_amount,
+        "revenue":         revenue,
+        "profit":          round(revenue - cost * qty, 2),
+        "payment_method":  rng.choice(PAYMENTS),
+        "delivery_days":   rng.randint(1, 14),
+        "is_returned":     rng.random() < 0.05,
+        "rating":          round(rng.uniform(1, 5), 1),
+    }
+    if extra:
+        rec["comment"] = extra
+    return rec
+
+
+def rename(rec: dict, variant: str) -> dict:
+    mapping = ALIASES[variant]
+    return {mapping.get(k, k): v for k, v in rec.items()}
+
+
+class FakeAPI:
+    """HTTP-сервер в фоновом потоке. Используется как контекстный менеджер:
+
+        with FakeAPI(FakeAPIConfig(rows_per_day=1000)) as api:
+            fetcher.API_URL = api.url
+    """
+
+    def __init__(self, config: FakeAPIConfig = None, host: str = "127.0.0.1", port: int = 0):
+        self.config = config or FakeAPIConfig()
+        self.requests = 0
+        self.bytes_sent = 0
+        self.throttled = 0
+        self.failed = 0
+        self._recent = []                       # времена принятых запросов за последнюю секунду
+        self._random = random.Random(self.config.seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/data"
+
+    def page(self, d: date, page: int) -> dict | list:
+        cfg = self.config
+        size = cfg.page_size if cfg.page_size and cfg.envelope != "list" else cfg.rows_per_day
+        lo = (page - 1) * size
+        hi = min(lo + size, cfg.rows_per_day)
+        extra = "x" * cfg.extra_bytes
+        variants = list(ALIASES)
+        records = []
+        for i in range(lo, hi):
+            # своя последовательность на каждую запись — страницы не зависят от порядка запросов
+            rng = random.Random(f"{cfg.seed}:{d}:{i}")
+            variant = variants[i % len(variants)] if cfg.aliases == "mixed" else cfg.aliases
+            rec = make_record(d, i, rng, extra)
+            if cfg.changed_rate and random.Random(f"{cfg.changed_seed}:{d}:{i}").random() < cfg.changed_rate:
+                rec["is_returned"] = not rec["is_returned"]
+                rec["rating"] = round(max(1.0, rec["rating"] - 1), 1)
+            records.append(rename(rec, variant))
+        if cfg.envelope == "list":
+            return records
+        has_more = hi < cfg.rows_per_day
+        body = {cfg.envelope: records}
+        if cfg.next_style == "next":
+            body["next"] = f"{self.url}?date={d}&page={page + 1}" if has_more else None
+        else:
+            body["has_more"] = has_more
+        return body
+
+    def reject(self) -> int | None:
+        """Код отказа (429/503) для очередного запроса или None."""
+        cfg = self.config
+        with self._lock:
+            if cfg.max_rps:
+                now = time.monotonic()
+                self._recent = [t for t in self._recent if now - t < 1.0]
+                if len(self._recent) >= cfg.max_rps:
+                    self.throttled += 1
+                    return 429
+                self._recent.append(now)
+            if cfg.error_rate and self._random.random() < cfg.error_rate:
+                self.failed += 1
+                return 503
+        return None
+
+    def _handler_class(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path == "/stats":
+                    self._send_json(json.dumps(api.stats(), ensure_ascii=False).encode())
+                    return
+                if url.path != "/data":
+                    self.send_error(404)
+                    return
+                qs = parse_qs(url.query)
+                try:
+                    d = date.fromisoformat(qs["date"][0])
+                    page = int(qs.get("page", ["1"])[0])
+                except (KeyError, ValueError):
+                    self.send_error(400, "date=YYYY-MM-DD required")
+                    return
+                if api.config.latency_ms:
+                    time.sleep(api.config.latency_ms / 1000)
+                status = api.reject()
+                if status:
+                    self.send_response(status)
+                    if status == 429:
+                        self.send_header("Retry-After", "1")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                payload = json.dumps(api.page(d, page), ensure_ascii=False).encode()
+                # счётчики — до отправки: клиент, получив последнюю страницу, сразу читает /stats
+                with api._lock:
+                    api.requests += 1
+                    api.bytes_sent += len(payload)
+                self._send_json(payload)
+
+            def _send_json(self, payload: bytes):
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def stats(self) -> dict:
+        return {"requests": self.requests, "bytes_sent": self.bytes_sent,
+                "throttled": self.throttled, "failed": self.failed}
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def _serve(config: FakeAPIConfig, host: str, conn):
+    api = FakeAPI(config, host)
+    conn.send(api.url)
+    api._server.serve_forever()
+
+
+class FakeAPIProcess:
+    """То же, но в отдельном процессе: генерация JSON не делит GIL, CPU и RSS
+    с измеряемым клиентом. Статистика сервера — через GET /stats."""
+
+    def __init__(self, config: FakeAPIConfig = None, host: str = "127.0.0.1"):
+        self.config = config or FakeAPIConfig()
+        self.host = host
+        self.url = None
+        self._proc = None
+
+    def start(self):
+        parent, child = multiprocessing.Pipe()
+        self._proc = multiprocessing.Process(target=_serve, args=(self.config, self.host, child), daemon=True)
+        self._proc.start()
+        self.url = parent.recv()
+        return self
+
+    def stats(self) -> dict:
+        with urlopen(self.url.replace("/data", "/stats"), timeout=10) as resp:
+            return json.load(resp)
+
+    def stop(self):
+        self._proc.terminate()
+        self._proc.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def add_config_args(parser: argparse.ArgumentParser):
+    d = FakeAPIConfig()
+    parser.add_argument("--rows-per-day", type=int, default=d.rows_per_day)
+    parser.add_argument("--page-size", type=int, default=d.page_size, help="0 — без пагинации")
+    parser.add_argument("--latency-ms", type=float, default=d.latency_ms)
+    parser.add_argument("--extra-bytes", type=int, default=d.extra_bytes, help="доп. байт в каждой записи")
+    parser.add_argument("--aliases", choices=ALIAS_VARIANTS, default=d.aliases)
+    parser.add_argument("--envelope", choices=ENVELOPES, default=d.envelope)
+    parser.add_argument("--next-style", choices=["has_more", "next"], default=d.next_style)
+    parser.add_argument("--error-rate", type=float, default=d.error_rate, help="доля ответов 503")
+    parser.add_argument("--max-rps", type=float, default=d.max_rps, help="лимит запросов/с (сверх — 429)")
+    parser.add_argument("--changed-rate", type=float, default=d.changed_rate,
+                        help="доля заказов с поздней правкой (is_returned, rating)")
+    parser.add_argument("--changed-seed", type=int, default=d.changed_seed)
+    parser.add_argument("--seed", type=int, default=d.seed)
+
+
+def config_from_args(args) -> FakeAPIConfig:
+    return FakeAPIConfig(**{k: getattr(args, k) for k in asdict(FakeAPIConfig())})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the marketplace /data API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_config_args(parser)
+    args = parser.parse_args()
+
+    api = FakeAPI(config_from_args(args), args.host, args.port)
+    print(f"Serving {api.url}  ({asdict(api.config)})")
+    try:
+        api._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        api._server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+lake.py — копия нормализованных заказов в Parquet, по дню на партицию:
+
+    lake/order_date=YYYY-MM-DD/part-0.parquet
+
+Пишут fetcher.fetch_and_store / async_fetcher (день после записи в БД) и
+export_lake.py (история из PostgreSQL). Читают исследования и analytics.py
+(--backend lake / --source lake) через pyarrow.dataset: фильтр по order_date
+отсекает партиции целиком, читаются только нужные колонки, сканирование
+многопоточное — тяжёлые разборы не трогают боевую БД.
+
+Колонки — COLUMNS fetcher'а (форма raw_orders) + row_hash; order_date хранится
+только в имени каталога (hive-партиционирование). Запись дня — слияние по
+order_id, как ON CONFLICT в БД: новые строки заменяют старые, остальные
+остаются, так что частично скачанный день не затирает партицию. Файл
+пишется во временный и подменяется через os.replace — читатели не видят
+недописанный Parquet. export_lake.py пишет партиции целиком (replace=True).
+
+LAKE_DIR — корень (по умолчанию final-project/lake); LAKE_DIR= (пусто) — не писать.
+Нужен pyarrow; если его нет, fetcher пишет ошибку в лог, а загрузка в БД идёт как обычно.
+"""
+
+import logging
+import os
+from datetime import date, datetime
+from pathlib import Path
+
+log = logging.getLogger(__name__)
+
+LAKE_DIR = os.getenv("LAKE_DIR", str(Path(__file__).resolve().parent.parent / "lake"))
+PART_FILE = "part-0.parquet"
+
+# колонка → тип Arrow (order_date — в пути партиции)
+STRING, FLOAT, INT, BOOL, TIMESTAMP, HASH = "string", "float64", "int32", "bool", "timestamp", "int64"
+SCHEMA_TYPES = {
+    "order_id": STRING, "order_datetime": TIMESTAMP,
+    "customer_id": STRING, "customer_name": STRING, "customer_email": STRING,
+    "customer_city": STRING, "customer_gender": STRING,
+    "product_id": STRING, "product_name": STRING, "category": STRING,
+    "subcategory": STRING, "brand": STRING,
+    "price": FLOAT, "cost_price": FLOAT, "quantity": INT, "discount_pct": FLOAT,
+    "discount_amount": FLOAT, "revenue": FLOAT, "profit": FLOAT,
+    "payment_method": STRING, "delivery_days": INT, "is_returned": BOOL, "rating": FLOAT,
+    "row_hash": HASH,
+}
+LAKE_COLUMNS = list(SCHEMA_TYPES)
+
+
+def arrow_types() -> dict:
+    import pyarrow as pa
+    return {STRING: pa.string(), FLOAT: pa.float64(), INT: pa.int32(), BOOL: pa.bool_(),
+            TIMESTAMP: pa.timestamp("us"), HASH: pa.int64()}
+
+
+def schema():
+    import pyarrow as pa
+    types = arrow_types()
+    return pa.schema([(c, types[t]) for c, t in SCHEMA_TYPES.items()])
+
+
+def enabled() -> bool:
+    return bool(LAKE_DIR)
+
+
+def partition_dir(day: date, lake_dir: str = None) -> Path:
+    return Path(lake_dir or LAKE_DIR) / f"order_date={day.isoformat()}"
+
+
+# ── приведение значений (API присылает числа строками, id — числами и т.п.) ──
+def _convert(value, kind):
+    if value is None:
+        return None
+    if kind == STRING:
+        return str(value)
+    if value == "":
+        return None
+    try:
+        if kind == FLOAT:
+            return float(value)
+        if kind == INT:
+            return int(float(value))   # "3", "3.0", 3
+        if kind == HASH:
+            return int(value)
+        if kind == BOOL:
+            return bool(value)
+        if kind == TIMESTAMP:
+            return value if isinstance(value, datetime) else datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except (TypeError, ValueError):
+        return None
+    return value
+
+
+def _array(values: list, kind: str):
+    """Колонка → pyarrow.Array. Обычно значения уже нужного типа и Arrow берёт их
+    как есть; иначе (id числом, delivery_days строкой, order_datetime текстом) —
+    поштучное приведение _convert."""
+    import pyarrow as pa
+    arrow_type = arrow_types()[kind]
+    try:
+        return pa.array(values, type=arrow_type)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError, ValueError):
+        converted = [_convert(v, kind) for v in values]
+        if kind == TIMESTAMP:
+            # как timestamp без зоны в PostgreSQL: смещение из строки отбрасывается
+            converted = [v.replace(tzinfo=None) if v is not None and v.tzinfo else v for v in converted]
+        return pa.array(converted, type=arrow_type)
+
+
+def to_table(rows: list[dict]):
+    """Строки fetcher.prepare_rows → pyarrow.Table схемы лейка."""
+    return from_columns({c: _array([r.get(c) for r in rows], kind) for c, kind in SCHEMA_TYPES.items()})
+
+
+def from_columns(columns: dict):
+    """Уже типизированные колонки (списки/массивы по LAKE_COLUMNS) → pyarrow.Table."""
+    import pyarrow as pa
+    return pa.table(columns, schema=schema())
+
+
+# ── запись дня ────────────────────────────────────────────────────────────────
+def write_day(table, day: date, lake_dir: str = None, replace: bool = False) -> int:
+    """Пишет день (pyarrow.Table из to_table / from_columns) в партицию. replace=False —
+    слияние с уже записанными по order_id (побеждают новые). Возвращает число строк в партиции."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+
+    target = partition_dir(day, lake_dir)
+    target.mkdir(parents=True, exist_ok=True)
+    path = target / PART_FILE
+
+    if not replace and path.exists():
+        old = pq.read_table(path, schema=schema())
+        stale = pc.is_in(old["order_id"], value_set=table["order_id"])
+        old = old.filter(pc.invert(stale))
+        if old.num_rows:
+            table = pa.concat_tables([old, table])
+
+    tmp = target / f".{PART_FILE}.tmp"
+    pq.write_table(table, tmp, compression="zstd")
+    os.replace(tmp, path)
+    log.info(f"  lake: {table.num_rows} rows → {path}")
+    return table.num_rows
+
@@ -4,16 +4,18 @@ load_history.py — единоразово заполняет БД истори
 
 Использование:
     python load_history.py --start 2023-01-01 --end 2023-12-31
+    python load_history.py --engine async     # конвейер aiohttp + asyncpg (async_fetcher.py)
 
 По умолчанию — весь 2023 год.
 """
 
 import argparse
+import os
 import time
 import logging
 from datetime import date, timedelta
 
-from fetcher import fetch_and_store, get_conn, ensure_schema
+from fetcher import fetch_and_store, get_conn, ensure_schema, limiter, notify_refresh
 
 logging.basicConfig(
     level=logging.INFO,
@@ -21,7 +23,10 @@ logging.basicConfig(
 )
 log = logging.getLogger(__name__)
 
-DELAY_BETWEEN_DAYS = 1.5   # сек между запросами — не DDoSим API
+# Темп запросов (и между страницами, и между днями) задаёт fetcher.limiter (AIMD):
+# растёт, пока API отвечает быстро, и падает на 429/5xx/медленных ответах.
+# Здесь — только дополнительная фиксированная пауза между днями, по умолчанию не нужна.
+DELAY_BETWEEN_DAYS = 0.0
 
 
 def daterange(start: date, end: date):
@@ -36,7 +41,9 @@ def main():
     parser.add_argument("--start", default="2023-01-01", help="Start date YYYY-MM-DD")
     parser.add_argument("--end",   default="2023-12-31", help="End date YYYY-MM-DD")
     parser.add_argument("--delay", type=float, default=DELAY_BETWEEN_DAYS,
-                        help="Delay between API requests (sec)")
+                        help="Extra delay between days (sec); request rate is adaptive")
+    parser.add_argument("--engine", choices=["sync", "async"], default=os.getenv("FETCH_ENGINE", "sync"),
+                        help="sync — fetcher.py, async — async_fetcher.py (fetch и запись внахлёст)")
     args = parser.parse_args()
 
     start = date.fromisoformat(args.start)
@@ -49,6 +56,17 @@ def main():
     with get_conn() as conn:
         ensure_schema(conn)
 
+    if args.engine == "async":
+        load_async(start, end, args.delay)
+    else:
+        load_sync(start, end, args.delay)
+
+    with get_conn() as conn:
+        notify_refresh(conn, f"{start}..{end}")
+
+
+def load_sync(start: date, end: date, delay: float):
+    total_days = (end - start).days + 1
     total_rows = 0
     errors = []
 
@@ -62,14 +80,29 @@ def main():
             log.error(f"  FAILED {d}: {e}")
             errors.append((d, str(e)))
 
-        time.sleep(args.delay)
+        if delay:
+            time.sleep(delay)
 
     log.info(f"\n=== Done. {total_rows} total rows loaded. {len(errors)} errors. ===")
+    log.info(f"Rate limiter: {limiter.stats()}")
     if errors:
         log.warning("Failed dates:")
         for d, e in errors:
             log.warning(f"  {d}: {e}")
 
 
+def load_async(start: date, end: date, delay: float):
+    from async_fetcher import load_range
+
+    counts, errors = load_range(start, end, day_delay=delay)
+    total_rows = sum(counts.values())
+    log.info(f"\n=== Done. {total_rows} total rows loaded. {len(errors)} errors. ===")
+    log.info(f"Rate limiter: {limiter.stats()}")
+    if errors:
+        log.warning("Failed dates:")
+        for d, e in errors.items():
+            log.warning(f"  {d}: {e}")
+
+
 if __name__ == "__main__":
     main()
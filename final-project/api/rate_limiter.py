@@ -0,0 +1,124 @@
+"""
+rate_limiter.py — адаптивный ограничитель частоты запросов к API (AIMD).
+
+Вместо фиксированных пауз (API_DELAY между страницами, DELAY_BETWEEN_DAYS
+между днями) темп подстраивается под ответы API:
+  - быстрый успешный ответ      → rate += increase         (аддитивный рост);
+  - 429 / 5xx / таймаут / ответ
+    дольше slow_s               → rate *= decrease         (мультипликативный спад);
+  - заголовок Retry-After       → следующий запрос не раньше, чем через указанное время.
+Rate ограничен [min_rate, max_rate]; max_rate=0 — без ограничения (бенчмарки),
+но Retry-After соблюдается и тогда.
+
+Один экземпляр делится между страницами и днями (fetcher.limiter), поэтому
+в бэкфилле первый запрос следующего дня идёт в том же темпе, что и страницы.
+
+Настройка через окружение: RATE_INITIAL, RATE_MIN, RATE_MAX, RATE_INCREASE,
+RATE_DECREASE, RATE_SLOW_S (см. from_env).
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Optional
+
+log = logging.getLogger(__name__)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class AdaptiveRateLimiter:
+    def __init__(self, initial_rate: float = 1.0, min_rate: float = 0.1, max_rate: float = 10.0,
+                 increase: float = 0.1, decrease: float = 0.5, slow_s: float = 5.0,
+                 log_every: int = 20):
+        self.rate = initial_rate if max_rate == 0 else min(max(initial_rate, min_rate), max_rate)
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.slow_s = slow_s
+        self.log_every = log_every
+        self.requests = 0
+        self.backoffs = 0
+        self._next_at = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "AdaptiveRateLimiter":
+        # прежний фиксированный API_DELAY задаёт стартовый темп
+        delay = float(os.getenv("API_DELAY", "1.0"))
+        return cls(
+            initial_rate=float(os.getenv("RATE_INITIAL", 1 / delay if delay > 0 else 1.0)),
+            min_rate=float(os.getenv("RATE_MIN", "0.1")),
+            max_rate=float(os.getenv("RATE_MAX", "10")),
+            increase=float(os.getenv("RATE_INCREASE", "0.1")),
+            decrease=float(os.getenv("RATE_DECREASE", "0.5")),
+            slow_s=float(os.getenv("RATE_SLOW_S", "5")),
+        )
+
+    @property
+    def unlimited(self) -> bool:
+        return self.max_rate == 0
+
+    # ── Ожидание слота ───────────────────────────────────────────────────────
+    def reserve(self) -> float:
+        """Бронирует слот под следующий запрос; возвращает, сколько до него ждать (сек).
+        Без ограничения темпа слоты не расходуются, но пауза Retry-After (_next_at) соблюдается."""
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_at)
+            if not self.unlimited:
+                self._next_at = start + 1 / self.rate
+            return start - now
+
+    def wait(self):
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    async def wait_async(self):
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    # ── Обратная связь ───────────────────────────────────────────────────────
+    def record(self, status: Optional[int], latency: float, retry_after: Optional[float] = None) -> bool:
+        """Учитывает ответ (status=None — сетевая ошибка/таймаут).
+        Возвращает True, если запрос стоит повторить."""
+        with self._lock:
+            self.requests += 1
+            failed = status is None or status in RETRY_STATUSES
+            if failed or latency > self.slow_s:
+                self._backoff(status, latency, retry_after)
+            elif not self.unlimited:
+                self.rate = min(self.rate + self.increase, self.max_rate)
+            if self.log_every and self.requests % self.log_every == 0:
+                log.info(f"  rate limiter: {self.rate:.2f} req/s "
+                         f"({self.requests} requests, {self.backoffs} backoffs)")
+        return failed
+
+    def _backoff(self, status, latency, retry_after):
+        self.backoffs += 1
+        old = self.rate
+        if not self.unlimited:
+            self.rate = max(self.rate * self.decrease, self.min_rate)
+        if retry_after:
+            self._next_at = max(self._next_at, time.monotonic() + retry_after)
+        reason = f"HTTP {status}" if status else "network error"
+        if status and status not in RETRY_STATUSES:
+            reason = f"slow response {latency:.1f}s"
+        log.warning(f"  rate limiter: {reason} → {old:.2f} → {self.rate:.2f} req/s"
+                    + (f", Retry-After {retry_after:g}s" if retry_after else ""))
+
+    def stats(self) -> dict:
+        return {"rate": round(self.rate, 3), "requests": self.requests, "backoffs": self.backoffs}
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After в секундах (HTTP-дату не поддерживаем — API её не шлёт)."""
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
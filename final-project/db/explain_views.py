@@ -0,0 +1,154 @@
+"""
+explain_views.py — EXPLAIN ANALYZE всех представлений db/views.sql до и после
+индексов, подобранных под них (fetcher.FACT_INDEXES).
+
+  до     — в транзакции подобранные индексы удаляются, прежние универсальные
+           B-tree (order_date, customer_key, product_key) создаются; затем ROLLBACK;
+  после  — схема как есть (fetcher.ensure_schema);
+  --try  — «после» + индексы-кандидаты (тоже в откатываемой транзакции):
+           проверить идею на своих данных, не меняя схему.
+
+Время — медиана Execution Time из EXPLAIN (ANALYZE, TIMING OFF) по --runs прогонам,
+перед ними один прогревающий. Для каждого представления печатается, как читается
+fact_orders (какой индекс выбрал планировщик или seq scan).
+
+ВНИМАНИЕ: DROP/CREATE INDEX держат эксклюзивную блокировку fact_orders до конца
+транзакции — запускайте на копии базы или когда загрузка не идёт.
+
+Использование:
+    python db/explain_views.py --dsn postgresql://localhost/marketplace_bench --vacuum
+    python db/explain_views.py --try "CREATE INDEX ON fact_orders USING brin (order_date)" \\
+        --out explain.json
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import sys
+from pathlib import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'api'))
+
+import psycopg2
+
+import fetcher
+
+VIEWS_SQL = Path(__file__).resolve().parent / "views.sql"
+# Набор до подбора: B-tree по order_date + универсальные по ключам справочников
+BEFORE_INDEXES = {"idx_fact_orders_date": fetcher.FACT_INDEXES["idx_fact_orders_date"],
+                  **fetcher.SUPERSEDED_INDEXES}
+
+
+def view_names() -> list[str]:
+    return re.findall(r"CREATE OR REPLACE VIEW (\w+)", VIEWS_SQL.read_text(encoding="utf-8"))
+
+
+def fact_access(plan: dict) -> list[str]:
+    """Как в плане читается fact_orders: индексы (вид сканирования) или 'seq'."""
+    if plan.get("Relation Name") == "fact_orders":
+        node = plan["Node Type"]
+        if node == "Seq Scan":
+            return ["seq"]
+        if node == "Bitmap Heap Scan":
+            return [f"{p['Index Name']} (bitmap)" for p in plan.get("Plans", []) if "Index Name" in p]
+        if "Index Name" in plan:
+            return [f"{plan['Index Name']} ({'only' if node == 'Index Only Scan' else 'index'})"]
+    return [access for child in plan.get("Plans", []) for access in fact_access(child)]
+
+
+def explain(cur, view: str, runs: int) -> dict:
+    times, plan = [], None
+    for i in range(runs + 1):
+        cur.execute(f"EXPLAIN (ANALYZE, TIMING OFF, FORMAT JSON) SELECT * FROM {view}")
+        result = cur.fetchone()[0][0]
+        if i:                       # первый прогон — прогрев кэша
+            times.append(result["Execution Time"])
+        plan = result["Plan"]
+    access = list(dict.fromkeys(fact_access(plan)))
+    return {"ms": round(statistics.median(times), 1), "access": ", ".join(access) or "-"}
+
+
+def measure(conn, views: list[str], runs: int, setup: list[str] = ()) -> dict:
+    """Замер в транзакции: setup (DROP/CREATE INDEX) → EXPLAIN ANALYZE → ROLLBACK."""
+    try:
+        with conn.cursor() as cur:
+            for sql in setup:
+                cur.execute(sql)
+            return {v: explain(cur, v, runs) for v in views}
+    finally:
+        conn.rollback()
+
+
+def index_sizes(conn) -> dict:
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT indexrelname, pg_relation_size(indexrelid)
+            FROM pg_stat_user_indexes WHERE relname = 'fact_orders' ORDER BY indexrelname
+        """)
+        return dict(cur.fetchall())
+
+
+def print_report(views: list[str], results: dict):
+    sets = list(results)
+    head = (f"{'view':<22}" + "".join(f"{s + ' ms':>12}" for s in sets)
+            + f"{'x':>7}   fact_orders access ({sets[-1]})")
+    print(head)
+    print("-" * len(head))
+    for v in views:
+        before, after = results["before"][v]["ms"], results["after"][v]["ms"]
+        line = f"{v:<22}" + "".join(f"{results[s][v]['ms']:>12.1f}" for s in sets)
+        line += f"{before / after if after else 0:>7.2f}   {results[sets[-1]][v]['access']}"
+        print(line)
+    totals = "".join(f"{sum(results[s][v]['ms'] for v in views):>12.1f}" for s in sets)
+    print(f"{'total':<22}{totals}")
+    print("\nx — ускорение «после» относительно «до»")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EXPLAIN ANALYZE of db/views.sql before/after the fact_orders index set")
+    parser.add_argument("--dsn", default=os.getenv("DB_DSN", fetcher.DB_DSN))
+    parser.add_argument("--runs", type=int, default=3, help="замеров на представление (медиана)")
+    parser.add_argument("--vacuum", action="store_true",
+                        help="VACUUM ANALYZE fact_orders перед замером (карта видимости для index-only scan)")
+    parser.add_argument("--try", dest="candidates", action="append", default=[], metavar="SQL",
+                        help="CREATE INDEX ... — кандидат, замеряется поверх текущего набора и откатывается")
+    parser.add_argument("--out", type=Path, help="сохранить результаты в JSON")
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(args.dsn)
+    try:
+        fetcher.ensure_schema(conn)
+        if args.vacuum:
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute("VACUUM ANALYZE fact_orders")
+            conn.autocommit = False
+
+        views = view_names()
+        dropped = [name for name in fetcher.FACT_INDEXES if name not in BEFORE_INDEXES]
+        # «после» — первым: сборка индексов для «до» оставляет грязный кэш и запись
+        # на диск, которые иначе достались бы следующему замеру
+        after = measure(conn, views, args.runs)
+        results = {
+            "before": measure(conn, views, args.runs,
+                              [f"DROP INDEX {', '.join(dropped)}", *BEFORE_INDEXES.values()]),
+            "after":  after,
+        }
+        if args.candidates:
+            results["try"] = measure(conn, views, args.runs, args.candidates)
+        sizes = index_sizes(conn)
+    finally:
+        conn.close()
+
+    print_report(views, results)
+    print("\nfact_orders indexes: " + ", ".join(f"{k} {v / (1 << 20):.0f} MB" for k, v in sizes.items()))
+    if args.out:
+        args.out.write_text(json.dumps({"results": results, "index_bytes": sizes},
+                                       ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"Saved: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,11 @@
 -- ============================================================
 -- views.sql — аналитические представления для Metabase
 -- Запускать после load_history.py
+--
+-- Источник — звезда fact_orders + dim_customer + dim_product (см. api/fetcher.py).
+-- Подсчёты клиентов и товаров идут по суррогатным ключам (1:1 с customer_id /
+-- product_id), атрибуты справочников подтягиваются только там, где нужны.
+-- raw_orders — представление прежней формы для ручных запросов.
 -- ============================================================
 
 -- ── 1. Ежедневная выручка и заказы ───────────────────────────────────────────
@@ -8,57 +13,82 @@ CREATE OR REPLACE VIEW v_daily_revenue AS
 SELECT
     order_date,
     COUNT(DISTINCT order_id)    AS orders,
-    COUNT(DISTINCT customer_id) AS unique_customers,
+    COUNT(DISTINCT customer_key) AS unique_customers,
     SUM(revenue)                AS revenue,
     SUM(profit)                 AS profit,
     ROUND(SUM(revenue) / NULLIF(COUNT(DISTINCT order_id), 0), 2) AS avg_order_value,
     ROUND(AVG(discount_pct), 2) AS avg_discount_pct,
     SUM(CASE WHEN is_returned THEN 1 ELSE 0 END)::FLOAT /
         NULLIF(COUNT(*), 0)     AS return_rate
-FROM raw_orders
+FROM fact_orders
 GROUP BY order_date
 ORDER BY order_date;
 
 
 -- ── 2. Выручка и прибыль по категориям ───────────────────────────────────────
+-- Сначала агрегаты по product_key (узкий fact_orders), затем join с dim_product
+-- по уже свёрнутым строкам: у каждого заказа один товар, поэтому суммы
+-- по товарам дают те же числа, что и агрегация по заказам категории.
 CREATE OR REPLACE VIEW v_category_metrics AS
+WITH product_facts AS (
+    SELECT
+        product_key,
+        COUNT(DISTINCT order_id)                     AS orders,
+        SUM(quantity)                                AS units_sold,
+        SUM(revenue)                                 AS revenue,
+        SUM(profit)                                  AS profit,
+        SUM(price)                                   AS price_sum,
+        COUNT(price)                                 AS price_cnt,
+        SUM(discount_pct)                            AS discount_sum,
+        COUNT(discount_pct)                          AS discount_cnt,
+        SUM(CASE WHEN is_returned THEN 1 ELSE 0 END) AS returned,
+        COUNT(*)                                     AS row_cnt
+    FROM fact_orders
+    GROUP BY product_key
+)
 SELECT
-    category,
-    subcategory,
-    COUNT(DISTINCT order_id)                         AS orders,
-    SUM(quantity)                                    AS units_sold,
-    ROUND(SUM(revenue)::NUMERIC, 2)                  AS revenue,
-    ROUND(SUM(profit)::NUMERIC,  2)                  AS profit,
-    ROUND(SUM(profit) / NULLIF(SUM(revenue), 0) * 100, 2) AS margin_pct,
-    ROUND(AVG(price)::NUMERIC, 2)                    AS avg_price,
-    ROUND(AVG(discount_pct)::NUMERIC, 2)             AS avg_discount,
-    SUM(CASE WHEN is_returned THEN 1 ELSE 0 END)::FLOAT /
-        NULLIF(COUNT(*), 0) * 100                    AS return_rate_pct
-FROM raw_orders
-GROUP BY category, subcategory
+    p.category,
+    p.subcategory,
+    SUM(pf.orders)::BIGINT                           AS orders,
+    SUM(pf.units_sold)::BIGINT                       AS units_sold,
+    ROUND(SUM(pf.revenue)::NUMERIC, 2)               AS revenue,
+    ROUND(SUM(pf.profit)::NUMERIC,  2)               AS profit,
+    ROUND(SUM(pf.profit) / NULLIF(SUM(pf.revenue), 0) * 100, 2) AS margin_pct,
+    ROUND((SUM(pf.price_sum) / NULLIF(SUM(pf.price_cnt), 0))::NUMERIC, 2)       AS avg_price,
+    ROUND((SUM(pf.discount_sum) / NULLIF(SUM(pf.discount_cnt), 0))::NUMERIC, 2) AS avg_discount,
+    SUM(pf.returned)::FLOAT /
+        NULLIF(SUM(pf.row_cnt), 0) * 100             AS return_rate_pct
+FROM product_facts pf
+LEFT JOIN dim_product p ON p.product_key = pf.product_key
+GROUP BY p.category, p.subcategory
 ORDER BY revenue DESC;
 
 
 -- ── 3. ABC-анализ товаров по выручке ─────────────────────────────────────────
+-- Правило классов то же, что в analysis/abc_xyz.py (abc_classify / abc_sql):
+-- кум. доля <= 0.80 → A, <= 0.95 → B, иначе C (ничьи по выручке упорядочены по product_id).
 CREATE OR REPLACE VIEW v_product_abc AS
-WITH product_revenue AS (
+WITH product_facts AS (
     SELECT
-        product_id,
-        product_name,
-        category,
-        brand,
+        product_key,
         SUM(revenue)   AS revenue,
         SUM(profit)    AS profit,
         SUM(quantity)  AS units_sold,
         COUNT(DISTINCT order_id) AS orders
-    FROM raw_orders
+    FROM fact_orders
     WHERE order_date BETWEEN '2023-01-01' AND '2023-12-31'
-    GROUP BY product_id, product_name, category, brand
+    GROUP BY product_key
+),
+product_revenue AS (
+    SELECT p.product_id, p.product_name, p.category, p.brand,
+           pf.revenue, pf.profit, pf.units_sold, pf.orders
+    FROM product_facts pf
+    LEFT JOIN dim_product p ON p.product_key = pf.product_key
 ),
 ranked AS (
     SELECT *,
         SUM(revenue) OVER ()                          AS total_revenue,
-        SUM(revenue) OVER (ORDER BY revenue DESC
+        SUM(revenue) OVER (ORDER BY revenue DESC, product_id
             ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW) AS cumulative_revenue
     FROM product_revenue
 )
@@ -80,20 +110,23 @@ ORDER BY revenue DESC;
 
 -- ── 4. RFM-сегментация клиентов ──────────────────────────────────────────────
 CREATE OR REPLACE VIEW v_customer_rfm AS
-WITH rfm_raw AS (
+WITH customer_facts AS (
     SELECT
-        customer_id,
-        customer_name,
-        customer_city,
-        customer_gender,
+        customer_key,
         MAX(order_date)                   AS last_order_date,
         COUNT(DISTINCT order_id)          AS frequency,
         ROUND(SUM(revenue)::NUMERIC, 2)   AS monetary,
         ('2024-01-01'::DATE - MAX(order_date)) AS recency_days
-    FROM raw_orders
+    FROM fact_orders
     WHERE order_date BETWEEN '2023-01-01' AND '2023-12-31'
       AND is_returned = FALSE
-    GROUP BY customer_id, customer_name, customer_city, customer_gender
+    GROUP BY customer_key
+),
+rfm_raw AS (
+    SELECT c.customer_id, c.customer_name, c.customer_city, c.customer_gender,
+           cf.last_order_date, cf.frequency, cf.monetary, cf.recency_days
+    FROM customer_facts cf
+    LEFT JOIN dim_customer c ON c.customer_key = cf.customer_key
 ),
 scored AS (
     SELECT *,
@@ -120,44 +153,59 @@ ORDER BY monetary DESC;
 CREATE OR REPLACE VIEW v_cohort_retention AS
 WITH first_order AS (
     SELECT
-        customer_id,
+        customer_key,
         DATE_TRUNC('month', MIN(order_date))::DATE AS cohort_month
-    FROM raw_orders
-    GROUP BY customer_id
+    FROM fact_orders
+    GROUP BY customer_key
 ),
 monthly_activity AS (
     SELECT
-        o.customer_id,
+        o.customer_key,
         f.cohort_month,
         DATE_TRUNC('month', o.order_date)::DATE AS activity_month
-    FROM raw_orders o
-    JOIN first_order f ON o.customer_id = f.customer_id
-    GROUP BY o.customer_id, f.cohort_month, DATE_TRUNC('month', o.order_date)::DATE
+    FROM fact_orders o
+    JOIN first_order f ON o.customer_key = f.customer_key
+    GROUP BY o.customer_key, f.cohort_month, DATE_TRUNC('month', o.order_date)::DATE
 )
 SELECT
     cohort_month,
     (DATE_PART('year', activity_month) - DATE_PART('year', cohort_month)) * 12 +
      DATE_PART('month', activity_month) - DATE_PART('month', cohort_month) AS month_number,
-    COUNT(DISTINCT customer_id) AS customers
+    COUNT(DISTINCT customer_key) AS customers
 FROM monthly_activity
 GROUP BY cohort_month, month_number
 ORDER BY cohort_month, month_number;
 
 
 -- ── 6. Метрики по городам ─────────────────────────────────────────────────────
+-- Как в v_category_metrics: агрегаты по customer_key, затем город из dim_customer
+-- (у клиента один город, поэтому число клиентов города = число строк customer_facts).
 CREATE OR REPLACE VIEW v_city_metrics AS
+WITH customer_facts AS (
+    SELECT
+        customer_key,
+        COUNT(DISTINCT order_id)                     AS orders,
+        SUM(revenue)                                 AS revenue,
+        SUM(rating)                                  AS rating_sum,
+        COUNT(rating)                                AS rating_cnt,
+        SUM(CASE WHEN is_returned THEN 1 ELSE 0 END) AS returned,
+        COUNT(*)                                     AS row_cnt
+    FROM fact_orders
+    GROUP BY customer_key
+)
 SELECT
-    customer_city                                AS city,
-    COUNT(DISTINCT customer_id)                  AS unique_customers,
-    COUNT(DISTINCT order_id)                     AS orders,
-    ROUND(SUM(revenue)::NUMERIC, 2)              AS revenue,
-    ROUND(SUM(revenue) / NULLIF(COUNT(DISTINCT customer_id), 0), 2) AS ltv_avg,
-    ROUND(SUM(revenue) / NULLIF(COUNT(DISTINCT order_id), 0), 2)    AS aov,
-    ROUND(AVG(rating)::NUMERIC, 2)               AS avg_rating,
-    ROUND(SUM(CASE WHEN is_returned THEN 1 ELSE 0 END)::NUMERIC /
-          NULLIF(COUNT(*), 0) * 100, 2)          AS return_rate_pct
-FROM raw_orders
-GROUP BY customer_city
+    c.customer_city                              AS city,
+    COUNT(cf.customer_key)                       AS unique_customers,
+    SUM(cf.orders)::BIGINT                       AS orders,
+    ROUND(SUM(cf.revenue)::NUMERIC, 2)           AS revenue,
+    ROUND(SUM(cf.revenue) / NULLIF(COUNT(cf.customer_key), 0), 2) AS ltv_avg,
+    ROUND(SUM(cf.revenue) / NULLIF(SUM(cf.orders), 0), 2)         AS aov,
+    ROUND((SUM(cf.rating_sum) / NULLIF(SUM(cf.rating_cnt), 0))::NUMERIC, 2) AS avg_rating,
+    ROUND(SUM(cf.returned)::NUMERIC /
+          NULLIF(SUM(cf.row_cnt), 0) * 100, 2)   AS return_rate_pct
+FROM customer_facts cf
+LEFT JOIN dim_customer c ON c.customer_key = cf.customer_key
+GROUP BY c.customer_city
 ORDER BY revenue DESC;
 
 
@@ -168,12 +216,12 @@ SELECT
     EXTRACT(YEAR FROM order_date)::INT           AS year,
     EXTRACT(MONTH FROM order_date)::INT          AS month_num,
     COUNT(DISTINCT order_id)                     AS orders,
-    COUNT(DISTINCT customer_id)                  AS customers,
+    COUNT(DISTINCT customer_key)                 AS customers,
     ROUND(SUM(revenue)::NUMERIC, 2)              AS revenue,
     ROUND(SUM(profit)::NUMERIC, 2)               AS profit,
     ROUND(AVG(revenue / NULLIF(quantity, 0))::NUMERIC, 2) AS avg_item_price,
     ROUND(SUM(CASE WHEN is_returned THEN revenue ELSE 0 END)::NUMERIC /
           NULLIF(SUM(revenue), 0) * 100, 2)      AS return_revenue_pct
-FROM raw_orders
+FROM fact_orders
 GROUP BY DATE_TRUNC('month', order_date), year, month_num
 ORDER BY month;
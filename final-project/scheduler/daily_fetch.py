@@ -3,6 +3,13 @@ daily_fetch.py — ежедневный скрипт для cron.
 Забирает данные за вчера. Запускается в 07:00 через cron:
 
     0 7 * * * /usr/bin/python3 /opt/marketplace/scheduler/daily_fetch.py >> /var/log/marketplace_fetch.log 2>&1
+
+FETCH_ENGINE=async — загрузка через async_fetcher.load_range: всё окно одним конвейером
+                    (fetch и запись в БД внахлёст, в т.ч. между днями).
+RESWEEP_DAYS=N    — заодно перезабрать N-1 предыдущих дней (по умолчанию 7 дней всего):
+                    поздние правки (возвраты, оценки) попадут в БД, а неизменённые
+                    строки отсекаются по row_hash и не переписываются.
+По завершении — NOTIFY aggregates_refresh: сервис агрегатов сбрасывает кэш.
 """
 
 import logging
@@ -13,7 +20,13 @@ from datetime import date, timedelta
 # добавляем путь к api-модулям
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'api'))
 
-from fetcher import fetch_and_store, get_conn, ensure_schema
+from fetcher import get_conn, ensure_schema, notify_refresh
+
+ASYNC = os.getenv("FETCH_ENGINE", "sync") == "async"
+if ASYNC:
+    from async_fetcher import load_range
+else:
+    from fetcher import fetch_and_store
 
 logging.basicConfig(
     level=logging.INFO,
@@ -21,16 +34,30 @@ logging.basicConfig(
 )
 log = logging.getLogger(__name__)
 
+RESWEEP_DAYS = int(os.getenv("RESWEEP_DAYS", "7"))
+
 
 def main():
     yesterday = date.today() - timedelta(days=1)
-    log.info(f"Daily fetch started for {yesterday}")
+    days = [yesterday - timedelta(days=i) for i in range(max(RESWEEP_DAYS, 1) - 1, -1, -1)]
+    log.info(f"Daily fetch started for {yesterday} (window {days[0]} → {yesterday})")
 
     try:
         with get_conn() as conn:
             ensure_schema(conn)
-        n = fetch_and_store(yesterday)
-        log.info(f"Daily fetch completed: {n} rows for {yesterday}")
+        if ASYNC:
+            # всё окно — одним конвейером: одно соединение, день N+1 качается, пока пишется день N
+            counts, errors = load_range(days[0], yesterday)
+            total = sum(counts.values())
+            if errors:
+                log.warning(f"API errors on {len(errors)} day(s): {', '.join(map(str, sorted(errors)))}")
+        else:
+            total = 0
+            for d in days:
+                total += fetch_and_store(d)
+        log.info(f"Daily fetch completed: {total} rows for {days[0]} → {yesterday}")
+        with get_conn() as conn:
+            notify_refresh(conn, yesterday.isoformat())
     except Exception as e:
         log.error(f"Daily fetch FAILED: {e}")
         sys.exit(1)
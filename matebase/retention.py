@@ -0,0 +1,370 @@
+# -*- coding: utf-8 -*-
+"""
+Движок retention для запросов 1–2 из Zadanie-i-kod-SQL.md.
+
+В SQL каждый горизонт — отдельный запрос: Users LEFT JOIN UserEntry (а в
+запросе 2 ещё и × CodeSubmit) и CASE WHEN entry_at::DATE = date_joined::DATE
++ INTERVAL 'N days' по каждой строке соединения. Здесь таблица активности
+«пользователь × день с регистрации» строится один раз:
+
+  1) даты входов переводятся в номер дня от регистрации (целое), пары
+     (пользователь, день) схлопываются np.unique — это и есть таблица
+     активности, по одной строке на активный день;
+  2) по ней одним np.bincount считается матрица «когорта (дата регистрации)
+     × день N» — retention на любой день N для всех когорт сразу;
+  3) число решённых задач (уникальные problem_id с is_false = 0) считается
+     один раз, корзины по нему — bincount с весом «был активен на день N».
+
+Результаты совпадают с исходными запросами (в т. ч. пользователи без входов
+и с пустой датой регистрации, группа NULL — последней, как ORDER BY в PG);
+--bench проверяет это на синтетике в PostgreSQL и сравнивает время.
+
+Пример:
+  python retention.py --dsn postgresql://localhost/metabase --days 7 30 --out retention
+  python retention.py --bench --users 50000 --dsn postgresql://localhost/scratch
+"""
+
+import argparse
+import io
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# ---------------------------------------------------------------------
+# CONFIG
+# ---------------------------------------------------------------------
+DB_DSN       = os.getenv("DB_DSN", "postgresql://localhost/metabase")
+DEFAULT_DAYS = (7, 30)
+SOLVED_DAY   = 30
+BENCH_SCHEMA = "retention_bench"
+
+# Только нужные колонки; даты приводятся к DATE на стороне PG — так же, как
+# в исходных запросах (с учётом TimeZone сессии для timestamptz)
+LOAD_SQL = {
+    "users":   "SELECT id, date_joined::DATE AS date_joined FROM Users",
+    "entries": "SELECT user_id, entry_at::DATE AS entry_at FROM UserEntry",
+    "submits": "SELECT DISTINCT user_id, problem_id FROM CodeSubmit WHERE is_false = 0",
+}
+
+# Исходные запросы 1 и 2 (горизонт подставляется) — эталон для --bench
+RETENTION_SQL = """
+SELECT signup_date,
+COUNT(user_id) AS total_users,
+COUNT(CASE WHEN active_day_{days} IS NOT NULL THEN user_id END) * 100.0 / COUNT(user_id) AS retention_{days}_day
+FROM (
+SELECT
+u.id AS user_id,
+u.date_joined::DATE AS signup_date,
+MAX(CASE
+WHEN ue.entry_at::DATE = u.date_joined::DATE + INTERVAL '{days} days'
+THEN u.id
+END) AS active_day_{days}
+FROM Users u
+LEFT JOIN UserEntry ue ON u.id = ue.user_id
+GROUP BY u.id, u.date_joined
+) AS retention_data
+GROUP BY signup_date
+ORDER BY signup_date
+"""
+
+SOLVED_SQL = """
+SELECT num_solved_tasks,
+COUNT(user_id) AS total_users,
+COUNT(CASE WHEN retention_{days} IS NOT NULL THEN user_id END) * 100.0 / COUNT(user_id) AS retention_rate
+FROM (
+SELECT
+u.id AS user_id,
+COUNT(DISTINCT cs.problem_id) AS num_solved_tasks,
+MAX(CASE
+WHEN ue.entry_at::DATE = u.date_joined::DATE + INTERVAL '{days} days'
+THEN u.id
+END) AS retention_{days}
+FROM Users u
+LEFT JOIN CodeSubmit cs ON u.id = cs.user_id AND cs.is_false = 0
+LEFT JOIN UserEntry ue ON u.id = ue.user_id
+GROUP BY u.id, u.date_joined
+) AS task_retention
+GROUP BY num_solved_tasks
+ORDER BY num_solved_tasks
+"""
+
+
+# ---------------------------------------------------------------------
+# ENGINE
+# ---------------------------------------------------------------------
+def _days(values) -> np.ndarray:
+    """Даты/время → datetime64[D] (как ::DATE); tz-aware — по местному времени."""
+    s = pd.to_datetime(pd.Series(values))
+    if s.dt.tz is not None:
+        s = s.dt.tz_localize(None)
+    return s.to_numpy().astype("datetime64[D]")
+
+
+class RetentionEngine:
+    """Таблица активности «пользователь × день с регистрации», строится один раз.
+
+    users   — id, date_joined;
+    entries — user_id, entry_at;
+    submits — user_id, problem_id[, is_false] (необязательно, для корзин по задачам).
+    """
+
+    def __init__(self, users: pd.DataFrame, entries: pd.DataFrame, submits: pd.DataFrame | None = None):
+        index = pd.Index(users["id"].to_numpy())
+        self.n_users = len(index)
+        signup = _days(users["date_joined"])
+        # Когорты — даты регистрации по возрастанию, NaT (NULL) — последней
+        self.cohort, self.cohorts = pd.factorize(signup, sort=True, use_na_sentinel=False)
+
+        user = index.get_indexer(entries["user_id"].to_numpy())
+        entry = _days(entries["entry_at"])
+        keep = user >= 0
+        user, entry = user[keep], entry[keep]
+        keep = ~np.isnat(entry) & ~np.isnat(signup[user])
+        user = user[keep]
+        day = (entry[keep] - signup[user]).astype(np.int64)
+        # Входы до даты регистрации не совпадут ни с одним «+ N days» при N >= 0
+        user, day = user[day >= 0], day[day >= 0]
+
+        self.horizon = int(day.max()) if len(day) else 0
+        width = self.horizon + 1
+        pairs = np.unique(user.astype(np.int64) * width + day)
+        self.user, self.day = pairs // width, pairs % width
+
+        self.counts = np.bincount(self.cohort[self.user] * width + self.day,
+                                  minlength=len(self.cohorts) * width).reshape(len(self.cohorts), width)
+        self.totals = np.bincount(self.cohort, minlength=len(self.cohorts))
+        self.solved = None if submits is None else self._solved(index, submits)
+
+    def _solved(self, index: pd.Index, submits: pd.DataFrame) -> np.ndarray:
+        """COUNT(DISTINCT problem_id) по успешным попыткам — на каждого пользователя."""
+        if "is_false" in submits:
+            submits = submits[submits["is_false"] == 0]
+        submits = submits[submits["problem_id"].notna()]
+        user = index.get_indexer(submits["user_id"].to_numpy())
+        problem, uniques = pd.factorize(submits["problem_id"].to_numpy())
+        keep = user >= 0
+        pairs = np.unique(user[keep].astype(np.int64) * max(len(uniques), 1) + problem[keep])
+        return np.bincount(pairs // max(len(uniques), 1), minlength=self.n_users)
+
+    def retained(self, day: int) -> np.ndarray:
+        """Маска пользователей, заходивших ровно на day-й день после регистрации."""
+        mask = np.zeros(self.n_users, dtype=bool)
+        mask[self.user[self.day == day]] = True
+        return mask
+
+    def by_signup(self, days=None) -> pd.DataFrame:
+        """Запрос 1 для любого набора дней: signup_date, total_users, retention_<N>_day.
+        days=None — все дни от 0 до самого позднего входа."""
+        days = range(self.horizon + 1) if days is None else days
+        columns = {"signup_date": self.cohorts, "total_users": self.totals}
+        for d in days:
+            active = self.counts[:, d] if 0 <= d <= self.horizon else np.zeros(len(self.cohorts))
+            columns[f"retention_{d}_day"] = active * 100.0 / self.totals
+        return pd.DataFrame(columns)
+
+    def curve(self) -> pd.DataFrame:
+        """Retention на каждый день N по всем пользователям с датой регистрации."""
+        registered = int(self.totals[:len(self.cohorts) - np.isnat(self.cohorts).sum()].sum())
+        active = self.counts.sum(axis=0)
+        return pd.DataFrame({"day": np.arange(self.horizon + 1), "active_users": active,
+                             "retention": active * 100.0 / max(registered, 1)})
+
+    def by_solved(self, day: int = SOLVED_DAY) -> pd.DataFrame:
+        """Запрос 2: num_solved_tasks, total_users, retention_rate (активность на day-й день)."""
+        if self.solved is None:
+            raise ValueError("RetentionEngine built without submits: solved-task buckets unavailable")
+        total = np.bincount(self.solved)
+        kept = np.bincount(self.solved, weights=self.retained(day), minlength=len(total))
+        nonempty = np.flatnonzero(total)
+        return pd.DataFrame({"num_solved_tasks": nonempty, "total_users": total[nonempty],
+                             "retention_rate": kept[nonempty] * 100.0 / total[nonempty]})
+
+
+# ---------------------------------------------------------------------
+# DB
+# ---------------------------------------------------------------------
+def read_sql(conn, sql: str) -> pd.DataFrame:
+    """SELECT → DataFrame через COPY ... TO STDOUT (быстрее построчного fetch)."""
+    buf = io.StringIO()
+    with conn.cursor() as cur:
+        cur.copy_expert(f"COPY ({sql}) TO STDOUT WITH CSV HEADER", buf)
+    buf.seek(0)
+    return pd.read_csv(buf)
+
+
+def load(conn, with_submits: bool = True) -> dict:
+    names = [n for n in LOAD_SQL if with_submits or n != "submits"]
+    return {name: read_sql(conn, LOAD_SQL[name]) for name in names}
+
+
+def run_original(conn, sql: str) -> pd.DataFrame:
+    with conn.cursor() as cur:
+        cur.execute(sql)
+        columns = [c.name for c in cur.description]
+        return pd.DataFrame(cur.fetchall(), columns=columns)
+
+
+# ---------------------------------------------------------------------
+# BENCH
+# ---------------------------------------------------------------------
+def synthetic(n_users: int, seed: int = 42) -> dict:
+    """Users / UserEntry / CodeSubmit: входы затухают с днём от регистрации,
+    есть повторные входы в один день, входы до регистрации и пустые date_joined."""
+    rng = np.random.default_rng(seed)
+    start = np.datetime64("2022-01-01T00:00:00", "s")
+    joined = start + rng.integers(0, 180 * 86400, n_users).astype("timedelta64[s]")
+    users = pd.DataFrame({"id": np.arange(1, n_users + 1), "date_joined": joined})
+    users.loc[rng.random(n_users) < 0.002, "date_joined"] = pd.NaT
+
+    per_user = rng.geometric(1 / 15, n_users)
+    owner = np.repeat(np.arange(n_users), per_user)
+    offset = (rng.exponential(20 * 86400, len(owner)) - 86400 * (rng.random(len(owner)) < 0.01)).astype(np.int64)
+    entries = pd.DataFrame({"user_id": owner + 1,
+                            "entry_at": joined[owner] + offset.astype("timedelta64[s]")})
+    entries = entries[entries["entry_at"].notna()]
+
+    per_user = rng.geometric(1 / 6, n_users) - 1
+    owner = np.repeat(np.arange(n_users), per_user)
+    submits = pd.DataFrame({"user_id": owner + 1,
+                            "problem_id": rng.integers(1, 120, len(owner)),
+                            "is_false": (rng.random(len(owner)) < 0.6).astype(int),
+                            "created_at": joined[owner] + rng.integers(0, 200 * 86400, len(owner)).astype("timedelta64[s]")})
+    return {"users": users, "entries": entries, "submits": submits}
+
+
+def copy_bench_tables(conn, data: dict):
+    """Синтетика → схема BENCH_SCHEMA (таблицы как в задании), search_path на неё."""
+    ddl = {
+        "users":      ("Users", "id INT PRIMARY KEY, date_joined TIMESTAMP"),
+        "entries":    ("UserEntry", "user_id INT, entry_at TIMESTAMP"),
+        "submits":    ("CodeSubmit", "user_id INT, problem_id INT, is_false INT, created_at TIMESTAMP"),
+    }
+    with conn.cursor() as cur:
+        cur.execute(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE; CREATE SCHEMA {BENCH_SCHEMA}")
+        cur.execute(f"SET search_path TO {BENCH_SCHEMA}")
+        for name, (table, columns) in ddl.items():
+            cur.execute(f"CREATE TABLE {table} ({columns})")
+            buf = io.StringIO()
+            data[name].to_csv(buf, index=False, header=False)
+            buf.seek(0)
+            cur.copy_expert(f"COPY {table} FROM STDIN WITH CSV", buf)
+        cur.execute("CREATE INDEX ON UserEntry (user_id); CREATE INDEX ON CodeSubmit (user_id)")
+        cur.execute("ANALYZE")
+    conn.commit()
+
+
+def _same(ours: pd.DataFrame, theirs: pd.DataFrame) -> bool:
+    if list(ours.columns) != list(theirs.columns) or len(ours) != len(theirs):
+        return False
+    for col in ours.columns:
+        a, b = ours[col], theirs[col]
+        if col == "signup_date":
+            a = pd.to_datetime(a)
+            b = pd.to_datetime(b)
+            if not a.equals(b):
+                return False
+        elif not np.allclose(a.astype(float), b.astype(float), rtol=0, atol=1e-9):
+            return False
+    return True
+
+
+def bench(args):
+    t0 = time.perf_counter()
+    data = synthetic(args.users, args.seed)
+    print(f"synthetic: users {len(data['users']):,}, entries {len(data['entries']):,}, "
+          f"submits {len(data['submits']):,} ({time.perf_counter() - t0:.1f} s)")
+
+    t0 = time.perf_counter()
+    engine = RetentionEngine(data["users"], data["entries"], data["submits"])
+    build = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    signup_all = engine.by_signup()
+    solved = {d: engine.by_solved(d) for d in args.days}
+    answer = time.perf_counter() - t0
+    print(f"engine (in-memory): build {build * 1000:.0f} ms, every N 0..{engine.horizon} "
+          f"+ solved buckets for {list(args.days)}: {answer * 1000:.0f} ms "
+          f"({signup_all.shape[1] - 2} day columns × {len(signup_all)} cohorts, "
+          f"{sum(map(len, solved.values()))} solved buckets)")
+
+    if not args.dsn:
+        return
+    import psycopg2
+
+    conn = psycopg2.connect(args.dsn)
+    try:
+        copy_bench_tables(conn, data)
+        t0 = time.perf_counter()
+        loaded = load(conn)
+        engine = RetentionEngine(loaded["users"], loaded["entries"], loaded["submits"])
+        ours = {d: (engine.by_signup([d]), engine.by_solved(d)) for d in args.days}
+        print(f"engine (from PG): load + build + answer {(time.perf_counter() - t0) * 1000:.0f} ms")
+
+        total, ok = 0.0, True
+        for d in args.days:
+            for label, template, result in (("query 1", RETENTION_SQL, ours[d][0]),
+                                            ("query 2", SOLVED_SQL, ours[d][1])):
+                t0 = time.perf_counter()
+                theirs = run_original(conn, template.format(days=d))
+                elapsed = time.perf_counter() - t0
+                total += elapsed
+                same = _same(result, theirs)
+                ok &= same
+                print(f"SQL {label}, day {d:>3}: {elapsed * 1000:8.0f} ms, rows {len(theirs):>4}  "
+                      f"{'match' if same else 'MISMATCH'}")
+        print(f"SQL total: {total * 1000:.0f} ms for {len(args.days)} horizon(s)")
+        if not args.keep:
+            with conn.cursor() as cur:
+                cur.execute(f"DROP SCHEMA {BENCH_SCHEMA} CASCADE")
+            conn.commit()
+    finally:
+        conn.close()
+    if not ok:
+        raise SystemExit("Engine results differ from the original SQL")
+
+
+# ---------------------------------------------------------------------
+# MAIN
+# ---------------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Day-N retention and solved-task buckets from one activity table")
+    parser.add_argument("--dsn", default=None, help=f"PostgreSQL (по умолчанию DB_DSN или {DB_DSN})")
+    parser.add_argument("--days", type=int, nargs="+", default=list(DEFAULT_DAYS),
+                        help="горизонты для вывода и сверки (по умолчанию 7 30)")
+    parser.add_argument("--out", type=Path, help="каталог для CSV: все дни по когортам, кривая, корзины")
+    parser.add_argument("--bench", action="store_true",
+                        help="синтетика; с --dsn — ещё сверка и замер исходных запросов в схеме retention_bench")
+    parser.add_argument("--users", type=int, default=20_000, help="размер синтетики (--bench)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--keep", action="store_true", help="не удалять схему retention_bench после --bench")
+    args = parser.parse_args()
+
+    if args.bench:
+        bench(args)
+        return
+
+    import psycopg2
+
+    with psycopg2.connect(args.dsn or DB_DSN) as conn:
+        data = load(conn)
+    engine = RetentionEngine(data["users"], data["entries"], data["submits"])
+
+    with pd.option_context("display.max_rows", 50, "display.width", 120):
+        print(engine.by_signup(args.days).to_string(index=False))
+        for d in args.days:
+            print(f"\nRetention day {d} by solved tasks:")
+            print(engine.by_solved(d).to_string(index=False))
+
+    if args.out:
+        args.out.mkdir(parents=True, exist_ok=True)
+        engine.by_signup().to_csv(args.out / "retention_by_signup.csv", index=False)
+        engine.curve().to_csv(args.out / "retention_curve.csv", index=False)
+        for d in args.days:
+            engine.by_solved(d).to_csv(args.out / f"retention_{d}_by_solved.csv", index=False)
+        print(f"\nSaved: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+Пакетный рендер графиков retail-кейса по срезам (для cron / CI, без дисплея).
+
+Каждый срез (день или категория level1) рисуется в отдельном процессе:
+данные читаются один раз на процесс (из Parquet-кэша), фигуры сохраняются
+и сразу закрываются. Результат: RESULTS_DIR/batch/<by>=<значение>/*.png|svg
+
+Пример:
+  python batch_render.py --by date --workers 4 --formats png svg --dpi 200
+  python batch_render.py --by category --values Сыры Молоко
+"""
+
+import matplotlib
+matplotlib.use("Agg")  # до любого импорта pyplot, в т.ч. в дочерних процессах
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+# общие модули final-project/analysis (abc_xyz) — в конец пути, чтобы не перекрывать здешние
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'final-project', 'analysis'))
+
+import charts
+from excel_cache import read_excel_cached
+from report_engine import RetailReport
+
+ORDERS_PATH   = Path(r"orders.xlsx")
+PRODUCTS_PATH = Path(r"products.xlsx")
+RESULTS_DIR   = Path("results_case") / "batch"
+CACHE_DIR     = Path(".excel_cache")
+
+_report = None  # RetailReport рабочего процесса
+
+
+def load_report() -> RetailReport:
+    orders = read_excel_cached(ORDERS_PATH, parse_dates=["accepted_at"], cache_dir=CACHE_DIR)
+    products = read_excel_cached(PRODUCTS_PATH, categories=["level1", "level2"], cache_dir=CACHE_DIR)
+    return RetailReport(orders, products)
+
+
+def _init_worker():
+    global _report
+    _report = load_report()
+
+
+def slice_values(report: RetailReport, by: str) -> list:
+    if by == "date":
+        return [d.strftime("%Y-%m-%d") for d in sorted(report.orders["date"].unique())]
+    return sorted(report.ord_prod["level1"].dropna().unique().tolist())
+
+
+def render_slice(by: str, value: str, promo_categories, save_kw: dict):
+    if by == "date":
+        part = _report.slice(dates=[value])
+    else:
+        part = _report.slice(categories=[value])
+    out_dir = RESULTS_DIR / f"{by}={value}"
+    paths = charts.render_report(part, out_dir, promo_categories, **save_kw)
+    return value, len(paths)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Batch chart export by date/category slices")
+    ap.add_argument("--by", choices=["date", "category"], default="date")
+    ap.add_argument("--values", nargs="+", help="Значения среза (по умолчанию — все из данных)")
+    ap.add_argument("--promo-categories", nargs="+", default=["Сыры"])
+    ap.add_argument("--workers", type=int, default=os.cpu_count())
+    ap.add_argument("--formats", nargs="+", default=list(charts.DEFAULT_FORMATS))
+    ap.add_argument("--dpi", type=int, default=charts.DEFAULT_DPI)
+    args = ap.parse_args()
+
+    # прогреваем кэш в родителе, чтобы воркеры не разбирали xlsx параллельно
+    values = args.values or slice_values(load_report(), args.by)
+    save_kw = {"formats": args.formats, "dpi": args.dpi}
+
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker) as pool:
+        futures = [pool.submit(render_slice, args.by, v, args.promo_categories, save_kw) for v in values]
+        total = 0
+        for fut in futures:
+            value, n = fut.result()
+            total += n
+            print(f"{args.by}={value}: {n} файл(ов)")
+    print(f"Готово: {len(values)} срез(ов), {total} файл(ов) за {time.perf_counter() - t0:.1f} с → {RESULTS_DIR}")
+
+
+if __name__ == "__main__":
+    main()
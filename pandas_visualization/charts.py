@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+Графики retail-кейса. Каждая функция рисует свою фигуру, сохраняет её
+во все запрошенные форматы и сразу закрывает — в пакетном режиме (cron)
+фигуры не копятся в памяти.
+
+Headless-режим: вызвать use_headless() до первого импорта pyplot
+(или запустить с MPLBACKEND=Agg).
+"""
+
+from pathlib import Path
+
+import matplotlib
+import pandas as pd
+
+DEFAULT_FORMATS = ("png",)
+DEFAULT_DPI = 150
+
+
+def use_headless():
+    matplotlib.use("Agg")
+
+
+def _plt():
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def save_figure(fig, out_dir: Path, name: str, formats=DEFAULT_FORMATS, dpi=DEFAULT_DPI, keep_open=False):
+    """Сохраняет fig как out_dir/name.<fmt> для каждого формата, затем закрывает фигуру."""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for fmt in formats:
+        path = out_dir / f"{name}.{fmt}"
+        fig.savefig(path, dpi=dpi)
+        paths.append(path)
+    if not keep_open:
+        _plt().close(fig)
+    return paths
+
+
+def bar_units_by_category(cat_units: pd.DataFrame, out_dir, **save_kw):
+    plt = _plt()
+    fig, ax = plt.subplots(figsize=(11,5))
+    ax.bar(cat_units["level1"], cat_units["units_sold"])
+    ax.set_title("Проданные позиции по категориям (шт)")
+    ax.set_xlabel("Категория (level1)")
+    ax.set_ylabel("Штук")
+    plt.setp(ax.get_xticklabels(), rotation=30, ha="right")
+    for x, y in zip(range(len(cat_units)), cat_units["units_sold"]):
+        ax.text(x, y, str(int(y)), ha="center", va="bottom", fontsize=9)
+    fig.tight_layout()
+    return save_figure(fig, out_dir, "01_barchart_units_by_category", **save_kw)
+
+
+def pie_promo_share(category: str, promo_units: int, nonpromo_units: int, out_dir, name: str, **save_kw):
+    plt = _plt()
+    fig, ax = plt.subplots(figsize=(6,6))
+    ax.pie([promo_units, nonpromo_units],
+           labels=["Промо", "Не промо"],
+           autopct="%.1f%%",
+           startangle=90)
+    ax.set_title(f"Доля промо в категории '{category}' (в штуках)")
+    fig.tight_layout()
+    return save_figure(fig, out_dir, name, **save_kw)
+
+
+def barh_margin_rub(margins: pd.DataFrame, out_dir, **save_kw):
+    plt = _plt()
+    m = margins.sort_values("margin_rub", ascending=False)
+    fig, ax = plt.subplots(figsize=(10,6))
+    ax.barh(m["level1"], m["margin_rub"])
+    ax.set_title("Маржа по категориям (руб)")
+    ax.set_xlabel("Маржа, руб")
+    ax.set_ylabel("Категория")
+    for y, v in zip(range(len(m)), m["margin_rub"]):
+        ax.text(v, y, f"{int(v)}", va="center", ha="left", fontsize=9)
+    fig.tight_layout()
+    return save_figure(fig, out_dir, "05_barh_margin_rub", **save_kw)
+
+
+def barh_margin_pct(margins: pd.DataFrame, out_dir, **save_kw):
+    plt = _plt()
+    m = margins.sort_values("margin_pct", ascending=False)
+    fig, ax = plt.subplots(figsize=(10,6))
+    ax.barh(m["level1"], m["margin_pct"])
+    ax.set_title("Маржа по категориям (%)")
+    ax.set_xlabel("Маржа, %")
+    ax.set_ylabel("Категория")
+    for y, v in zip(range(len(m)), m["margin_pct"]):
+        if pd.notnull(v):
+            ax.text(v, y, f"{v:.1f}%", va="center", ha="left", fontsize=9)
+    fig.tight_layout()
+    return save_figure(fig, out_dir, "05_barh_margin_pct", **save_kw)
+
+
+PROMO_CHART_NAMES = {"Сыры": "cheese"}  # суффиксы имён файлов с пирогами
+
+
+def promo_chart_name(category: str) -> str:
+    return f"04_pie_promo_share_{PROMO_CHART_NAMES.get(category, category)}"
+
+
+def render_report(report, out_dir, promo_categories, **save_kw):
+    """Все графики отчёта по одному RetailReport (полному или срезу)."""
+    paths = []
+    cat_units = report.category_units()
+    if len(cat_units):
+        paths += bar_units_by_category(cat_units, out_dir, **save_kw)
+    for category, row in report.promo_share(promo_categories).iterrows():
+        promo_units, nonpromo_units = int(row["promo_units"]), int(row["nonpromo_units"])
+        if promo_units + nonpromo_units == 0:
+            continue  # пирог из нулей не строится
+        paths += pie_promo_share(category, promo_units, nonpromo_units, out_dir,
+                                 promo_chart_name(category), **save_kw)
+    margins = report.margins()
+    if len(margins):
+        paths += barh_margin_rub(margins, out_dir, **save_kw)
+        paths += barh_margin_pct(margins, out_dir, **save_kw)
+    return paths
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+Кэш для xlsx-выгрузок: workbook один раз разбирается через openpyxl и
+сохраняется в Parquet, дальше читается уже из Parquet (доли секунды).
+
+Ключ кэша — mtime + размер исходного файла; если они изменились, считаем
+sha256 и пересобираем кэш только при реальном изменении содержимого.
+"""
+
+import hashlib
+import json
+from pathlib import Path
+
+import pandas as pd
+
+CACHE_DIR = Path(".excel_cache")
+
+
+def file_sha256(path: Path, block_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _read_meta(meta_path: Path) -> dict:
+    try:
+        return json.loads(meta_path.read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def read_excel_cached(path, *, sheet_name=0, parse_dates=None, categories=None,
+                      cache_dir: Path = CACHE_DIR) -> pd.DataFrame:
+    """Аналог pd.read_excel с кэшем в Parquet.
+    parse_dates — колонки-даты, categories — колонки, которые храним как category."""
+    path = Path(path)
+    cache_dir = Path(cache_dir)
+    parse_dates = list(parse_dates or [])
+    categories = list(categories or [])
+
+    stem = f"{path.stem}.{sheet_name}"
+    data_path = cache_dir / f"{stem}.parquet"
+    meta_path = cache_dir / f"{stem}.json"
+
+    stat = path.stat()
+    options = {"parse_dates": parse_dates, "categories": categories}
+    meta = _read_meta(meta_path)
+
+    if data_path.exists() and meta.get("options") == options:
+        if meta.get("mtime") == stat.st_mtime and meta.get("size") == stat.st_size:
+            return pd.read_parquet(data_path)
+        # mtime сменился (копирование, git checkout), но содержимое могло остаться прежним
+        digest = file_sha256(path)
+        if meta.get("sha256") == digest:
+            meta.update(mtime=stat.st_mtime, size=stat.st_size)
+            meta_path.write_text(json.dumps(meta), encoding="utf-8")
+            return pd.read_parquet(data_path)
+    else:
+        digest = file_sha256(path)
+
+    df = pd.read_excel(path, sheet_name=sheet_name, parse_dates=parse_dates or False)
+    for col in categories:
+        df[col] = df[col].astype("category")
+
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    df.to_parquet(data_path, index=False)
+    meta_path.write_text(json.dumps({
+        "source": str(path),
+        "mtime": stat.st_mtime,
+        "size": stat.st_size,
+        "sha256": digest,
+        "options": options,
+    }), encoding="utf-8")
+    return df
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+Движок отчётов retail-кейса (products × orders).
+
+Объединённая и типизированная таблица строится один раз в конструкторе,
+дальше любые срезы (даты, категории, пороги ABC) считаются по ней
+одним groupby, без повторного чтения Excel и повторного merge.
+"""
+
+import numpy as np
+import pandas as pd
+
+# общий ABC/XYZ-классификатор проекта (final-project/analysis в sys.path кладут work.py / batch_render.py)
+from abc_xyz import abc_classify
+
+
+class RetailReport:
+    def __init__(self, orders: pd.DataFrame, products: pd.DataFrame):
+        orders = orders.copy()
+        orders["date"] = orders["accepted_at"].dt.normalize()
+        orders["sum_item"] = orders["price"] * orders["quantity"]
+        self.orders = orders
+        self.products = products
+
+        # Для задач с категориями: берём только совпавшие product_id
+        ord_prod = orders.merge(products, on="product_id", how="inner")
+        ord_prod["revenue"]  = ord_prod["sum_item"]
+        ord_prod["cost"]     = ord_prod["cost_price"] * ord_prod["quantity"]
+        # Промо: price < regular_price
+        ord_prod["is_promo"] = ord_prod["price"] < ord_prod["regular_price"]
+        self.ord_prod = ord_prod
+
+    def slice(self, dates=None, categories=None) -> "RetailReport":
+        """Отчёт по срезу: только указанные дни и/или категории level1."""
+        orders, products = self.orders, self.products
+        if dates is not None:
+            idx = pd.DatetimeIndex(pd.to_datetime(list(dates))).normalize()
+            orders = orders[orders["date"].isin(idx)]
+        if categories is not None:
+            products = products[products["level1"].isin(list(categories))]
+        return RetailReport(orders, products)
+
+    # 1) Проданные штуки по категориям
+    def category_units(self) -> pd.DataFrame:
+        return (self.ord_prod.groupby("level1", as_index=False, observed=True)["quantity"]
+                              .sum()
+                              .rename(columns={"quantity": "units_sold"})
+                              .sort_values("units_sold", ascending=False))
+
+    # 2) Распределение продаж по подкатегориям в разрезе категорий
+    def subcategory_shares(self) -> pd.DataFrame:
+        sub = (self.ord_prod.groupby(["level1","level2"], as_index=False, observed=True)["quantity"]
+                            .sum()
+                            .rename(columns={"quantity": "units_sold"}))
+        sub["units_in_cat"] = sub.groupby("level1", observed=True)["units_sold"].transform("sum")
+        sub["share_in_cat"] = sub["units_sold"] / sub["units_in_cat"]
+        return sub.sort_values(["level1","units_sold"], ascending=[True, False])
+
+    # 3) Средний чек по каждому дню (orders только) — один groupby на все даты
+    def average_check(self) -> pd.Series:
+        bills = self.orders.groupby(["date", "order_id"])["sum_item"].sum()
+        return bills.groupby(level="date").mean().rename("avg_check")
+
+    def average_check_on(self, dates) -> pd.Series:
+        idx = pd.DatetimeIndex(pd.to_datetime(list(dates))).normalize()
+        return self.average_check().reindex(idx)
+
+    # 4) Доля промо (в штуках) по категориям
+    def promo_share(self, categories=None) -> pd.DataFrame:
+        op = self.ord_prod
+        res = pd.DataFrame({
+            "total_units": op["quantity"].groupby(op["level1"], observed=True).sum(),
+            "promo_units": op["quantity"].where(op["is_promo"], 0).groupby(op["level1"], observed=True).sum(),
+        })
+        observed = res.index
+        if categories is not None:
+            res = res.reindex(list(categories), fill_value=0)
+        res["nonpromo_units"] = res["total_units"] - res["promo_units"]
+        # категории нет в данных -> NaN; есть, но 0 штук -> 0.0
+        res["promo_share"] = res["promo_units"] / res["total_units"].replace(0, np.nan)
+        res.loc[res.index.isin(observed) & (res["total_units"] == 0), "promo_share"] = 0.0
+        return res
+
+    # 5) Маржа по категориям (руб и %)
+    def margins(self) -> pd.DataFrame:
+        m = self.ord_prod.groupby("level1", as_index=False, observed=True)[["revenue","cost"]].sum()
+        m["margin_rub"] = m["revenue"] - m["cost"]
+        m["margin_pct"] = np.where(
+            m["revenue"] > 0, m["margin_rub"] / m["revenue"] * 100, np.nan
+        )
+        return m
+
+    # 6) ABC по подкатегориям: по количеству и по выручке
+    def abc_base(self) -> pd.DataFrame:
+        return (self.ord_prod.groupby("level2", as_index=False, observed=True)
+                             .agg(units_sold=("quantity","sum"),
+                                  sales=("revenue","sum")))
+
+    def abc(self, thresholds=(0.80, 0.95), base: pd.DataFrame = None) -> pd.DataFrame:
+        abc = (self.abc_base() if base is None else base).copy()
+        # A — кум. доля до t0, B — до t1, остальное — C
+        classes = abc_classify(abc, ["units_sold", "sales"], thresholds=thresholds, prefix="")
+        abc["ABC_qty"]   = classes["units_sold"]
+        abc["ABC_sales"] = classes["sales"]
+        abc["ABC_both"]  = abc["ABC_qty"].astype(str) + " " + abc["ABC_sales"].astype(str)
+        return abc.sort_values(["ABC_sales","sales"], ascending=[True, False])
+
+    def abc_many(self, threshold_sets) -> dict:
+        # базовая агрегация одна на все наборы порогов
+        base = self.abc_base()
+        return {tuple(t): self.abc(t, base) for t in threshold_sets}
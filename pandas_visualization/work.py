@@ -4,18 +4,34 @@ Retail case: products × orders
 Задачи:
 1) Самая ходовая товарная группа (таблица + barchart)
 2) Распределение продаж по подкатегориям (таблица)
-3) Средний чек на 13.01.2022
-4) Доля промо в категории "Сыры" (в штуках) + piechart
+3) Средний чек на 13.01.2022 (и на любые другие даты — см. --dates)
+4) Доля промо в категории "Сыры" (в штуках) + piechart (см. --promo-categories)
 5) Маржа по категориям (руб и %) + 2 горизонтальных барчарта
 6) ABC-анализ по подкатегориям: по количеству и по выручке + итоговая группа
 
 Правило: во всех задачах, кроме среднего чека, игнорируем товары, которых нет в products (inner join).
+
+Расчёты — в report_engine.RetailReport; здесь только параметры, вывод и графики.
+Пример: python work.py --dates 2022-01-13 2022-01-14 --promo-categories Сыры Молоко --abc 0.8,0.95 0.7,0.9
+Без дисплея (cron): python work.py --headless --formats png svg --dpi 200
+Графики по срезам (дни/категории) параллельно — см. batch_render.py.
+Где уходит время: python work.py --headless --profile [--cprofile] → RESULTS_DIR/profile.csv
 """
 
+import argparse
+import os
+import sys
 from pathlib import Path
-import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
+
+# общие модули final-project/analysis (abc_xyz, profiling) — в конец пути, чтобы не перекрывать здешние
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'final-project', 'analysis'))
+
+import charts
+from excel_cache import read_excel_cached
+from report_engine import RetailReport
+
+from profiling import Profiler  # профайлер секций — общий с final-project/analysis
 
 # ---------------------------------------------------------------------
 # CONFIG — укажите пути к своим файлам, если нужно
@@ -23,32 +39,53 @@ import matplotlib.pyplot as plt
 ORDERS_PATH   = Path(r"orders.xlsx")   # orders
 PRODUCTS_PATH = Path(r"products.xlsx")    # products
 RESULTS_DIR   = Path("results_case")
+CACHE_DIR     = Path(".excel_cache")  # Parquet-копии xlsx, пересобираются при изменении файла
+TARGET_DATES  = ["2022-01-13"]
 CATEGORY_FOR_PROMO = "Сыры"
 ABC_THRESHOLDS = (0.80, 0.95)  # A до 80%, B до 95%, далее C
 
+ap = argparse.ArgumentParser(description="Retail case report")
+ap.add_argument("--dates", nargs="+", default=TARGET_DATES, help="Даты для среднего чека (YYYY-MM-DD)")
+ap.add_argument("--promo-categories", nargs="+", default=[CATEGORY_FOR_PROMO], help="Категории для доли промо")
+ap.add_argument("--abc", nargs="+", default=[",".join(map(str, ABC_THRESHOLDS))],
+                help="Наборы порогов ABC вида 0.8,0.95")
+ap.add_argument("--headless", action="store_true",
+                help="Без окон: backend Agg, фигуры закрываются сразу после сохранения (для cron)")
+ap.add_argument("--formats", nargs="+", default=list(charts.DEFAULT_FORMATS), help="Форматы графиков: png svg ...")
+ap.add_argument("--dpi", type=int, default=charts.DEFAULT_DPI)
+ap.add_argument("--profile", action="store_true",
+                help="Время (wall/CPU) и пик памяти по секциям → RESULTS_DIR/profile.csv")
+ap.add_argument("--cprofile", action="store_true",
+                help="--profile + дамп cProfile → RESULTS_DIR/profile.prof, profile_top.txt")
+args = ap.parse_args()
+abc_threshold_sets = [tuple(float(x) for x in t.split(",")) for t in args.abc]
+
+if args.headless:
+    charts.use_headless()
+import matplotlib.pyplot as plt
+
+# в интерактивном режиме фигуры оставляем открытыми для plt.show() в конце
+save_kw = {"formats": args.formats, "dpi": args.dpi, "keep_open": not args.headless}
+
 RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+prof = Profiler(enabled=args.profile, cprofile=args.cprofile)
 
 # ---------------------------------------------------------------------
 # LOAD
 # ---------------------------------------------------------------------
-orders = pd.read_excel(ORDERS_PATH, sheet_name=0, parse_dates=["accepted_at"])
-products = pd.read_excel(PRODUCTS_PATH, sheet_name=0)
-
-# Для задач с категориями: берём только совпавшие product_id
-ord_prod = orders.merge(products, on="product_id", how="inner")
+prof.mark("load")
+orders = read_excel_cached(ORDERS_PATH, parse_dates=["accepted_at"], cache_dir=CACHE_DIR)
+products = read_excel_cached(PRODUCTS_PATH, categories=["level1", "level2"], cache_dir=CACHE_DIR)
 
-# Подготовим базовые величины, пригодятся дальше
-ord_prod["revenue"] = ord_prod["price"] * ord_prod["quantity"]
-ord_prod["cost"]    = ord_prod["cost_price"] * ord_prod["quantity"]
-ord_prod["date"]    = ord_prod["accepted_at"].dt.date
+# Объединение orders × products и базовые величины считаются один раз
+prof.mark("merge")
+report = RetailReport(orders, products)
 
 # ---------------------------------------------------------------------
 # 1) Самая ходовая товарная группа
 # ---------------------------------------------------------------------
-cat_units = (ord_prod.groupby("level1", as_index=False)["quantity"]
-                    .sum()
-                    .rename(columns={"quantity": "units_sold"})
-                    .sort_values("units_sold", ascending=False))
+prof.mark("1_category_units")
+cat_units = report.category_units()
 
 top_cat, top_units = cat_units.iloc[0]["level1"], int(cat_units.iloc[0]["units_sold"])
 print("=== Самая ходовая товарная группа ===")
@@ -57,26 +94,14 @@ print("\nТаблица по категориям (шт):")
 print(cat_units.to_string(index=False))
 
 # Barchart
-plt.figure(figsize=(11,5))
-plt.bar(cat_units["level1"], cat_units["units_sold"])
-plt.title("Проданные позиции по категориям (шт)")
-plt.xlabel("Категория (level1)")
-plt.ylabel("Штук")
-plt.xticks(rotation=30, ha="right")
-for x, y in zip(range(len(cat_units)), cat_units["units_sold"]):
-    plt.text(x, y, str(int(y)), ha="center", va="bottom", fontsize=9)
-plt.tight_layout()
-plt.savefig(RESULTS_DIR / "01_barchart_units_by_category.png", dpi=150)
+prof.mark("chart.units_by_category")
+charts.bar_units_by_category(cat_units, RESULTS_DIR, **save_kw)
 
 # ---------------------------------------------------------------------
 # 2) Распределение продаж по подкатегориям в разрезе категорий
 # ---------------------------------------------------------------------
-subcat_units = (ord_prod.groupby(["level1","level2"], as_index=False)["quantity"]
-                       .sum()
-                       .rename(columns={"quantity": "units_sold"}))
-subcat_units["units_in_cat"] = subcat_units.groupby("level1")["units_sold"].transform("sum")
-subcat_units["share_in_cat"] = subcat_units["units_sold"] / subcat_units["units_in_cat"]
-subcat_units = subcat_units.sort_values(["level1","units_sold"], ascending=[True, False])
+prof.mark("2_subcategory_shares")
+subcat_units = report.subcategory_shares()
 
 print("\n=== Распределение по подкатегориям (шт и доля в категории) ===")
 print(subcat_units[["level1","level2","units_sold","share_in_cat"]].to_string(index=False))
@@ -84,112 +109,64 @@ print(subcat_units[["level1","level2","units_sold","share_in_cat"]].to_string(in
 subcat_units.to_excel(RESULTS_DIR / "02_subcategory_distribution.xlsx", index=False)
 
 # ---------------------------------------------------------------------
-# 3) Средний чек на 13.01.2022 (orders только)
+# 3) Средний чек по датам (orders только) — один groupby на все дни
 # ---------------------------------------------------------------------
-target_date = pd.Timestamp("2022-01-13").date()
-orders_day = orders[orders["accepted_at"].dt.date == target_date]
-bill_sums = (orders_day.assign(sum_item=orders_day["price"] * orders_day["quantity"])
-                        .groupby("order_id", as_index=False)["sum_item"].sum())
-avg_check = float(bill_sums["sum_item"].mean()) if len(bill_sums) else np.nan
-print(f"\n=== Средний чек на {target_date.strftime('%d.%m.%Y')} ===")
-print(f"Средний чек: {avg_check:.2f} ₽")
+prof.mark("3_average_check")
+avg_check_by_day = report.average_check()
+avg_check_by_day.rename_axis("date").reset_index().to_excel(RESULTS_DIR / "03_avg_check_by_day.xlsx", index=False)
+for target_date, avg_check in report.average_check_on(args.dates).items():
+    print(f"\n=== Средний чек на {target_date.strftime('%d.%m.%Y')} ===")
+    print(f"Средний чек: {avg_check:.2f} ₽")
 
 # ---------------------------------------------------------------------
-# 4) Доля промо в категории "Сыры" (в штуках) + piechart
+# 4) Доля промо в категориях (в штуках) + piechart
 #    Промо: price < regular_price
 # ---------------------------------------------------------------------
-cheese = ord_prod[ord_prod["level1"] == CATEGORY_FOR_PROMO].copy()
-promo_units = nonpromo_units = total_units = 0
-promo_share = np.nan
-if not cheese.empty:
-    cheese["is_promo"] = cheese["price"] < cheese["regular_price"]
-    promo_units    = int(cheese.loc[cheese["is_promo"], "quantity"].sum())
-    total_units    = int(cheese["quantity"].sum())
-    nonpromo_units = total_units - promo_units
-    promo_share    = (promo_units / total_units) if total_units else 0.0
-
-print(f"\n=== Доля промо (шт) в категории '{CATEGORY_FOR_PROMO}' ===")
-print(f"Промо-шт: {promo_units}, Не промо-шт: {nonpromo_units}, Доля промо: {promo_share:.1%}")
-
-plt.figure(figsize=(6,6))
-plt.pie([promo_units, nonpromo_units],
-        labels=["Промо", "Не промо"],
-        autopct="%.1f%%",
-        startangle=90)
-plt.title(f"Доля промо в категории '{CATEGORY_FOR_PROMO}' (в штуках)")
-plt.tight_layout()
-plt.savefig(RESULTS_DIR / "04_pie_promo_share_cheese.png", dpi=150)
+prof.mark("4_promo_share")
+promo = report.promo_share(args.promo_categories)
+for category, row in promo.iterrows():
+    promo_units, nonpromo_units = int(row["promo_units"]), int(row["nonpromo_units"])
+    print(f"\n=== Доля промо (шт) в категории '{category}' ===")
+    print(f"Промо-шт: {promo_units}, Не промо-шт: {nonpromo_units}, Доля промо: {row['promo_share']:.1%}")
+    if promo_units + nonpromo_units == 0:
+        continue  # пирог из нулей не строится
+
+    prof.mark("chart.promo_share")
+    charts.pie_promo_share(category, promo_units, nonpromo_units, RESULTS_DIR,
+                           charts.promo_chart_name(category), **save_kw)
 
 # ---------------------------------------------------------------------
 # 5) Маржа по категориям (руб и %) + 2 горизонтальных барчарта
 # ---------------------------------------------------------------------
-margins = (ord_prod.groupby("level1", as_index=False)[["revenue","cost"]].sum())
-margins["margin_rub"] = margins["revenue"] - margins["cost"]
-margins["margin_pct"] = np.where(
-    margins["revenue"] > 0, margins["margin_rub"] / margins["revenue"] * 100, np.nan
-)
+prof.mark("5_margins")
+margins = report.margins()
 print("\n=== Маржа по категориям (руб и %) ===")
 tmp = margins[["level1","margin_rub","margin_pct"]].copy()
 tmp["margin_pct"] = tmp["margin_pct"].map(lambda x: f"{x:.1f}%" if pd.notnull(x) else "—")
 print(tmp.to_string(index=False))
 margins.to_excel(RESULTS_DIR / "05_margins_by_category.xlsx", index=False)
 
-# barh: руб
-margins_sorted_rub = margins.sort_values("margin_rub", ascending=False)
-plt.figure(figsize=(10,6))
-plt.barh(margins_sorted_rub["level1"], margins_sorted_rub["margin_rub"])
-plt.title("Маржа по категориям (руб)")
-plt.xlabel("Маржа, руб")
-plt.ylabel("Категория")
-for y, v in zip(range(len(margins_sorted_rub)), margins_sorted_rub["margin_rub"]):
-    plt.text(v, y, f"{int(v)}", va="center", ha="left", fontsize=9)
-plt.tight_layout()
-plt.savefig(RESULTS_DIR / "05_barh_margin_rub.png", dpi=150)
-
-# barh: %
-margins_sorted_pct = margins.sort_values("margin_pct", ascending=False)
-plt.figure(figsize=(10,6))
-plt.barh(margins_sorted_pct["level1"], margins_sorted_pct["margin_pct"])
-plt.title("Маржа по категориям (%)")
-plt.xlabel("Маржа, %")
-plt.ylabel("Категория")
-for y, v in zip(range(len(margins_sorted_pct)), margins_sorted_pct["margin_pct"]):
-    if pd.notnull(v):
-        plt.text(v, y, f"{v:.1f}%", va="center", ha="left", fontsize=9)
-plt.tight_layout()
-plt.savefig(RESULTS_DIR / "05_barh_margin_pct.png", dpi=150)
+# barh: руб и %
+prof.mark("chart.margins")
+charts.barh_margin_rub(margins, RESULTS_DIR, **save_kw)
+charts.barh_margin_pct(margins, RESULTS_DIR, **save_kw)
 
 # ---------------------------------------------------------------------
 # 6) ABC-анализ по подкатегориям (level2)
 # ---------------------------------------------------------------------
-abc_base = (ord_prod.groupby("level2", as_index=False)
-                     .agg(units_sold=("quantity","sum"),
-                          sales=("revenue","sum")))
-
-def abc_class(series: pd.Series, thresholds=(0.80, 0.95)) -> pd.Series:
-    """Вернёт A/B/C в порядке исходного индекса series,
-    где A — кум. доля до t0, B — до t1, остальное — C."""
-    s = series.sort_values(ascending=False)
-    cum = s.cumsum() / s.sum()
-    labels_sorted = pd.cut(
-        cum, bins=[-np.inf, thresholds[0], thresholds[1], np.inf],
-        labels=["A","B","C"]
-    )
-    # вернуть к исходному индексу
-    return series.index.to_series().map(dict(zip(s.index, labels_sorted)))
-
-abc = abc_base.copy()
-abc["ABC_qty"]   = abc_class(abc.set_index("level2")["units_sold"], ABC_THRESHOLDS).values
-abc["ABC_sales"] = abc_class(abc.set_index("level2")["sales"],      ABC_THRESHOLDS).values
-abc["ABC_both"]  = abc["ABC_qty"].astype(str) + " " + abc["ABC_sales"].astype(str)
-
-abc = abc.sort_values(["ABC_sales","sales"], ascending=[True, False])
-print("\n=== ABC-анализ по подкатегориям ===")
-print(abc.to_string(index=False))
-
-abc.to_excel(RESULTS_DIR / "06_abc_by_subcategory.xlsx", index=False)
+prof.mark("6_abc")
+for i, (thresholds, abc) in enumerate(report.abc_many(abc_threshold_sets).items()):
+    suffix = "" if i == 0 else "_" + "_".join(f"{t:g}" for t in thresholds)
+    print(f"\n=== ABC-анализ по подкатегориям{' ' + str(thresholds) if suffix else ''} ===")
+    print(abc.to_string(index=False))
+
+    abc.to_excel(RESULTS_DIR / f"06_abc_by_subcategory{suffix}.xlsx", index=False)
+
+# отчёт профиля — до plt.show(), иначе в него попадёт время просмотра окон
+prof.save(RESULTS_DIR)
 
 # Показать все графики в интерактиве
-plt.show()
+if not args.headless:
+    plt.show()
 
 print(f"\nГотово. Файлы с таблицами и графиками сохранены в: {RESULTS_DIR.resolve()}")
\ No newline at end of file